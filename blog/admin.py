@@ -1,7 +1,10 @@
 from django import forms
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Category, Post, Comment, NewsletterSubscriber, SystemLog
+from .models import (
+    Category, Post, Comment, NewsletterSubscriber, NewsletterCampaign, SystemLog,
+    SystemLogDailySummary,
+)
 
 
 class CategoryForm(forms.ModelForm):
@@ -110,6 +113,18 @@ class NewsletterSubscriberAdmin(admin.ModelAdmin):
     readonly_fields = ['subscribed_at']
 
 
+@admin.register(NewsletterCampaign)
+class NewsletterCampaignAdmin(admin.ModelAdmin):
+    """Soạn campaign trong admin, gửi bằng: python manage.py send_newsletter <id>"""
+    list_display = ['subject', 'status', 'sent_count', 'failed_count', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject']
+    readonly_fields = [
+        'status', 'last_subscriber_id', 'sent_count', 'failed_count',
+        'created_at', 'started_at', 'finished_at',
+    ]
+
+
 @admin.register(SystemLog)
 class SystemLogAdmin(admin.ModelAdmin):
     list_display = ['log_level_badge', 'logger_name', 'message_preview', 'timestamp']
@@ -143,3 +158,18 @@ class SystemLogAdmin(admin.ModelAdmin):
         preview = obj.message[:100] + ('...' if len(obj.message) > 100 else '')
         return preview
     message_preview.short_description = "Message"
+
+
+
+@admin.register(SystemLogDailySummary)
+class SystemLogDailySummaryAdmin(admin.ModelAdmin):
+    """Số log theo ngày / level còn lại sau khi purge_old_records xóa log cũ"""
+    list_display = ['date', 'level', 'count']
+    list_filter = ['level']
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
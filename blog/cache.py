@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Blog content cache keyed by a global "content version".
+
+- Mỗi khi Post / Category thay đổi (blog/signals.py) hoặc lượt xem được flush
+  (blog/view_counter.py) → bump_content_version()
+- Mọi key cache đều chứa version hiện tại → đổi version là toàn bộ cache cũ
+  hết hiệu lực ngay, không cần xóa từng key (key cũ tự hết hạn theo TTL)
+- Fragment dùng chung (sidebar categories, featured/latest posts): tính 1 lần / version
+- Whole-page cache cho khách chưa đăng nhập: cache_anonymous_page()
+
+Example:
+    overview = get_categories_overview()       # 2 query lần đầu, 0 query sau đó
+    bump_content_version()                     # sau khi sửa bài viết
+
+    @method_decorator(cache_anonymous_page(), name='dispatch')
+    class HomeView(View): ...
+"""
+
+import logging
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.middleware.cache import CacheMiddleware
+from django.views.decorators.csrf import csrf_protect
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+CONTENT_VERSION_KEY = 'blog:content_version'
+CONTENT_CACHE_TIMEOUT = 60 * 60  # version đổi là đủ để invalidate, TTL chỉ để dọn key cũ
+
+CATEGORY_TOP_POSTS = 3
+
+# Page cache chỉ là lớp ngoài cùng: version đổi → key_prefix đổi → trang mới
+PAGE_CACHE_TIMEOUT = 10 * 60
+
+
+# ============================================================================
+# CONTENT VERSION
+# ============================================================================
+
+def get_content_version():
+    """Version hiện tại của nội dung blog (khởi tạo = 1)"""
+    version = cache.get(CONTENT_VERSION_KEY)
+    if version is None:
+        cache.add(CONTENT_VERSION_KEY, 1, None)
+        version = cache.get(CONTENT_VERSION_KEY, 1)
+    return version
+
+
+def bump_content_version():
+    """Invalidate toàn bộ cache nội dung blog"""
+    try:
+        return cache.incr(CONTENT_VERSION_KEY)
+    except ValueError:
+        cache.set(CONTENT_VERSION_KEY, 2, None)
+        return 2
+
+
+def get_or_build(name, builder, timeout=CONTENT_CACHE_TIMEOUT):
+    """
+    Lấy giá trị cache của version hiện tại, build lại nếu chưa có.
+
+    Args:
+        name: tên fragment (vd 'categories_overview')
+        builder: callable không tham số trả về giá trị cần cache
+    """
+    key = f'blog:{name}:v{get_content_version()}'
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
+
+
+# ============================================================================
+# CATEGORIES OVERVIEW (CategoriesView)
+# ============================================================================
+
+def _top_posts_window(category_ids, limit):
+    """Top-N bài viết mỗi category bằng ROW_NUMBER() OVER (PARTITION BY category)"""
+    from .models import Post
+
+    return list(
+        Post.objects
+        .filter(status='published', category_id__in=category_ids)
+        .only('id', 'title', 'slug', 'category_id', 'published_at')
+        .annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('category_id')],
+            order_by=[F('published_at').desc(nulls_last=True), F('id').desc()],
+        ))
+        .filter(row_number__lte=limit)
+        .order_by('category_id', 'row_number')
+    )
+
+
+def _top_posts_fallback(category_ids, limit):
+    """Backend không có window function: 1 query sắp theo category, cắt top-N trong Python"""
+    from .models import Post
+
+    posts = []
+    counts = {}
+    queryset = (
+        Post.objects
+        .filter(status='published', category_id__in=category_ids)
+        .only('id', 'title', 'slug', 'category_id', 'published_at')
+        .order_by('category_id', F('published_at').desc(nulls_last=True), '-id')
+    )
+    for post in queryset.iterator():
+        if counts.get(post.category_id, 0) < limit:
+            counts[post.category_id] = counts.get(post.category_id, 0) + 1
+            posts.append(post)
+    return posts
+
+
+def build_categories_overview(limit=CATEGORY_TOP_POSTS):
+    """
+    Categories có bài đã xuất bản + top-N bài mới nhất của mỗi category.
+    Luôn đúng 2 query, không phụ thuộc số category.
+
+    Returns:
+        list[dict]: [{'category': Category (có post_count), 'posts': [Post, ...]}, ...]
+    """
+    from .models import Category
+
+    categories = list(
+        Category.objects.exclude(slug='')
+        .annotate(post_count=Count('posts', filter=Q(posts__status='published')))
+        .filter(post_count__gt=0)
+        .order_by('name')
+    )
+    if not categories:
+        return []
+
+    category_ids = [category.id for category in categories]
+    if connection.features.supports_over_clause:
+        posts = _top_posts_window(category_ids, limit)
+    else:
+        posts = _top_posts_fallback(category_ids, limit)
+
+    posts_by_category = {}
+    for post in posts:
+        posts_by_category.setdefault(post.category_id, []).append(post)
+
+    return [
+        {'category': category, 'posts': posts_by_category.get(category.id, [])}
+        for category in categories
+    ]
+
+
+def get_categories_overview():
+    """build_categories_overview() cache theo content version"""
+    return get_or_build('categories_overview', build_categories_overview)
+
+
+# ============================================================================
+# SHARED SIDEBAR FRAGMENTS
+# ============================================================================
+
+def get_sidebar_categories():
+    """Categories (trừ slug rỗng) + số bài đã xuất bản - dùng ở mọi trang blog"""
+    from .models import Category
+
+    return get_or_build('sidebar_categories', lambda: list(
+        Category.objects.exclude(slug='')
+        .annotate(post_count=Count('posts', filter=Q(posts__status='published')))
+    ))
+
+
+def get_featured_posts(limit):
+    """Bài xem nhiều nhất (Post.views đã flush)"""
+    from .models import Post
+
+    return get_or_build(f'featured_posts:{limit}', lambda: list(
+        Post.objects.filter(status='published').order_by('-views')[:limit]
+    ))
+
+
+def get_latest_posts(limit):
+    """Bài mới xuất bản"""
+    from .models import Post
+
+    return get_or_build(f'latest_posts:{limit}', lambda: list(
+        Post.objects.filter(status='published').order_by('-published_at')[:limit]
+    ))
+
+
+# ============================================================================
+# WHOLE-PAGE CACHE (anonymous only)
+# ============================================================================
+
+def cache_anonymous_page(timeout=PAGE_CACHE_TIMEOUT):
+    """
+    Như cache_page nhưng:
+    - Chỉ cache GET/HEAD của khách chưa đăng nhập (header có lời chào user)
+    - key_prefix chứa content version → nội dung đổi là trang cũ hết hiệu lực
+
+    Vẫn dùng CacheMiddleware của Django nên tôn trọng Vary (Cookie) và không
+    cache response set cookie cho request chưa có cookie.
+
+    CSRF: decorator chạy bên trong view, trước CsrfViewMiddleware.process_response
+    → nếu không xử lý, trang có {% csrf_token %} (form newsletter ở home) được
+    cache kèm token của khách đầu tiên, không có cookie csrftoken / Vary: Cookie
+    → POST của mọi khách sau bị 403. csrf_protect bên trong lớp cache (như docs
+    Django yêu cầu với per-view cache): cookie + Vary: Cookie được đặt trước khi
+    lưu → khách mới không bị cache, khách có cookie nhận bản cache theo cookie
+    của mình. Trang không dùng csrf_token không bị ảnh hưởng.
+    """
+    def decorator(view_func):
+        protected_view = csrf_protect(view_func)
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+
+            middleware = CacheMiddleware(
+                lambda req: protected_view(req, *args, **kwargs),
+                page_timeout=timeout,
+                key_prefix=f'blog_page_v{get_content_version()}',
+            )
+            return middleware(request)
+        return _wrapped_view
+    return decorator
@@ -1,43 +1,192 @@
 """
 Custom logging handler to write logs to database.
 This handler writes log records to SystemLog model so they can be viewed in admin.
+
+Non-blocking design (logging.handlers.QueueHandler / QueueListener):
+- emit() chỉ đẩy record vào queue trong RAM → thread đang log không chờ DB
+- 1 listener thread gom record thành batch, ghi bằng SystemLog.objects.bulk_create
+  khi đủ batch_size record hoặc sau flush_interval giây
+- Queue có giới hạn (max_queue_size): đầy thì bỏ record CŨ NHẤT (drop-oldest)
+  → RAM bị chặn kể cả khi DB chậm / mất kết nối
+- atexit: dừng listener + ghi nốt phần còn lại
+
+Config (settings.LOGGING):
+    'database': {
+        'class': 'blog.logging_handlers.DatabaseLogHandler',
+        'formatter': 'verbose',
+        'level': 'INFO',
+        'batch_size': 200,
+        'flush_interval': 2.0,
+        'max_queue_size': 10000,
+    }
 """
-import logging
-from django.db import connection
-from django.utils import timezone
+import atexit
+import collections
+import sys
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+# get() hết timeout mà queue rỗng (khác None - sentinel của QueueListener)
+EMPTY = object()
+
+# Đánh dấu listener thread → record do chính nó sinh ra (vd SQL log) bị bỏ qua
+_thread_state = threading.local()
 
 
-class DatabaseLogHandler(logging.Handler):
+class DropOldestQueue:
     """
-    A logging handler that writes log records to SystemLog model.
+    Queue giới hạn kích thước: put_nowait() khi đầy sẽ bỏ phần tử cũ nhất
+    thay vì raise queue.Full / block thread đang log.
+
+    Chỉ cài đặt các method QueueHandler / QueueListener cần (put_nowait, get).
     """
-    
-    def emit(self, record):
-        """
-        Emit a log record to the database.
-        """
+
+    def __init__(self, maxsize):
+        self.items = collections.deque()
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.not_empty = threading.Condition(threading.Lock())
+
+    def put_nowait(self, item, force=False):
+        """force=True: luôn thêm (dùng cho sentinel dừng listener)"""
+        with self.not_empty:
+            if not force and self.maxsize and len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.not_empty.notify()
+
+    def get(self, block=True, timeout=None):
+        """Trả EMPTY nếu hết timeout mà queue vẫn rỗng"""
+        with self.not_empty:
+            if block and not self.items:
+                self.not_empty.wait(timeout)
+            if not self.items:
+                return EMPTY
+            return self.items.popleft()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class SystemLogWriter:
+    """Gom record thành batch và ghi bằng bulk_create (chạy trong listener thread)"""
+
+    def __init__(self, batch_size=200, flush_interval=2.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def add(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush_if_due(self):
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Ghi buffer xuống DB; lỗi DB → bỏ batch (không retry vô hạn, không log đệ quy)"""
+        from django.apps import apps
+
+        if not self.buffer or not apps.ready:
+            return
+
+        records, self.buffer = self.buffer, []
+        self.last_flush = time.monotonic()
         try:
-            # Avoid circular imports by importing here
+            from django.db import close_old_connections
             from blog.models import SystemLog
-            
-            # Check if database connection is available
-            try:
-                connection.ensure_connection()
-            except Exception:
-                # Database not available, skip logging to DB
-                return
-            
-            # Format the log message
-            message = self.format(record)
-            
-            # Create log entry
-            log = SystemLog.objects.create(
-                level=record.levelname,
-                logger_name=record.name,
-                message=message,
-                timestamp=timezone.now()
-            )
-        except Exception:
-            # If logging to DB fails, fail silently
-            # (to avoid infinite recursion or broken logging)
-            self.handleError(record)
+
+            close_old_connections()
+            SystemLog.objects.bulk_create([
+                SystemLog(
+                    level=record.levelname,
+                    logger_name=record.name[:255],
+                    message=record.getMessage(),
+                    # Thời điểm log, không phải lúc flush batch
+                    timestamp=datetime.fromtimestamp(record.created, tz=dt_timezone.utc),
+                )
+                for record in records
+            ])
+        except Exception as e:
+            sys.stderr.write(f"❌ DatabaseLogHandler: dropped {len(records)} records ({e})\n")
+
+
+class BatchingQueueListener(QueueListener):
+    """
+    QueueListener đưa record cho SystemLogWriter thay vì từng handler.
+    dequeue() có timeout → listener thức dậy định kỳ để flush theo thời gian.
+    """
+
+    def __init__(self, queue, writer):
+        super().__init__(queue)
+        self.writer = writer
+
+    def dequeue(self, block):
+        _thread_state.is_listener = True
+        while True:
+            record = self.queue.get(block, timeout=self.writer.flush_interval)
+            if record is not EMPTY:
+                return record
+            self.writer.flush_if_due()
+
+    def enqueue_sentinel(self):
+        # Sentinel không được bị drop-oldest bỏ mất, nếu không stop() sẽ treo
+        self.queue.put_nowait(self._sentinel, force=True)
+
+    def handle(self, record):
+        self.writer.add(record)
+        self.writer.flush_if_due()
+
+    def stop(self):
+        super().stop()
+        self.writer.flush()
+
+
+class DatabaseLogHandler(QueueHandler):
+    """
+    A logging handler that writes log records to SystemLog model,
+    without blocking the logging thread (see module docstring).
+    """
+
+    def __init__(self, batch_size=200, flush_interval=2.0, max_queue_size=10000):
+        super().__init__(DropOldestQueue(max_queue_size))
+        self.writer = SystemLogWriter(batch_size=batch_size, flush_interval=flush_interval)
+        self.listener = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        """Start listener thread ở lần log đầu tiên (LOGGING được cấu hình trước khi apps ready)"""
+        if self.listener is not None:
+            return
+        with self._start_lock:
+            if self.listener is None:
+                self.listener = BatchingQueueListener(self.queue, self.writer)
+                self.listener.start()
+                atexit.register(self.close)
+
+    def emit(self, record):
+        # Record do chính listener thread sinh ra → bỏ, tránh vòng lặp
+        if getattr(_thread_state, 'is_listener', False):
+            return
+        self._ensure_listener()
+        super().emit(record)
+
+    @property
+    def dropped(self):
+        """Số record đã bị bỏ do queue đầy"""
+        return self.queue.dropped
+
+    def close(self):
+        """Dừng listener, ghi nốt các record còn trong queue"""
+        with self._start_lock:
+            listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+        super().close()
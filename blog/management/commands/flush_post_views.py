@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Flush buffered blog view counts (cache → Post.views).
+
+Usage (cron, ví dụ mỗi phút):
+    python manage.py flush_post_views
+
+Web process tự flush mỗi BLOG_VIEW_FLUSH_INTERVAL giây; command này
+đảm bảo lượt xem được ghi cả khi không có request nào tới.
+Chỉ có tác dụng với cache dùng chung giữa các process (Redis / Memcached / DB).
+"""
+
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.view_counter import flush_views
+
+
+class Command(BaseCommand):
+    help = 'Write buffered blog post view counts to the database'
+
+    def handle(self, *args, **options):
+        post_ids = list(Post.objects.values_list('id', flat=True))
+        deltas = flush_views(post_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Flushed {sum(deltas.values())} views for {len(deltas)} posts"
+        ))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Delete expired SystemLog / ChatMessage rows per settings.RETENTION_POLICIES,
+keeping daily / hourly summary counts.
+
+Usage (cron, ví dụ mỗi đêm):
+    python manage.py purge_old_records
+    python manage.py purge_old_records --dry-run
+    python manage.py purge_old_records --only blog.SystemLog --chunk-size 5000 --pause 0.2
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.retention import DEFAULT_CHUNK_SIZE, RETENTION_TARGETS, purge_all
+
+
+class Command(BaseCommand):
+    help = 'Summarize and delete old SystemLog / ChatMessage rows in primary-key chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=sorted(RETENTION_TARGETS),
+                            help='Only purge this model (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Primary-key range per transaction')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between chunks')
+        parser.add_argument('--dry-run', action='store_true', help='Only count expired rows')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be >= 1')
+
+        results = purge_all(
+            only=options['only'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            pause=options['pause'],
+        )
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        for result in results:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {result['model']}: {verb} {result['deleted']} rows "
+                f"older than {result['cutoff']:%Y-%m-%d %H:%M}"
+            ))
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Rebuild the precomputed related-posts table (TF-IDF cosine similarity).
+
+Usage:
+    python manage.py rebuild_related_posts
+
+Post.save cập nhật incremental; chạy lệnh này sau khi import nhiều bài
+hoặc định kỳ (IDF thay đổi dần khi thêm bài).
+"""
+
+from django.core.management.base import BaseCommand
+
+from blog.related import rebuild_related_posts
+
+
+class Command(BaseCommand):
+    help = 'Recompute top-K related posts for every published post'
+
+    def handle(self, *args, **options):
+        count = rebuild_related_posts()
+        self.stdout.write(self.style.SUCCESS(f"✅ Related posts rebuilt for {count} posts"))
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Send a NewsletterCampaign to all active subscribers.
+
+Usage:
+    python manage.py send_newsletter 3
+    python manage.py send_newsletter 3 --batch-size 200 --workers 8 --rate 50
+    python manage.py send_newsletter 3 --restart      # gửi lại từ đầu
+
+Bị ngắt giữa chừng → chạy lại cùng lệnh để tiếp tục từ cursor đã lưu.
+Test local: EMAIL_BACKEND=django.core.mail.backends.console.EmailBackend
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.models import NewsletterCampaign
+from blog.newsletter import NewsletterSender
+
+
+class Command(BaseCommand):
+    help = 'Deliver a newsletter campaign in batches over reused SMTP connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_id', type=int)
+        parser.add_argument('--batch-size', type=int, help='Emails per SMTP connection')
+        parser.add_argument('--workers', type=int, help='Parallel batches')
+        parser.add_argument('--rate', type=float, help='Max emails per second (0 = unlimited)')
+        parser.add_argument('--restart', action='store_true', help='Reset progress and send to everyone again')
+
+    def handle(self, *args, **options):
+        try:
+            campaign = NewsletterCampaign.objects.get(pk=options['campaign_id'])
+        except NewsletterCampaign.DoesNotExist:
+            raise CommandError(f"Campaign {options['campaign_id']} does not exist")
+
+        if options['restart']:
+            campaign.last_subscriber_id = 0
+            campaign.sent_count = 0
+            campaign.failed_count = 0
+            campaign.finished_at = None
+            campaign.save()
+        elif campaign.status == 'sent':
+            raise CommandError('Campaign already sent (use --restart to send again)')
+
+        result = NewsletterSender(
+            campaign,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            rate_per_second=options['rate'],
+        ).run()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Sent {result['sent']} emails ({result['failed']} failed) in {result['elapsed']:.1f}s"
+        ))
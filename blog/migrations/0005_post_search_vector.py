@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:16
+
+import re
+import unicodedata
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+from django.utils.html import strip_tags
+
+# ============================================================================
+# Bản sao cố định của blog.search tại thời điểm migration này
+# (không import code app: migration phải chạy đúng dù blog.search đổi sau này)
+# ============================================================================
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_POSTGRES_CONFIG = 'simple'
+
+
+def _fold_diacritics(text):
+    if not text:
+        return ''
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in decomposed if unicodedata.category(ch) != 'Mn').lower()
+
+
+def _folded(text):
+    return ' '.join(token for token in _TOKEN_RE.findall(_fold_diacritics(text)) if len(token) > 1)
+
+
+def _search_vector(post):
+    body = f"{post.excerpt or ''} {strip_tags(post.content or '')}"
+    return (
+        SearchVector(Value(_folded(post.title)), weight='A', config=_POSTGRES_CONFIG)
+        + SearchVector(Value(_folded(post.tags)), weight='B', config=_POSTGRES_CONFIG)
+        + SearchVector(Value(_folded(body)), weight='C', config=_POSTGRES_CONFIG)
+    )
+
+
+def create_search_index(apps, schema_editor):
+    """GIN index + backfill search_vector (chỉ PostgreSQL, SQLite dùng inverted index trong process)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS blog_post_search_vector_gin '
+        'ON blog_post USING gin (search_vector)'
+    )
+    Post = apps.get_model('blog', 'Post')
+    for post in Post.objects.only('id', 'title', 'tags', 'excerpt', 'content').iterator(chunk_size=500):
+        Post.objects.filter(pk=post.pk).update(search_vector=_search_vector(post))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS blog_post_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_systemlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
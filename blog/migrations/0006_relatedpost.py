@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Độ tương đồng')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Thứ hạng')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='blog.post', verbose_name='Bài viết')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_related_links', to='blog.post', verbose_name='Bài liên quan')),
+            ],
+            options={
+                'verbose_name_plural': 'Bài viết liên quan',
+                'ordering': ['post', 'rank'],
+                'indexes': [models.Index(fields=['post', 'rank'], name='blog_relate_post_id_0c405e_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedpost',
+            constraint=models.UniqueConstraint(fields=('post', 'related'), name='unique_related_post'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_relatedpost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=200, verbose_name='Tiêu đề email')),
+                ('body_text', models.TextField(verbose_name='Nội dung (text)')),
+                ('body_html', models.TextField(blank=True, verbose_name='Nội dung (HTML, tùy chọn)')),
+                ('status', models.CharField(choices=[('draft', 'Nháp'), ('sending', 'Đang gửi'), ('paused', 'Tạm dừng'), ('sent', 'Đã gửi')], default='draft', max_length=10, verbose_name='Trạng thái')),
+                ('last_subscriber_id', models.BigIntegerField(default=0, verbose_name='Cursor (subscriber id)')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='Đã gửi')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='Lỗi')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Ngày tạo')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Bắt đầu gửi')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Hoàn tất')),
+            ],
+            options={
+                'verbose_name_plural': 'Newsletter Campaigns',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_newslettercampaign'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemLogDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Ngày')),
+                ('level', models.CharField(max_length=10, verbose_name='Mức độ')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Số log')),
+            ],
+            options={
+                'verbose_name': 'System Log Summary',
+                'verbose_name_plural': 'System Log Summaries',
+                'ordering': ['-date', 'level'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='systemlogdailysummary',
+            constraint=models.UniqueConstraint(fields=('date', 'level'), name='unique_systemlog_daily_summary'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_systemlogdailysummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='newslettercampaign',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Nháp'), ('sending', 'Đang gửi'), ('paused', 'Tạm dừng'), ('sent', 'Đã gửi'), ('partial', 'Gửi lỗi một phần'), ('failed', 'Gửi thất bại')], default='draft', max_length=10, verbose_name='Trạng thái'),
+        ),
+    ]
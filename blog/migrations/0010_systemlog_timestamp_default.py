@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_newslettercampaign_failed_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='systemlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Thời gian'),
+        ),
+    ]
@@ -1,4 +1,6 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
 
@@ -99,6 +101,9 @@ class Post(models.Model):
     # Engagement
     views = models.PositiveIntegerField(default=0, verbose_name="Lượt xem")
 
+    # Full-text search (PostgreSQL, GIN index) - cập nhật bởi blog/search.py
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
     class Meta:
         ordering = ['-published_at']
         verbose_name_plural = "Bài viết"
@@ -123,6 +128,44 @@ class Post(models.Model):
         super().save(*args, **kwargs)
 
 
+class RelatedPost(models.Model):
+    """
+    Top-K bài viết liên quan của mỗi bài (TF-IDF cosine, tính sẵn bởi blog/related.py)
+    
+    Example:
+        - post: "Whey protein cho người mới"
+        - related: "Cách chọn whey isolate"
+        - score: 0.42, rank: 1
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='related_links',
+        verbose_name="Bài viết"
+    )
+    related = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='incoming_related_links',
+        verbose_name="Bài liên quan"
+    )
+    score = models.FloatField(verbose_name="Độ tương đồng")
+    rank = models.PositiveSmallIntegerField(verbose_name="Thứ hạng")
+
+    class Meta:
+        ordering = ['post', 'rank']
+        verbose_name_plural = "Bài viết liên quan"
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'related'], name='unique_related_post')
+        ]
+        indexes = [
+            models.Index(fields=['post', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} → {self.related_id} ({self.score:.3f})"
+
+
 class Comment(models.Model):
     """Bình luận trên bài viết"""
     post = models.ForeignKey(
@@ -163,6 +206,50 @@ class NewsletterSubscriber(models.Model):
         return self.email
 
 
+class NewsletterCampaign(models.Model):
+    """
+    Một đợt gửi newsletter tới NewsletterSubscriber đang hoạt động.
+    Gửi bằng: python manage.py send_newsletter <campaign_id> (blog/newsletter.py)
+    
+    Resume: last_subscriber_id là cursor - các subscriber có id <= cursor đã được gửi,
+    chạy lại lệnh sẽ tiếp tục từ sau cursor.
+    """
+    STATUS_CHOICES = [
+        ('draft', 'Nháp'),
+        ('sending', 'Đang gửi'),
+        ('paused', 'Tạm dừng'),
+        ('sent', 'Đã gửi'),
+        ('partial', 'Gửi lỗi một phần'),
+        ('failed', 'Gửi thất bại'),
+    ]
+
+    subject = models.CharField(max_length=200, verbose_name="Tiêu đề email")
+    body_text = models.TextField(verbose_name="Nội dung (text)")
+    body_html = models.TextField(blank=True, verbose_name="Nội dung (HTML, tùy chọn)")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='draft',
+        verbose_name="Trạng thái"
+    )
+
+    # Progress tracking
+    last_subscriber_id = models.BigIntegerField(default=0, verbose_name="Cursor (subscriber id)")
+    sent_count = models.PositiveIntegerField(default=0, verbose_name="Đã gửi")
+    failed_count = models.PositiveIntegerField(default=0, verbose_name="Lỗi")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Ngày tạo")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Bắt đầu gửi")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Hoàn tất")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = "Newsletter Campaigns"
+
+    def __str__(self):
+        return f"{self.subject} ({self.get_status_display()})"
+
+
 class SystemLog(models.Model):
     """Model để lưu log từ ứng dụng (có thể xem trong admin)"""
     LEVEL_CHOICES = [
@@ -185,7 +272,8 @@ class SystemLog(models.Model):
         default="django"
     )
     message = models.TextField(verbose_name="Nội dung log")
-    timestamp = models.DateTimeField(auto_now_add=True, verbose_name="Thời gian")
+    # Không auto_now_add: log ghi theo batch → thời điểm log (LogRecord.created), không phải lúc flush
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name="Thời gian")
     
     class Meta:
         verbose_name = "System Log"
@@ -199,3 +287,23 @@ class SystemLog(models.Model):
     def __str__(self):
         return f"[{self.level}] {self.logger_name} - {self.timestamp}"
 
+
+class SystemLogDailySummary(models.Model):
+    """
+    Số log theo ngày / level - giữ lại sau khi SystemLog cũ bị xóa
+    (python manage.py purge_old_records, blog/retention.py)
+    """
+    date = models.DateField(verbose_name="Ngày")
+    level = models.CharField(max_length=10, verbose_name="Mức độ")
+    count = models.PositiveIntegerField(default=0, verbose_name="Số log")
+
+    class Meta:
+        verbose_name = "System Log Summary"
+        verbose_name_plural = "System Log Summaries"
+        ordering = ['-date', 'level']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'level'], name='unique_systemlog_daily_summary')
+        ]
+
+    def __str__(self):
+        return f"{self.date} [{self.level}] x{self.count}"
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Batched newsletter delivery (NewsletterCampaign → NewsletterSubscriber).
+
+Thiết kế:
+- Đọc subscriber đang hoạt động theo id tăng dần bằng iterator (không load hết vào RAM)
+- Chia batch (batch_size email); mỗi batch mở 1 SMTP connection qua
+  get_connection() và gửi từng email trên connection đó → không mở/đóng kết nối
+  mỗi email; chỉ email lỗi được thử lại (không gửi trùng cho người đã nhận)
+- Các batch chạy song song trên ThreadPoolExecutor nhỏ (thread chỉ gửi mail,
+  không chạm DB)
+- RateLimiter (token bucket) dùng chung giữa các thread → không vượt giới hạn
+  của SMTP provider
+- Resume: sau mỗi "window" (workers batch) campaign.last_subscriber_id được dời
+  tới id cuối của window → chạy lại lệnh sẽ tiếp tục, tối đa gửi lại 1 window
+
+Example:
+    campaign = NewsletterCampaign.objects.create(subject='Tin mới', body_text='...')
+    NewsletterSender(campaign, batch_size=100, workers=4, rate_per_second=20).run()
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from .models import NewsletterCampaign, NewsletterSubscriber
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_WORKERS = 4
+DEFAULT_RATE_PER_SECOND = 20  # 0 = không giới hạn
+
+
+# ============================================================================
+# RATE LIMITER
+# ============================================================================
+
+class RateLimiter:
+    """
+    Token bucket thread-safe: tối đa rate_per_second email / giây
+    (cho phép burst tối đa 1 giây).
+    """
+
+    def __init__(self, rate_per_second):
+        self.rate = rate_per_second
+        self.tokens = float(rate_per_second)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count=1):
+        """Chờ tới khi đủ count token"""
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                # Batch lớn hơn bucket → cho phép "nợ" token, lần sau sẽ chờ bù
+                if self.tokens >= min(count, self.rate):
+                    self.tokens -= count
+                    return
+                wait = (min(count, self.rate) - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# ============================================================================
+# SENDER
+# ============================================================================
+
+class NewsletterSender:
+    """
+    Gửi 1 campaign tới mọi subscriber đang hoạt động có id > cursor.
+
+    Attributes:
+        batch_size: số email mỗi batch (= mỗi SMTP connection)
+        workers: số batch gửi song song
+        rate_per_second: giới hạn tổng số email / giây (0 = không giới hạn)
+    """
+
+    def __init__(self, campaign, batch_size=None, workers=None, rate_per_second=None, connection_factory=None):
+        self.campaign = campaign
+        self.batch_size = max(1, batch_size or _setting('NEWSLETTER_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        self.workers = max(1, workers or _setting('NEWSLETTER_WORKERS', DEFAULT_WORKERS))
+        if rate_per_second is None:
+            rate_per_second = _setting('NEWSLETTER_RATE_PER_SECOND', DEFAULT_RATE_PER_SECOND)
+        self.rate_limiter = RateLimiter(rate_per_second)
+        self.connection_factory = connection_factory or get_connection
+        self.from_email = settings.DEFAULT_FROM_EMAIL
+
+    # ---------- building ----------
+
+    def _iter_batches(self):
+        """Yield list[(subscriber_id, email)] theo id tăng dần từ sau cursor"""
+        subscribers = (
+            NewsletterSubscriber.objects
+            .filter(is_active=True, id__gt=self.campaign.last_subscriber_id)
+            .order_by('id')
+            .values_list('id', 'email')
+            .iterator(chunk_size=self.batch_size * self.workers)
+        )
+        batch = []
+        for row in subscribers:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _build_message(self, email):
+        message = EmailMultiAlternatives(
+            subject=self.campaign.subject,
+            body=self.campaign.body_text,
+            from_email=self.from_email,
+            to=[email],  # 1 người nhận / email → không lộ danh sách subscriber
+        )
+        if self.campaign.body_html:
+            message.attach_alternative(self.campaign.body_html, 'text/html')
+        return message
+
+    # ---------- sending (worker thread, không truy cập DB) ----------
+
+    def _open_connection(self):
+        """Mở SMTP connection, thử lại 1 lần nếu lỗi kết nối (chưa gửi gì → retry an toàn)"""
+        for attempt in (1, 2):
+            connection = self.connection_factory(fail_silently=False)
+            try:
+                connection.open()
+                return connection
+            except Exception as e:
+                logger.warning(f"⚠️ Newsletter SMTP connection failed (attempt {attempt}): {e}")
+                self._close(connection)
+        return None
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _send_each(self, messages):
+        """
+        Gửi từng email qua 1 connection. Lỗi 1 email (vd SMTPRecipientsRefused,
+        mất kết nối giữa chừng) không ảnh hưởng các email đã gửi.
+
+        Returns:
+            tuple: (sent, list email chưa gửi được)
+        """
+        connection = self._open_connection()
+        if connection is None:
+            return 0, list(messages)
+        sent, failed = 0, []
+        try:
+            for message in messages:
+                try:
+                    sent += connection.send_messages([message]) or 0
+                except Exception as e:
+                    logger.warning(f"⚠️ Newsletter email to {message.to[0]} failed: {e}")
+                    failed.append(message)
+        finally:
+            self._close(connection)
+        return sent, failed
+
+    def _send_batch(self, batch):
+        """
+        Gửi 1 batch qua 1 connection. Email lỗi được gửi lại ĐÚNG 1 lần trên
+        connection mới; email đã gửi thành công không bao giờ gửi lại.
+
+        Returns:
+            tuple: (sent, failed)
+        """
+        messages = [self._build_message(email) for _, email in batch]
+        self.rate_limiter.acquire(len(messages))
+
+        sent, failed = self._send_each(messages)
+        if failed:
+            retried, failed = self._send_each(failed)
+            sent += retried
+        if failed:
+            logger.warning(
+                f"⚠️ Newsletter batch {batch[0][0]}-{batch[-1][0]}: {len(failed)} emails failed"
+            )
+        return sent, len(failed)
+
+    # ---------- orchestration ----------
+
+    def run(self):
+        """
+        Gửi campaign (hoặc tiếp tục nếu đã gửi dở).
+
+        Returns:
+            dict: {'sent', 'failed', 'last_subscriber_id', 'elapsed'}
+        """
+        campaign = self.campaign
+        started = time.monotonic()
+
+        campaign.status = 'sending'
+        campaign.started_at = campaign.started_at or timezone.now()
+        campaign.save(update_fields=['status', 'started_at'])
+        logger.info(f"📧 Newsletter '{campaign.subject}' started from subscriber #{campaign.last_subscriber_id}")
+
+        sent_total = failed_total = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='newsletter') as pool:
+                window = []
+                for batch in self._iter_batches():
+                    window.append(batch)
+                    if len(window) >= self.workers:
+                        sent, failed = self._send_window(pool, window)
+                        sent_total += sent
+                        failed_total += failed
+                        window = []
+                if window:
+                    sent, failed = self._send_window(pool, window)
+                    sent_total += sent
+                    failed_total += failed
+        except BaseException:
+            # Ctrl+C / lỗi DB → giữ cursor hiện tại để resume
+            campaign.status = 'paused'
+            campaign.save(update_fields=['status'])
+            raise
+
+        # Có email lỗi → 'partial' (hoặc 'failed' nếu không gửi được email nào)
+        if not failed_total:
+            campaign.status = 'sent'
+        elif sent_total:
+            campaign.status = 'partial'
+        else:
+            campaign.status = 'failed'
+        campaign.finished_at = timezone.now()
+        campaign.save(update_fields=['status', 'finished_at'])
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"✅ Newsletter '{campaign.subject}' done: {sent_total} sent, "
+            f"{failed_total} failed in {elapsed:.1f}s"
+        )
+        return {
+            'sent': sent_total,
+            'failed': failed_total,
+            'last_subscriber_id': campaign.last_subscriber_id,
+            'elapsed': elapsed,
+        }
+
+    def _send_window(self, pool, window):
+        """Gửi song song các batch của window, rồi dời cursor + lưu tiến độ"""
+        results = list(pool.map(self._send_batch, window))
+        sent = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+
+        campaign = self.campaign
+        campaign.last_subscriber_id = window[-1][-1][0]
+        campaign.sent_count += sent
+        campaign.failed_count += failed
+        NewsletterCampaign.objects.filter(pk=campaign.pk).update(
+            last_subscriber_id=campaign.last_subscriber_id,
+            sent_count=campaign.sent_count,
+            failed_count=campaign.failed_count,
+        )
+        return sent, failed
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed content-based related posts (TF-IDF cosine similarity).
+
+- Document = title + tags (x2, quan trọng hơn) + excerpt + content, đã bỏ dấu
+  (blog.search.fold_diacritics)
+- Lưu top-K hàng xóm của mỗi bài vào RelatedPost → PostDetailView chỉ cần
+  1 query theo post_id
+- Rebuild toàn bộ: python manage.py rebuild_related_posts
+- Incremental: Post.save → chỉ tính lại hàng của bài đó và các bài bị ảnh hưởng
+  (bài vừa lọt vào / rơi khỏi top-K của chúng). Vectorizer fit 1 lần / process,
+  mỗi lần save chỉ transform các bài đã đổi (PostCorpus.sync)
+
+Example:
+    rebuild_related_posts()                   # toàn bộ
+    update_related_posts(post)                # sau khi sửa 1 bài
+    refresh_related_posts([1, 2])             # sau khi xóa 1 bài
+    get_related_posts(post, limit=3)          # 1 query
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+from scipy import sparse
+
+from .models import Post, RelatedPost
+from .search import fold_diacritics
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+RELATED_TOP_K = 6            # số hàng xóm lưu cho mỗi bài
+RELATED_MIN_SCORE = 0.05     # dưới ngưỡng này coi như không liên quan
+SIMILARITY_CHUNK_SIZE = 256  # số hàng của ma trận similarity tính mỗi lần (giới hạn RAM)
+REFIT_RATIO = 0.2            # fit lại TF-IDF khi số bài đổi > 20% số bài lúc fit
+REFIT_MIN_CHANGES = 20
+SYNC_MARGIN = timedelta(seconds=5)  # lệch đồng hồ giữa các process / DB
+
+
+# ============================================================================
+# VECTORIZATION
+# ============================================================================
+
+def post_document(post):
+    """Text dùng để vector hóa 1 bài viết"""
+    parts = [
+        post.title, post.title,
+        post.tags or '', post.tags or '',
+        post.excerpt or '',
+        strip_tags(post.content or ''),
+    ]
+    return fold_diacritics(' '.join(parts))
+
+
+class PostCorpus:
+    """
+    Ma trận TF-IDF (đã chuẩn hóa L2) của toàn bộ bài đã xuất bản.
+
+    Fit 1 lần rồi giữ trong process (get_post_corpus). sync() chỉ đọc + transform
+    các bài đổi kể từ lần sync trước (updated_at) với vectorizer đã fit, bỏ các bài
+    đã xóa / ẩn → Post.save không phải load lại nội dung toàn bộ bài viết.
+    Vocabulary / IDF cố định tới lần fit lại (sau REFIT_RATIO thay đổi hoặc
+    python manage.py rebuild_related_posts).
+    """
+
+    def __init__(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.synced_at = timezone.now()
+        posts = list(_published_posts().order_by('id'))
+        self.post_ids = [post.id for post in posts]
+        self.positions = {post_id: index for index, post_id in enumerate(self.post_ids)}
+        self.matrix = None
+        self.vectorizer = None
+        self.fitted_rows = len(posts)
+        self.changes = 0
+
+        if len(posts) >= 2:
+            self.vectorizer = TfidfVectorizer(sublinear_tf=True, max_features=50000, min_df=1)
+            # TfidfVectorizer chuẩn hóa L2 → dot product = cosine similarity
+            self.matrix = self.vectorizer.fit_transform([post_document(post) for post in posts])
+
+    @property
+    def stale(self):
+        """Cần fit lại: chưa có vectorizer hoặc đã đổi quá nhiều bài so với lúc fit"""
+        return self.vectorizer is None or self.changes > max(REFIT_MIN_CHANGES, REFIT_RATIO * self.fitted_rows)
+
+    def sync(self):
+        """Áp dụng các bài thêm / sửa / xóa kể từ lần sync trước (không fit lại)"""
+        if self.vectorizer is None:
+            return
+        now = timezone.now()
+        published = set(Post.objects.filter(status='published').values_list('id', flat=True))
+        cached = set(self.post_ids)
+        removed = cached - published
+        changed = list(
+            _published_posts()
+            .filter(Q(updated_at__gte=self.synced_at - SYNC_MARGIN) | Q(id__in=published - cached))
+            .order_by('id')
+        )
+        self.synced_at = now
+        if not removed and not changed:
+            return
+
+        changed_ids = {post.id for post in changed}
+        keep = [row for row, post_id in enumerate(self.post_ids) if post_id not in removed and post_id not in changed_ids]
+        parts = [self.matrix[keep]]
+        if changed:
+            parts.append(self.vectorizer.transform([post_document(post) for post in changed]))
+        self.matrix = sparse.vstack(parts, format='csr')
+        self.post_ids = [self.post_ids[row] for row in keep] + [post.id for post in changed]
+        self.positions = {post_id: index for index, post_id in enumerate(self.post_ids)}
+        self.changes += len(removed) + len(changed)
+
+    def neighbours(self, rows):
+        """
+        Top-K hàng xóm cho các vị trí hàng cho trước.
+
+        Returns:
+            dict: {post_id: [(related_id, score), ...]} sắp theo score giảm dần
+        """
+        result = {}
+        if self.matrix is None:
+            return {self.post_ids[row]: [] for row in rows}
+
+        for start in range(0, len(rows), SIMILARITY_CHUNK_SIZE):
+            chunk = rows[start:start + SIMILARITY_CHUNK_SIZE]
+            similarities = (self.matrix[chunk] @ self.matrix.T).toarray()
+            for offset, row in enumerate(chunk):
+                scores = similarities[offset]
+                scores[row] = 0.0  # bỏ chính nó
+                k = min(RELATED_TOP_K, len(scores) - 1)
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                result[self.post_ids[row]] = [
+                    (self.post_ids[index], float(scores[index]))
+                    for index in top if scores[index] >= RELATED_MIN_SCORE
+                ]
+        return result
+
+
+def _published_posts():
+    return Post.objects.filter(status='published').only('id', 'title', 'tags', 'excerpt', 'content')
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+
+def get_post_corpus():
+    """PostCorpus của process, đã sync với DB (fit lại khi stale)"""
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            _corpus = PostCorpus()
+        else:
+            _corpus.sync()
+            if _corpus.stale:
+                _corpus = PostCorpus()
+        return _corpus
+
+
+def reset_post_corpus():
+    """Bỏ corpus đã cache (test)"""
+    global _corpus
+    with _corpus_lock:
+        _corpus = None
+
+
+def _save_neighbours(neighbours):
+    """Thay RelatedPost của các post trong neighbours (delete + bulk_create)"""
+    RelatedPost.objects.filter(post_id__in=list(neighbours)).delete()
+    RelatedPost.objects.bulk_create([
+        RelatedPost(post_id=post_id, related_id=related_id, score=score, rank=rank)
+        for post_id, items in neighbours.items()
+        for rank, (related_id, score) in enumerate(items, start=1)
+    ], batch_size=1000)
+
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+def rebuild_related_posts():
+    """
+    Tính lại toàn bộ bảng RelatedPost.
+
+    Returns:
+        int: số bài viết đã tính
+    """
+    global _corpus
+    corpus = PostCorpus()
+    with _corpus_lock:
+        _corpus = corpus
+    neighbours = corpus.neighbours(list(range(len(corpus.post_ids))))
+    with transaction.atomic():
+        RelatedPost.objects.exclude(post_id__in=corpus.post_ids).delete()
+        _save_neighbours(neighbours)
+    logger.info(f"🔗 Related posts rebuilt for {len(neighbours)} posts")
+    return len(neighbours)
+
+
+def update_related_posts(post):
+    """
+    Cập nhật incremental sau khi 1 bài được lưu / đổi trạng thái.
+
+    Tính lại:
+    - hàng xóm của chính bài đó
+    - các bài đang trỏ tới nó (score đã đổi, có thể rơi khỏi top-K)
+    - các bài mà nó giờ lọt vào top-K (score >= hàng xóm yếu nhất hiện tại)
+    Corpus đã fit được dùng lại: chỉ transform các bài vừa đổi.
+    """
+    corpus = get_post_corpus()
+    affected = set(
+        RelatedPost.objects.filter(related_id=post.id).values_list('post_id', flat=True)
+    )
+
+    if post.id not in corpus.positions:
+        # Bài nháp / bị ẩn: xóa hàng của nó, tính lại các bài từng trỏ tới nó
+        with transaction.atomic():
+            RelatedPost.objects.filter(post_id=post.id).delete()
+            rows = [corpus.positions[pid] for pid in affected if pid in corpus.positions]
+            _save_neighbours(corpus.neighbours(rows))
+        return
+
+    if corpus.matrix is not None:
+        row = corpus.positions[post.id]
+        scores = (corpus.matrix @ corpus.matrix[row].T).toarray().ravel()
+        weakest = {
+            item['post_id']: item['score']
+            for item in RelatedPost.objects.filter(rank=RELATED_TOP_K).values('post_id', 'score')
+        }
+        for index, score in enumerate(scores):
+            other_id = corpus.post_ids[index]
+            if other_id != post.id and score >= RELATED_MIN_SCORE and score > weakest.get(other_id, 0.0):
+                affected.add(other_id)
+
+    affected.add(post.id)
+    rows = [corpus.positions[pid] for pid in affected if pid in corpus.positions]
+    with transaction.atomic():
+        _save_neighbours(corpus.neighbours(rows))
+
+
+def refresh_related_posts(post_ids):
+    """Tính lại hàng xóm cho các bài cho trước (vd các bài từng trỏ tới 1 bài vừa bị xóa)"""
+    corpus = get_post_corpus()
+    rows = [corpus.positions[pid] for pid in post_ids if pid in corpus.positions]
+    if rows:
+        with transaction.atomic():
+            _save_neighbours(corpus.neighbours(rows))
+
+
+def get_related_posts(post, limit=3):
+    """
+    Bài liên quan đã tính sẵn (1 query).
+    Chưa có index cho bài này → fallback bài mới nhất cùng category.
+    """
+    related = list(
+        Post.objects.filter(incoming_related_links__post_id=post.id, status='published')
+        .order_by('incoming_related_links__rank')[:limit]
+    )
+    if related:
+        return related
+    return list(
+        Post.objects.filter(category_id=post.category_id, status='published')
+        .exclude(id=post.id).order_by('-published_at')[:limit]
+    )
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Retention cho các bảng log tăng mãi: SystemLog, chatbot.ChatMessage.
+
+- Policy theo model (settings.RETENTION_POLICIES): giữ bao nhiêu ngày
+- Xóa theo batch chunk_size row / transaction, tìm batch kế tiếp theo pk
+  (pk > pk cuối của batch trước, ORDER BY pk LIMIT chunk_size) → mỗi
+  transaction ngắn, không khóa bảng lâu, id thưa / lớn không tạo chunk rỗng
+- Trước khi xóa mỗi chunk: cộng số đếm vào bảng summary nhỏ gọn trong CÙNG
+  transaction → không mất thống kê, không đếm trùng khi chạy lại
+    - SystemLog   → SystemLogDailySummary (ngày, level)
+    - ChatMessage → ChatMessageHourlySummary (giờ)
+
+Dùng: python manage.py purge_old_records [--dry-run] [--only blog.SystemLog]
+
+Example:
+    RETENTION_POLICIES = {
+        'blog.SystemLog': {'days': 30},
+        'chatbot.ChatMessage': {'days': 90},
+    }
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DEFAULT_RETENTION_POLICIES = {
+    'blog.SystemLog': {'days': 30},
+    'chatbot.ChatMessage': {'days': 90},
+}
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def get_policies():
+    """settings.RETENTION_POLICIES (fallback mặc định)"""
+    return getattr(settings, 'RETENTION_POLICIES', DEFAULT_RETENTION_POLICIES)
+
+
+# ============================================================================
+# SUMMARIZERS (chạy trong transaction của chunk, trước khi xóa)
+# ============================================================================
+
+def _increment(model, lookup, field, amount):
+    """
+    counter += amount; chưa có row → tạo mới.
+    get_or_create (unique constraint + savepoint): 2 lần purge cùng tạo 1 row
+    → lần sau lấy row đã có thay vì IntegrityError; cộng bằng F() → không mất lượt đếm
+    """
+    summary, created = model.objects.get_or_create(**lookup, defaults={field: amount})
+    if not created:
+        model.objects.filter(pk=summary.pk).update(**{field: F(field) + amount})
+
+
+def summarize_system_logs(queryset):
+    from .models import SystemLogDailySummary
+
+    rows = (
+        queryset.annotate(day=TruncDate('timestamp'))
+        .values('day', 'level')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        _increment(SystemLogDailySummary, {'date': row['day'], 'level': row['level']}, 'count', row['n'])
+
+
+def summarize_chat_messages(queryset):
+    from chatbot.models import ChatMessageHourlySummary
+
+    rows = (
+        queryset.annotate(hour_bucket=TruncHour('timestamp'))
+        .values('hour_bucket')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        _increment(ChatMessageHourlySummary, {'hour': row['hour_bucket']}, 'message_count', row['n'])
+
+
+# model label → (field thời gian, hàm summary)
+RETENTION_TARGETS = {
+    'blog.SystemLog': ('timestamp', summarize_system_logs),
+    'chatbot.ChatMessage': ('timestamp', summarize_chat_messages),
+}
+
+
+# ============================================================================
+# PURGE
+# ============================================================================
+
+def purge_model(label, days, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, pause=0.0):
+    """
+    Summarize + xóa các row cũ hơn `days` ngày của 1 model.
+
+    Args:
+        label: 'app_label.ModelName' (phải có trong RETENTION_TARGETS)
+        days: số ngày giữ lại
+        chunk_size: số row tối đa mỗi transaction
+        dry_run: chỉ đếm, không ghi / xóa
+        pause: nghỉ giữa các chunk (giây) để nhường DB cho traffic thật
+
+    Returns:
+        dict: {'model', 'cutoff', 'deleted', 'chunks'}
+    """
+    if label not in RETENTION_TARGETS:
+        raise ValueError(f'No retention target for {label}')
+
+    model = apps.get_model(label)
+    time_field, summarize = RETENTION_TARGETS[label]
+    cutoff = timezone.now() - timedelta(days=days)
+    expired = model.objects.filter(**{f'{time_field}__lt': cutoff})
+
+    result = {'model': label, 'cutoff': cutoff, 'deleted': 0, 'chunks': 0}
+    if dry_run:
+        result['deleted'] = expired.count()
+        return result
+
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            # Batch kế tiếp: seek theo pk (index), khóa row → lần purge chạy song song
+            # không summarize trùng các row này
+            batch = expired.order_by('pk').select_for_update()
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            pks = list(batch.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            chunk = model.objects.filter(pk__in=pks)
+            summarize(chunk)
+            deleted, _ = chunk.delete()
+        result['deleted'] += deleted
+        result['chunks'] += 1
+        last_pk = pks[-1]
+        if pause:
+            time.sleep(pause)
+
+    logger.info(
+        f"🧹 Retention {label}: deleted {result['deleted']} rows older than "
+        f"{days} days in {result['chunks']} chunks"
+    )
+    return result
+
+
+def purge_all(only=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, pause=0.0):
+    """Chạy purge_model cho mọi policy (hoặc chỉ các label trong `only`)"""
+    results = []
+    for label, policy in get_policies().items():
+        if only and label not in only:
+            continue
+        results.append(purge_model(
+            label, policy['days'],
+            chunk_size=policy.get('chunk_size', chunk_size),
+            dry_run=dry_run,
+            pause=pause,
+        ))
+    return results
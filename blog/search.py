@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Ranked full-text search cho blog Post.
+
+Trọng số: title (A) > tags (B) > excerpt + content (C).
+Tiếng Việt được bỏ dấu trước khi index và trước khi query
+("dinh dưỡng" == "dinh duong" == "DINH DUONG").
+
+2 backend:
+- PostgreSQL: cột Post.search_vector (tsvector, GIN index), cập nhật khi
+  Post.save → SearchQuery + SearchRank trong DB
+- SQLite / khác: inverted index trong process (token → {post_id: điểm}),
+  build 1 lần, cập nhật incremental qua signal; process khác phát hiện thay
+  đổi qua SEARCH_VERSION_KEY trong cache và rebuild
+
+Example:
+    queryset = search_posts(Post.objects.filter(status='published'), 'whey dinh duong')
+    # → queryset sắp theo độ liên quan giảm dần
+"""
+
+import logging
+import math
+import re
+import threading
+import unicodedata
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+from django.utils.html import strip_tags
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SEARCH_VERSION_KEY = 'blog:search_version'
+
+# Trọng số field cho inverted index (tương đương A / B / C của tsvector)
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'tags': 2.0,
+    'body': 1.0,
+}
+
+# Trọng số SearchRank theo thứ tự [D, C, B, A]
+POSTGRES_RANK_WEIGHTS = [0.1, 0.3, 0.6, 1.0]
+POSTGRES_CONFIG = 'simple'  # không stem - nội dung chủ yếu tiếng Việt
+
+# Giới hạn số kết quả xếp hạng của inverted index (đủ cho phân trang)
+MAX_RESULTS = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# ============================================================================
+# TEXT NORMALIZATION
+# ============================================================================
+
+def fold_diacritics(text):
+    """
+    Bỏ dấu tiếng Việt + lowercase.
+
+    Example:
+        fold_diacritics('Đạm Whey cho người tập') → 'dam whey cho nguoi tap'
+    """
+    if not text:
+        return ''
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in decomposed if unicodedata.category(ch) != 'Mn').lower()
+
+
+def tokenize(text):
+    """Folded tokens (bỏ token 1 ký tự)"""
+    return [token for token in _TOKEN_RE.findall(fold_diacritics(text)) if len(token) > 1]
+
+
+def post_search_fields(post):
+    """Text đã fold của từng field (title / tags / body) - dùng chung cho 2 backend"""
+    body = f"{post.excerpt or ''} {strip_tags(post.content or '')}"
+    return {
+        'title': ' '.join(tokenize(post.title)),
+        'tags': ' '.join(tokenize(post.tags)),
+        'body': ' '.join(tokenize(body)),
+    }
+
+
+def use_postgres():
+    return connection.vendor == 'postgresql'
+
+
+# ============================================================================
+# POSTGRESQL BACKEND (tsvector + GIN)
+# ============================================================================
+
+def build_search_vector(post):
+    """SearchVector expression từ text đã fold của post"""
+    from django.contrib.postgres.search import SearchVector
+
+    fields = post_search_fields(post)
+    return (
+        SearchVector(Value(fields['title']), weight='A', config=POSTGRES_CONFIG)
+        + SearchVector(Value(fields['tags']), weight='B', config=POSTGRES_CONFIG)
+        + SearchVector(Value(fields['body']), weight='C', config=POSTGRES_CONFIG)
+    )
+
+
+def update_search_vector(post):
+    """Ghi Post.search_vector (UPDATE riêng → không gọi lại signal)"""
+    from .models import Post
+
+    Post.objects.filter(pk=post.pk).update(search_vector=build_search_vector(post))
+
+
+def _postgres_search(queryset, query):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    search_query = SearchQuery(
+        ' '.join(tokenize(query)), config=POSTGRES_CONFIG, search_type='plain'
+    )
+    return (
+        queryset
+        .annotate(rank=SearchRank('search_vector', search_query, weights=POSTGRES_RANK_WEIGHTS))
+        .filter(search_vector=search_query)
+        .order_by('-rank', '-published_at')
+    )
+
+
+# ============================================================================
+# IN-PROCESS INVERTED INDEX (SQLite / fallback)
+# ============================================================================
+
+class InvertedIndex:
+    """
+    token → {post_id: điểm đã nhân trọng số field}.
+
+    Điểm của 1 post cho query = Σ idf(token) * weight(token, post),
+    chỉ tính post chứa đủ mọi token của query (AND).
+    """
+
+    def __init__(self):
+        self.postings = {}   # token → {post_id: weight}
+        self.documents = {}  # post_id → set(token)
+        self.version = None
+        self.lock = threading.Lock()
+
+    def _add(self, post_id, fields):
+        weights = {}
+        for field, text in fields.items():
+            for token in text.split():
+                weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field]
+        for token, weight in weights.items():
+            # log-scale tf → bài dài không át bài ngắn chỉ vì lặp từ
+            self.postings.setdefault(token, {})[post_id] = 1.0 + math.log(weight)
+        self.documents[post_id] = set(weights)
+
+    def _remove(self, post_id):
+        for token in self.documents.pop(post_id, ()):
+            posting = self.postings.get(token)
+            if posting:
+                posting.pop(post_id, None)
+                if not posting:
+                    del self.postings[token]
+
+    def rebuild(self, version):
+        from .models import Post
+
+        with self.lock:
+            self.postings = {}
+            self.documents = {}
+            posts = Post.objects.filter(status='published').only(
+                'id', 'title', 'tags', 'excerpt', 'content'
+            )
+            for post in posts.iterator(chunk_size=500):
+                self._add(post.id, post_search_fields(post))
+            self.version = version
+        logger.info(f"🔎 Blog search index built: {len(self.documents)} posts, {len(self.postings)} tokens")
+
+    def update_post(self, post, old_version, new_version):
+        """Cập nhật incremental 1 post; chỉ giữ version nếu index đang đồng bộ"""
+        with self.lock:
+            if self.version is None:
+                return
+            self._remove(post.id)
+            if post.status == 'published':
+                self._add(post.id, post_search_fields(post))
+            self.version = new_version if self.version == old_version else self.version
+
+    def remove_post(self, post_id, old_version, new_version):
+        with self.lock:
+            if self.version is None:
+                return
+            self._remove(post_id)
+            self.version = new_version if self.version == old_version else self.version
+
+    def search(self, query):
+        """
+        Returns:
+            list[int]: post ids sắp theo điểm giảm dần
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+
+        with self.lock:
+            postings = [self.postings.get(token) for token in tokens]
+            if not all(postings):
+                return []
+            total = max(len(self.documents), 1)
+            # Duyệt từ posting ngắn nhất → giao nhanh
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting.keys()
+                if not candidates:
+                    return []
+
+            scores = dict.fromkeys(candidates, 0.0)
+            for posting in postings:
+                idf = math.log(1 + total / len(posting))
+                for post_id in candidates:
+                    scores[post_id] += idf * posting[post_id]
+
+        return sorted(scores, key=lambda post_id: (-scores[post_id], -post_id))[:MAX_RESULTS]
+
+
+_index = InvertedIndex()
+
+
+def _get_search_version():
+    version = cache.get(SEARCH_VERSION_KEY)
+    if version is None:
+        cache.add(SEARCH_VERSION_KEY, 1, None)
+        version = cache.get(SEARCH_VERSION_KEY, 1)
+    return version
+
+
+def _bump_search_version():
+    old_version = _get_search_version()
+    try:
+        return old_version, cache.incr(SEARCH_VERSION_KEY)
+    except ValueError:
+        cache.set(SEARCH_VERSION_KEY, old_version + 1, None)
+        return old_version, old_version + 1
+
+
+def get_index():
+    """Index của process này, rebuild nếu process khác đã sửa bài viết"""
+    version = _get_search_version()
+    if _index.version != version:
+        _index.rebuild(version)
+    return _index
+
+
+def _memory_search(queryset, query):
+    ranked_ids = get_index().search(query)
+    if not ranked_ids:
+        return queryset.none()
+    ordering = Case(
+        *[When(id=post_id, then=Value(position)) for position, post_id in enumerate(ranked_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ranked_ids).order_by(ordering)
+
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+def search_posts(queryset, query):
+    """
+    Lọc + sắp xếp queryset Post theo độ liên quan với query.
+
+    Args:
+        queryset: Post queryset đã lọc sẵn (status, category, ...)
+        query: chuỗi tìm kiếm của user (có dấu hoặc không)
+
+    Returns:
+        QuerySet: chỉ các bài khớp, sắp theo rank giảm dần
+    """
+    if not tokenize(query):
+        return queryset.none()
+    if use_postgres():
+        return _postgres_search(queryset, query)
+    return _memory_search(queryset, query)
+
+
+def index_post(post):
+    """Gọi từ post_save: cập nhật index cho 1 bài viết"""
+    if use_postgres():
+        update_search_vector(post)
+        return
+    old_version, new_version = _bump_search_version()
+    _index.update_post(post, old_version, new_version)
+
+
+def unindex_post(post_id):
+    """Gọi từ post_delete"""
+    if use_postgres():
+        return
+    old_version, new_version = _bump_search_version()
+    _index.remove_post(post_id, old_version, new_version)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Blog signals:
+- Invalidate blog content cache khi Post / Category thay đổi (blog/cache.py)
+- Cập nhật search index khi Post thay đổi (blog/search.py)
+- Cập nhật related posts sau khi transaction commit (blog/related.py)
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_content_version
+from .models import Category, Post
+from .search import index_post, unindex_post
+from .related import refresh_related_posts, update_related_posts
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_blog_content_cache(sender, **kwargs):
+    """Mọi thay đổi nội dung → đổi content version"""
+    bump_content_version()
+
+
+@receiver(post_save, sender=Post)
+def update_post_search_index(sender, instance, raw=False, **kwargs):
+    """Index lại 1 bài viết (bỏ qua khi loaddata)"""
+    if not raw:
+        index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_search_index(sender, instance, **kwargs):
+    unindex_post(instance.pk)
+
+
+def _run_safely(func, *args):
+    """Lỗi tính related posts không được làm hỏng request lưu bài viết"""
+    try:
+        func(*args)
+    except Exception as e:
+        logger.exception(f"❌ Related posts update failed: {e}")
+
+
+@receiver(post_save, sender=Post)
+def update_post_related_links(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: _run_safely(update_related_posts, instance))
+
+
+@receiver(pre_delete, sender=Post)
+def refresh_post_related_links(sender, instance, **kwargs):
+    """Các bài đang trỏ tới bài bị xóa cần hàng xóm mới"""
+    affected = list(instance.incoming_related_links.values_list('post_id', flat=True))
+    if affected:
+        transaction.on_commit(lambda: _run_safely(refresh_related_posts, affected))
@@ -1,11 +1,23 @@
 from django.test import TestCase, Client
 from django.urls import reverse
-from blog.models import Category, Post
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.core.management import call_command
+from io import StringIO
+import json
+from blog.models import Category, NewsletterCampaign, NewsletterSubscriber, Post, RelatedPost, SystemLog
+from blog.newsletter import NewsletterSender
+from blog.cache import get_categories_overview
+from blog.view_counter import flush_views, get_pending_views
 from django.utils import timezone
 
 class BlogTests(TestCase):
     def setUp(self):
         """Setup test data"""
+        from blog.related import reset_post_corpus
+        cache.clear()
+        reset_post_corpus()
         self.client = Client()
         
         # Create category
@@ -51,15 +63,371 @@ class BlogTests(TestCase):
         self.assertIn(self.post, response.context['posts'])
     
     def test_post_view_increment(self):
-        """Test view counter increments"""
+        """Test view counter increments (buffered, written on flush)"""
         initial_views = self.post.views
-        self.client.get(self.post.get_absolute_url())
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertEqual(response.context['post'].views, initial_views + 1)
+        self.assertEqual(get_pending_views(self.post.id), 1)
+
+        flush_views([self.post.id])
         self.post.refresh_from_db()
         self.assertEqual(self.post.views, initial_views + 1)
+        self.assertEqual(get_pending_views(self.post.id), 0)
+
+    def test_view_flush_batches_posts(self):
+        """Many hits on several posts → one UPDATE with per-post deltas"""
+        other = Post.objects.create(
+            title="Other", slug="other", category=self.category,
+            content="x", status="published", published_at=timezone.now()
+        )
+        for _ in range(3):
+            self.client.get(self.post.get_absolute_url())
+        self.client.get(other.get_absolute_url())
+
+        with self.assertNumQueries(1):
+            deltas = flush_views([self.post.id, other.id])
+        self.assertEqual(deltas, {self.post.id: 3, other.id: 1})
+        self.assertEqual(Post.objects.get(id=other.id).views, 1)
+
+    def test_categories_view_constant_queries(self):
+        """Categories page: 2 queries regardless of category count, then cached"""
+        for i in range(4):
+            category = Category.objects.create(name=f"Cat {i}", slug=f"cat-{i}")
+            for j in range(5):
+                Post.objects.create(
+                    title=f"Post {i}-{j}", slug=f"post-{i}-{j}", category=category,
+                    content="x", status="published", published_at=timezone.now()
+                )
+        Post.objects.create(title="Draft", slug="draft", category=self.category, content="x")
+
+        with self.assertNumQueries(2):
+            data = get_categories_overview()
+        self.assertEqual(len(data), 5)
+        self.assertTrue(all(len(item['posts']) <= 3 for item in data))
+        # post_count chỉ đếm bài đã xuất bản (bỏ qua bản nháp)
+        by_slug = {item['category'].slug: item for item in data}
+        self.assertEqual(by_slug['dinh-duong']['category'].post_count, 1)
+
+        with self.assertNumQueries(0):
+            get_categories_overview()
+
+        # Lưu bài viết → cache bị invalidate
+        self.post.title = "Renamed"
+        self.post.save()
+        item = next(item for item in get_categories_overview() if item['category'].slug == 'dinh-duong')
+        self.assertEqual([post.title for post in item['posts']], ["Renamed"])
+
+        response = self.client.get(reverse('blog:categories'))
+        self.assertEqual(response.status_code, 200)
+
+
+    def test_anonymous_page_cache_invalidated_on_change(self):
+        """Anonymous list page is served from cache until content version changes"""
+        url = reverse('blog:post_list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, "Test Post")
+
+        self.post.title = "Updated Title"
+        self.post.save()
+        self.assertContains(self.client.get(url), "Updated Title")
+
+    def test_cached_home_page_keeps_csrf_working(self):
+        """Khách sau vẫn có cookie + token CSRF riêng → form newsletter không bị 403"""
+        import re
+
+        for email in ['first@example.com', 'second@example.com']:
+            client = Client(enforce_csrf_checks=True)
+            for _ in range(2):  # lần 2 có thể lấy từ cache (theo cookie của client này)
+                response = client.get(reverse('blog:home'))
+                self.assertIn('csrftoken', client.cookies)
+            token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+            response = client.post(reverse('blog:subscribe'), {'email': email, 'csrfmiddlewaretoken': token})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(NewsletterSubscriber.objects.count(), 2)
+
+    def test_authenticated_pages_not_cached(self):
+        from django.contrib.auth.models import User
+        User.objects.create_user('reader', 'reader@example.com', 'pass12345')
+        self.client.login(username='reader', password='pass12345')
+        self.client.get(reverse('blog:home'))
+        response = self.client.get(reverse('blog:home'))
+        self.assertContains(response, "reader")
+
+
+    def test_search_folds_diacritics_and_ranks_title_first(self):
+        body_match = Post.objects.create(
+            title="Bữa sáng", slug="bua-sang", category=self.category,
+            content="Ăn yến mạch và uống whey protein", status="published",
+            published_at=timezone.now()
+        )
+        title_match = Post.objects.create(
+            title="Whey protein cho người mới", slug="whey-moi", category=self.category,
+            content="Hướng dẫn chọn sản phẩm", status="published",
+            published_at=timezone.now() - timezone.timedelta(days=1)
+        )
+        response = self.client.get(reverse('blog:post_list'), {'q': 'WHEY'})
+        self.assertEqual(list(response.context['posts']), [title_match, body_match])
+
+        response = self.client.get(reverse('blog:post_list'), {'q': 'bua sang'})
+        self.assertEqual(list(response.context['posts']), [body_match])
+
+        # Cập nhật incremental khi lưu bài viết
+        body_match.status = 'draft'
+        body_match.save()
+        response = self.client.get(reverse('blog:post_list'), {'q': 'whey'})
+        self.assertEqual(list(response.context['posts']), [title_match])
+
+    def test_fold_diacritics(self):
+        from blog.search import fold_diacritics
+        self.assertEqual(fold_diacritics('Đạm Whey cho người tập'), 'dam whey cho nguoi tap')
+
+    def test_search_vector_migration_matches_search_module(self):
+        import importlib
+        from blog.search import tokenize
+        migration = importlib.import_module('blog.migrations.0005_post_search_vector')
+        text = '<p>Đạm WHEY cho người tập - a 2 bữa</p>'
+        self.assertEqual(migration._folded(text), ' '.join(tokenize(text)))
+
+
+    def test_related_posts_ranked_by_content(self):
+        """Detail page serves precomputed TF-IDF neighbours"""
+        other_category = Category.objects.create(name="Thể hình", slug="the-hinh")
+        similar = Post.objects.create(
+            title="Creatine và sức mạnh", slug="creatine-suc-manh", category=other_category,
+            content="Creatine monohydrate giúp tăng sức mạnh khi tập tạ", tags="creatine, sức mạnh",
+            status="published", published_at=timezone.now()
+        )
+        Post.objects.create(
+            title="Salad rau củ", slug="salad", category=self.category,
+            content="Công thức salad ít calo", status="published", published_at=timezone.now()
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            source = Post.objects.create(
+                title="Hướng dẫn dùng creatine", slug="huong-dan-creatine", category=self.category,
+                content="Liều dùng creatine monohydrate mỗi ngày", tags="creatine",
+                status="published", published_at=timezone.now()
+            )
+
+        self.assertEqual(RelatedPost.objects.get(post=source, rank=1).related, similar)
+        # Incremental: bài tương tự cũng nhận bài mới làm hàng xóm
+        self.assertTrue(RelatedPost.objects.filter(post=similar, related=source).exists())
+
+        response = self.client.get(source.get_absolute_url())
+        self.assertEqual(response.context['related_posts'][0], similar)
+
+    def test_related_posts_update_reuses_fitted_corpus(self):
+        from blog.related import get_post_corpus, update_related_posts
+        other = Post.objects.create(
+            title="Creatine", slug="creatine", category=self.category,
+            content="Creatine monohydrate", status="published", published_at=timezone.now()
+        )
+        corpus = get_post_corpus()
+        vectorizer = corpus.vectorizer
+
+        other.content = "Creatine monohydrate tăng sức mạnh"
+        other.save()
+        self.post.status = 'draft'
+        self.post.save()
+        update_related_posts(other)
+
+        # Không fit lại: chỉ transform bài đã sửa, bỏ bài bị ẩn
+        self.assertIs(get_post_corpus(), corpus)
+        self.assertIs(corpus.vectorizer, vectorizer)
+        self.assertEqual(corpus.post_ids, [other.id])
+
+    def test_rebuild_related_posts_command(self):
+        Post.objects.create(
+            title="Test Post 2", slug="test-post-2", category=self.category,
+            content="This is test content too", status="published", published_at=timezone.now()
+        )
+        call_command('rebuild_related_posts', stdout=StringIO())
+        self.assertEqual(RelatedPost.objects.filter(post=self.post).count(), 1)
+
+
+class NewsletterTests(TestCase):
+    def setUp(self):
+        NewsletterSubscriber.objects.bulk_create([
+            NewsletterSubscriber(email=f"user{i}@example.com", is_active=i != 3)
+            for i in range(10)
+        ])
+        self.campaign = NewsletterCampaign.objects.create(subject="Tin mới", body_text="Xin chào", body_html="<p>Xin chào</p>")
+
+    def test_sends_to_active_subscribers_in_batches(self):
+        opened = []
+
+        def connection_factory(**kwargs):
+            connection = get_connection(**kwargs)
+            opened.append(connection)
+            return connection
+
+        result = NewsletterSender(
+            self.campaign, batch_size=4, workers=2, rate_per_second=0,
+            connection_factory=connection_factory
+        ).run()
+
+        self.assertEqual(result['sent'], 9)
+        self.assertEqual(len(mail.outbox), 9)
+        self.assertEqual(len(opened), 3)  # 1 connection / batch
+        self.assertTrue(all(len(message.to) == 1 for message in mail.outbox))
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, 'sent')
+        self.assertEqual(self.campaign.sent_count, 9)
+
+    def test_partial_failure_retries_only_failed_messages(self):
+        import smtplib
+        delivered = []
+
+        class FlakyConnection:
+            def __init__(self, **kwargs):
+                pass
+
+            def open(self):
+                return True
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                if messages[0].to[0] == 'user5@example.com':
+                    raise smtplib.SMTPRecipientsRefused({'user5@example.com': (550, b'no such user')})
+                delivered.extend(message.to[0] for message in messages)
+                return len(messages)
+
+        result = NewsletterSender(
+            self.campaign, batch_size=10, workers=1, rate_per_second=0, connection_factory=FlakyConnection
+        ).run()
+
+        self.assertEqual((result['sent'], result['failed']), (8, 1))
+        self.assertEqual(len(delivered), len(set(delivered)))  # không gửi trùng
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, 'partial')
+
+    def test_resumes_from_cursor(self):
+        subscribers = list(NewsletterSubscriber.objects.order_by('id'))
+        self.campaign.last_subscriber_id = subscribers[5].id
+        self.campaign.save()
+
+        call_command('send_newsletter', self.campaign.id, '--rate', '0', stdout=StringIO())
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            sorted(subscriber.email for subscriber in subscribers[6:])
+        )
+
+
+class DatabaseLogHandlerTests(TestCase):
+    def _record(self, message):
+        import logging
+        return logging.LogRecord('blog', logging.INFO, __file__, 1, message, None, None)
+
+    def test_queue_drops_oldest_when_full(self):
+        from blog.logging_handlers import DropOldestQueue
+        queue = DropOldestQueue(maxsize=3)
+        for i in range(5):
+            queue.put_nowait(i)
+        self.assertEqual(queue.dropped, 2)
+        self.assertEqual([queue.get(block=False) for _ in range(3)], [2, 3, 4])
+
+    def test_writer_batches_by_size(self):
+        from blog.logging_handlers import SystemLogWriter
+        writer = SystemLogWriter(batch_size=3, flush_interval=60)
+        with self.assertNumQueries(1):
+            for i in range(4):
+                writer.add(self._record(f"message {i}"))
+        self.assertEqual(SystemLog.objects.count(), 3)
+        self.assertEqual(len(writer.buffer), 1)
+
+        writer.flush()
+        self.assertEqual(SystemLog.objects.count(), 4)
+
+    def test_writer_keeps_record_time(self):
+        """Buffered rows get the time the record was logged, not the flush time"""
+        from blog.logging_handlers import SystemLogWriter
+        record = self._record("late flush")
+        record.created -= 3600
+        writer = SystemLogWriter(batch_size=10, flush_interval=60)
+        writer.add(record)
+        writer.flush()
+        # DB lưu tới micro giây
+        self.assertAlmostEqual(SystemLog.objects.get().timestamp.timestamp(), record.created, delta=1e-5)
+
+    def test_emit_does_not_block_on_database(self):
+        """emit() only enqueues; close() drains the queue"""
+        from blog.logging_handlers import DatabaseLogHandler
+        handler = DatabaseLogHandler(batch_size=100, flush_interval=60)
+        handler.writer.flush = lambda: None  # listener thread không ghi vào test DB
+        with self.assertNumQueries(0):
+            handler.emit(self._record("hello"))
+        handler.close()
+        self.assertEqual(len(handler.queue), 0)
+
+
+class RetentionTests(TestCase):
+    def test_purge_summarizes_and_deletes_old_rows(self):
+        from datetime import timedelta
+        from blog.models import SystemLogDailySummary
+        from blog.retention import purge_all
+        from chatbot.models import ChatMessage, ChatMessageHourlySummary
+
+        old = timezone.now() - timedelta(days=120)
+        for i in range(5):
+            SystemLog.objects.create(level='ERROR' if i % 2 else 'INFO', logger_name='blog', message=f'log {i}')
+            ChatMessage.objects.create(user_message=f'hi {i}', bot_response='hello')
+        recent_log = SystemLog.objects.create(level='INFO', logger_name='blog', message='recent')
+        recent_chat = ChatMessage.objects.create(user_message='recent', bot_response='hello')
+        # timestamp là auto_now_add → đổi bằng queryset.update
+        SystemLog.objects.exclude(pk=recent_log.pk).update(timestamp=old)
+        ChatMessage.objects.exclude(pk=recent_chat.pk).update(timestamp=old)
+
+        dry = purge_all(dry_run=True)
+        self.assertEqual([result['deleted'] for result in dry], [5, 5])
+        self.assertEqual(SystemLog.objects.count(), 6)
+
+        purge_all(chunk_size=2)
+        self.assertEqual(list(SystemLog.objects.all()), [recent_log])
+        self.assertEqual(list(ChatMessage.objects.all()), [recent_chat])
+        self.assertEqual(
+            dict(SystemLogDailySummary.objects.values_list('level', 'count')),
+            {'INFO': 3, 'ERROR': 2}
+        )
+        self.assertEqual(ChatMessageHourlySummary.objects.get().message_count, 5)
+
+        # Chạy lại không đếm trùng
+        purge_all()
+        self.assertEqual(ChatMessageHourlySummary.objects.get().message_count, 5)
+
+    def test_purge_seeks_batches_over_sparse_ids(self):
+        from datetime import timedelta
+        from blog.models import SystemLogDailySummary
+        from blog.retention import purge_model
+
+        old = timezone.now() - timedelta(days=120)
+        SystemLog.objects.bulk_create([
+            SystemLog(pk=pk, level='INFO', logger_name='blog', message='old', timestamp=old)
+            for pk in [1, 2, 50_000, 1_000_000, 1_000_001]
+        ])
+        result = purge_model('blog.SystemLog', 30, chunk_size=2)
+        # 3 batch có dữ liệu (+ 1 query rỗng để dừng), không quét 500k khoảng id
+        self.assertEqual((result['deleted'], result['chunks']), (5, 3))
+        self.assertEqual(SystemLogDailySummary.objects.get().count, 5)
+
 
 class ChatbotTests(TestCase):
     def setUp(self):
+        from chatbot.answer_cache import reset_answer_cache
+        from chatbot.admission import reset_admission_controllers
+        from chatbot.circuit_breaker import reset_llm_breaker
+        from chatbot.ngrok_config import reset_ngrok_url_cache
+        from chatbot.retrieval import reset_retrieval_index
+        from chatbot.transcripts import reset_transcript_buffer
         self.client = Client()
+        reset_transcript_buffer()
+        reset_retrieval_index()
+        reset_answer_cache()
+        reset_llm_breaker()
+        reset_admission_controllers()
+        reset_ngrok_url_cache()
     
     def test_health_check(self):
         """Test health endpoint"""
@@ -68,3 +436,535 @@ class ChatbotTests(TestCase):
         data = response.json()
         # May be offline, but endpoint should work
         self.assertIn('status', data)
+
+    def test_llm_client_reuses_session_and_reports_latency(self):
+        from unittest import mock
+        from chatbot.llm_client import get_llm_client, reset_llm_client
+
+        reset_llm_client()
+        client = get_llm_client()
+        self.assertIs(get_llm_client(), client)
+
+        fake = mock.Mock(status_code=200)
+        fake.json.return_value = {'answer': 'Ức gà có khoảng 31g protein. Rất tốt!'}
+        with mock.patch.object(client.session, 'post', return_value=fake) as post:
+            response = self.client.post(
+                reverse('chatbot:chat_api'),
+                data={'query': 'protein trong gà?'},
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('latency_ms', response.json())
+        _, kwargs = post.call_args
+        self.assertEqual(kwargs['timeout'], (client.connect_timeout, client.read_timeout))
+        # POST /ask không retry, kể cả lỗi kết nối
+        self.assertEqual(client.session.get_adapter('https://x').max_retries.total, 0)
+        self.assertGreater(client.health_session.get_adapter('https://x').max_retries.connect, 0)
+        reset_llm_client()
+
+    def test_answer_cache_normalizes_and_expires(self):
+        from chatbot.answer_cache import AnswerCache, normalize_query
+
+        self.assertEqual(normalize_query('  Bao nhiêu ĐẠM   trong gà?? '), 'bao nhieu dam trong ga')
+        answer_cache = AnswerCache(max_entries=2, ttl=60)
+        answer_cache.set('Bao nhiêu đạm trong gà?', '31g')
+        answer_cache.set('whey là gì', 'protein sữa')
+        self.assertEqual(answer_cache.get('bao nhieu dam trong ga'), '31g')
+        answer_cache.set('creatine là gì', 'hợp chất')  # LRU: bỏ 'whey là gì'
+        self.assertIsNone(answer_cache.get('whey là gì'))
+        answer_cache.set('bcaa', 'amino', ttl=-1)
+        self.assertIsNone(answer_cache.get('bcaa'))
+
+        fuzzy = AnswerCache(similarity=0.8)
+        fuzzy.set('bao nhiêu calo trong chuối', '89 kcal')
+        self.assertEqual(fuzzy.get('bao nhieu calo trong 1 chuoi'), '89 kcal')
+        self.assertIsNone(fuzzy.get('whey protein là gì'))
+
+    def test_repeated_question_skips_backend(self):
+        from unittest import mock
+        from chatbot.llm_client import get_llm_client
+
+        fake = mock.Mock(status_code=200)
+        fake.json.return_value = {'answer': 'Chuối có khoảng 89 kcal.'}
+        with mock.patch.object(get_llm_client().session, 'post', return_value=fake) as post:
+            for query in ['Chuối bao nhiêu calo?', 'chuoi bao nhieu calo']:
+                response = self.client.post(
+                    reverse('chatbot:chat_api'), data={'query': query}, content_type='application/json'
+                )
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(response.json()['code'], 'CACHE_HIT')
+
+    def test_missing_answer_not_cached(self):
+        import httpx
+        from unittest import mock
+        from chatbot.llm_client import AsyncLLMClient, get_llm_client
+
+        fake = mock.Mock(status_code=200)
+        fake.json.return_value = {'answer': ''}
+        with mock.patch.object(get_llm_client().session, 'post', return_value=fake) as post:
+            for _ in range(2):
+                response = self.client.post(
+                    reverse('chatbot:chat_api'), data={'query': 'whey là gì?'}, content_type='application/json'
+                )
+                self.assertEqual(response.json()['response'], 'Không có câu trả lời từ LLM')
+        self.assertEqual(post.call_count, 2)
+
+        calls = []
+
+        def backend(request):
+            calls.append(request)
+            return httpx.Response(200, json={})
+
+        client = AsyncLLMClient(transport=httpx.MockTransport(backend))
+        with mock.patch('chatbot.async_views.get_async_llm_client', return_value=client):
+            for _ in range(2):
+                response = self.client.post(
+                    reverse('chatbot:chat_api_async'), data={'query': 'creatine?'}, content_type='application/json'
+                )
+                self.assertEqual(response.json()['code'], 'LLM_EMPTY')
+        self.assertEqual(len(calls), 2)
+
+    def test_answer_cache_seeds_only_llm_answers(self):
+        from chatbot.answer_cache import AnswerCache
+        from chatbot.models import ChatMessage
+
+        ChatMessage.objects.bulk_create([
+            ChatMessage(user_message='whey là gì?', bot_response='Whey là protein sữa.', response_code='LLM_SUCCESS'),
+            ChatMessage(user_message='giá whey gold?', bot_response='Giá Whey Gold: 1.500.000đ.',
+                        response_code='RETRIEVAL_ANSWER'),
+            ChatMessage(user_message='creatine?', bot_response='Không có câu trả lời từ LLM', response_code='LLM_SUCCESS'),
+            ChatMessage(user_message='bcaa?', bot_response='Không có câu trả lời từ LLM', response_code='LLM_EMPTY'),
+        ])
+        answer_cache = AnswerCache(ttl=60)
+        self.assertEqual(answer_cache.seed_from_history(), 1)
+        self.assertEqual(answer_cache.get('whey là gì?'), 'Whey là protein sữa.')
+        self.assertIsNone(answer_cache.get('giá whey gold?'))
+
+    def test_async_chat_endpoint(self):
+        import httpx
+        from unittest import mock
+        from chatbot.llm_client import AsyncLLMClient
+        from chatbot.models import ChatMessage
+        from chatbot.transcripts import flush_transcripts
+
+        def backend(request):
+            self.assertEqual(json.loads(request.content), {'query': 'whey là gì?'})
+            return httpx.Response(200, json={'answer': 'Whey là protein từ sữa. Hấp thu nhanh.'})
+
+        client = AsyncLLMClient(transport=httpx.MockTransport(backend))
+        with mock.patch('chatbot.async_views.get_async_llm_client', return_value=client):
+            response = self.client.post(
+                reverse('chatbot:chat_api_async'), data={'query': 'whey là gì?'}, content_type='application/json'
+            )
+            self.assertEqual(self.client.get(reverse('chatbot:chat_api_async')).status_code, 405)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['code'], 'LLM_SUCCESS')
+        self.assertEqual(flush_transcripts(), 1)
+        message = ChatMessage.objects.get()
+        self.assertEqual(message.user_message, 'whey là gì?')
+        self.assertEqual((message.backend_status, message.response_code), (200, 'LLM_SUCCESS'))
+
+    def test_sentence_formatter_emits_complete_sentences(self):
+        from chatbot.streaming import SentenceFormatter
+        from chatbot.views import format_bot_response
+
+        formatter = SentenceFormatter()
+        self.assertEqual(formatter.feed('Ức gà giàu đạm. Nên '), ['Ức gà giàu đạm.'])
+        self.assertEqual(formatter.feed('ăn sau tập: 1. '), [])
+        self.assertEqual(formatter.close(), ['\nNên ăn sau tập:\n1.'])
+        self.assertEqual(formatter.text, 'Ức gà giàu đạm.\nNên ăn sau tập:\n1.')
+
+        # Bản xem trước xuống dòng giữa mọi câu; text cuối theo đúng format_bot_response
+        formatter = SentenceFormatter()
+        preview = formatter.feed('Ức gà giàu đạm. ức ') + formatter.feed('gà nên ăn sau tập.') + formatter.close()
+        self.assertEqual(''.join(preview), 'Ức gà giàu đạm.\nức gà nên ăn sau tập.')
+        self.assertEqual(formatter.text, format_bot_response('Ức gà giàu đạm. ức gà nên ăn sau tập.'))
+        self.assertEqual(formatter.text, 'Ức gà giàu đạm. ức gà nên ăn sau tập.')
+
+    async def test_stream_endpoint_relays_sse_chunks(self):
+        import httpx
+        from unittest import mock
+        from asgiref.sync import sync_to_async
+        from chatbot.answer_cache import get_answer_cache
+        from chatbot.llm_client import AsyncLLMClient
+        from chatbot.models import ChatMessage
+        from chatbot.transcripts import flush_transcripts
+
+        def backend(request):
+            self.assertTrue(json.loads(request.content)['stream'])
+            body = ''.join(
+                f"data: {json.dumps({'token': token})}\n\n"
+                for token in ['Whey là ', 'protein sữa. ', 'Hấp thu nhanh.']
+            ) + 'data: [DONE]\n\n'
+            return httpx.Response(200, text=body, headers={'Content-Type': 'text/event-stream'})
+
+        client = AsyncLLMClient(transport=httpx.MockTransport(backend))
+        with mock.patch('chatbot.async_views.get_async_llm_client', return_value=client):
+            response = await self.async_client.post(
+                reverse('chatbot:chat_stream'), data={'query': 'whey?'}, content_type='application/json'
+            )
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        events = [block.split('\n') for block in body.strip().split('\n\n')]
+        self.assertEqual([lines[0] for lines in events], ['event: chunk', 'event: chunk', 'event: done'])
+        self.assertEqual(json.loads(events[0][1][6:])['text'], 'Whey là protein sữa.')
+        answer = 'Whey là protein sữa.\nHấp thu nhanh.'
+        self.assertEqual(json.loads(events[-1][1][6:])['response'], answer)
+        self.assertEqual(await sync_to_async(get_answer_cache().get)('whey?'), answer)
+        await sync_to_async(flush_transcripts)()
+        self.assertEqual((await ChatMessage.objects.aget()).bot_response, answer)
+
+    async def test_stream_breaker_measures_time_to_first_chunk(self):
+        import asyncio
+        import httpx
+        from unittest import mock
+        from chatbot.circuit_breaker import get_llm_breaker, reset_llm_breaker
+        from chatbot.llm_client import AsyncLLMClient
+
+        def backend(request):
+            body = 'data: {"token": "Whey là protein. "}\n\ndata: {"token": "Hấp thu nhanh."}\n\n'
+            return httpx.Response(200, text=body, headers={'Content-Type': 'text/event-stream'})
+
+        client = AsyncLLMClient(transport=httpx.MockTransport(backend))
+        post = lambda query: self.async_client.post(
+            reverse('chatbot:chat_stream'), data={'query': query}, content_type='application/json'
+        )
+        with self.settings(LLM_BREAKER_SLOW_CALL_MS=50), \
+                mock.patch('chatbot.async_views.get_async_llm_client', return_value=client):
+            reset_llm_breaker()
+            response = await post('whey là gì?')
+            async for _ in response.streaming_content:
+                await asyncio.sleep(0.1)  # client đọc chậm không phải lỗi backend
+            self.assertEqual(get_llm_breaker().snapshot()['failure_rate'], 0.0)
+
+            get_llm_breaker()._open()
+            response = await post('creatine là gì?')
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        error = json.loads(body.split('data: ', 1)[1])
+        self.assertEqual(error['code'], 'CIRCUIT_OPEN')
+        self.assertGreater(error['retry_after'], 0)
+
+    def test_circuit_breaker_opens_and_half_opens(self):
+        from unittest import mock
+        from chatbot.circuit_breaker import CircuitBreaker
+
+        breaker = CircuitBreaker(min_calls=3, failure_rate=0.5, open_seconds=30)
+        breaker.record_success(100)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow_request())
+
+        with mock.patch('chatbot.circuit_breaker.time.monotonic', return_value=breaker.opened_at + 31):
+            self.assertTrue(breaker.allow_request())   # 1 probe
+            self.assertFalse(breaker.allow_request())  # probe đang chạy
+        breaker.record_success(120)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_circuit_breaker_counts_only_backend_failures(self):
+        import asyncio
+        import httpx
+        from unittest import mock
+        from chatbot.circuit_breaker import CircuitBreaker
+
+        def call(breaker, exc):
+            try:
+                with breaker.guard():
+                    raise exc
+            except BaseException:
+                pass
+
+        breaker = CircuitBreaker(min_calls=1, failure_rate=0.5, open_seconds=30)
+        request = httpx.Request('POST', 'https://llm.test/ask')
+        # Client ngắt, HTTP 4xx, lỗi code → không ghi
+        call(breaker, asyncio.CancelledError())
+        call(breaker, GeneratorExit())
+        call(breaker, httpx.HTTPStatusError('400', request=request, response=httpx.Response(400, request=request)))
+        call(breaker, KeyError('answer'))
+        self.assertEqual((breaker.state, breaker.snapshot()['calls']), ('closed', 0))
+
+        call(breaker, httpx.HTTPStatusError('502', request=request, response=httpx.Response(502, request=request)))
+        self.assertEqual(breaker.state, 'open')
+
+        # Probe half-open bị hủy → request sau được thăm dò lại, không kẹt half_open
+        with mock.patch('chatbot.circuit_breaker.time.monotonic', return_value=breaker.opened_at + 31):
+            call(breaker, asyncio.CancelledError())
+            self.assertTrue(breaker.allow_request())
+
+    def test_open_circuit_fails_fast_without_backend_call(self):
+        import requests
+        from unittest import mock
+        from chatbot.llm_client import get_llm_client
+
+        with mock.patch.object(get_llm_client().session, 'post',
+                               side_effect=requests.exceptions.ConnectionError) as post:
+            codes = [
+                self.client.post(
+                    reverse('chatbot:chat_api'), data={'query': f'câu hỏi {i}'}, content_type='application/json'
+                )
+                for i in range(6)
+            ]
+        self.assertEqual(post.call_count, 5)
+        self.assertEqual(codes[-1].json()['code'], 'CIRCUIT_OPEN')
+        self.assertIn('Retry-After', codes[-1])
+
+        with mock.patch.object(get_llm_client().health_session, 'get') as get:
+            response = self.client.get(reverse('chatbot:health_check'))
+        get.assert_not_called()
+        self.assertEqual(response.json()['circuit']['state'], 'open')
+
+    def test_single_flight_coalesces_concurrent_calls(self):
+        import threading
+        from chatbot.single_flight import SingleFlight, SingleFlightTimeout
+
+        single_flight = SingleFlight(wait_timeout=5)
+        release = threading.Event()
+        calls = []
+
+        def backend():
+            calls.append(1)
+            release.wait(5)
+            return 'answer'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight.do('whey la gi', backend)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        while len(single_flight.calls) == 0 or single_flight.calls['whey la gi'].waiters < 3:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('answer', False)] + [('answer', True)] * 3)
+
+        # Follower hết thời gian chờ
+        impatient = SingleFlight(wait_timeout=0.01)
+        release.clear()
+        leader = threading.Thread(target=lambda: impatient.do('q', backend))
+        leader.start()
+        while 'q' not in impatient.calls:
+            pass
+        with self.assertRaises(SingleFlightTimeout):
+            impatient.do('q', backend)
+        release.set()
+        leader.join()
+
+    def test_admission_rejects_requests_that_cannot_meet_deadline(self):
+        from chatbot.admission import AdmissionController, AdmissionRejected
+
+        controller = AdmissionController(max_in_flight=1, max_queue=5, deadline=15)
+        controller.acquire()
+        # Chưa có thống kê thời gian xử lý → xếp hàng, hết deadline thì bị từ chối
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire(deadline_seconds=0.05)
+        self.assertEqual(len(controller.waiters), 0)
+
+        controller.release(10.0)  # EWMA service time = 10s
+        controller.acquire()
+        with self.assertRaises(AdmissionRejected) as raised:
+            controller.acquire()  # chờ ~10s + xử lý 10s > deadline 15s → từ chối ngay
+        self.assertEqual(raised.exception.reason, 'deadline')
+        self.assertEqual(raised.exception.retry_after, 10)
+        self.assertEqual(controller.snapshot()['rejected'], 2)
+
+    def test_admission_queues_behind_nearly_finished_slow_call(self):
+        """LLM 20s, deadline 30s: lời gọi phía trước còn ~5s → xếp hàng được"""
+        import threading
+        import time
+        from chatbot.admission import AdmissionController
+
+        controller = AdmissionController(max_in_flight=1, max_queue=5, deadline=30)
+        controller.acquire()
+        controller.release(20.0)  # EWMA service time = 20s
+        controller.acquire()
+        controller.started[0] -= 15  # lời gọi đang chạy đã được 15s
+        self.assertAlmostEqual(controller.estimate_wait(0), 5, delta=0.5)
+
+        waited = []
+        waiter = threading.Thread(target=lambda: waited.append(controller.acquire()))
+        waiter.start()
+        while not controller.waiters and waiter.is_alive():
+            time.sleep(0.001)
+        controller.release(20.0)
+        waiter.join(5)
+        self.assertEqual(len(waited), 1)
+        self.assertEqual(controller.snapshot()['rejected'], 0)
+
+    def test_async_admission_is_fifo(self):
+        import asyncio
+        from chatbot.admission import AsyncAdmissionController
+
+        async def scenario():
+            controller = AsyncAdmissionController(max_in_flight=1, deadline=5)
+            order = []
+
+            async def worker(name):
+                async with controller.slot():
+                    order.append(name)
+                    await asyncio.sleep(0.01)
+
+            await asyncio.gather(*(worker(name) for name in 'abcd'))
+            return order, controller.snapshot()
+
+        order, stats = asyncio.run(scenario())
+        self.assertEqual(order, list('abcd'))
+        self.assertEqual(stats['max_queue_depth'], 3)
+        self.assertEqual(stats['in_flight'], 0)
+
+    def test_ngrok_url_cached_and_invalidated_on_save(self):
+        from chatbot.models import NgrokConfig
+        from chatbot.ngrok_config import get_ngrok_api_url
+
+        with self.captureOnCommitCallbacks(execute=True):
+            config = NgrokConfig.objects.create(ngrok_api_url='https://old.ngrok-free.app/ask')
+        self.assertEqual(get_ngrok_api_url(), 'https://old.ngrok-free.app/ask')
+        with self.assertNumQueries(0):
+            get_ngrok_api_url()
+
+        update = lambda **headers: self.client.post(
+            reverse('chatbot:update_ngrok'),
+            data={'ngrok_url': 'https://new.ngrok-free.app/ask'},
+            content_type='application/json',
+            headers=headers,
+        )
+        # Ẩn danh / sai token → không được đổi URL của mọi worker
+        with self.settings(NGROK_UPDATE_TOKEN='s3cret'):
+            self.assertEqual(update().status_code, 403)
+            self.assertEqual(update(X_Ngrok_Token='wrong').status_code, 403)
+            self.assertEqual(self.client.get(reverse('chatbot:update_ngrok')).status_code, 403)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = update(X_Ngrok_Token='s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(NgrokConfig.objects.get(pk=config.pk).ngrok_api_url, 'https://new.ngrok-free.app/ask')
+        self.assertEqual(get_ngrok_api_url(), 'https://new.ngrok-free.app/ask')
+
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_user('admin', password='x', is_staff=True))
+        self.assertEqual(
+            self.client.get(reverse('chatbot:update_ngrok')).json()['current_ngrok_url'],
+            'https://new.ngrok-free.app/ask'
+        )
+
+    def test_retrieval_answers_catalogue_questions_without_llm(self):
+        from unittest import mock
+        from chatbot.llm_client import get_llm_client, reset_llm_client
+        from products.tests import create_product
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_product('Whey Gold', suitable_for_goals='muscle-gain', discount_percent=10)
+            create_product('Mass Tech', slug='mass-tech', suitable_for_goals='muscle-gain', protein_per_serving=50)
+
+        reset_llm_client()
+        with mock.patch.object(get_llm_client().session, 'post') as post:
+            response = self.client.post(
+                reverse('chatbot:chat_api'),
+                data={'query': 'Whey Gold có bao nhiêu đạm và giá bao nhiêu?'},
+                content_type='application/json'
+            )
+            data = response.json()
+            self.assertEqual(data['code'], 'RETRIEVAL_ANSWER')
+            self.assertIn('24g protein', data['response'])
+            self.assertIn('450.000đ', data['response'])
+
+            data = self.client.post(
+                reverse('chatbot:chat_api'),
+                data={'query': 'Sản phẩm nào phù hợp để tăng cơ?'},
+                content_type='application/json'
+            ).json()
+            self.assertEqual(data['code'], 'RETRIEVAL_ANSWER')
+            self.assertLess(data['response'].index('Mass Tech'), data['response'].index('Whey Gold'))
+            post.assert_not_called()
+
+            # Không chắc chắn → gọi LLM kèm context
+            post.return_value = mock.Mock(status_code=200, json=mock.Mock(return_value={'answer': 'Ok.'}))
+            self.client.post(
+                reverse('chatbot:chat_api'),
+                data={'query': 'Whey Gold uống lúc nào tốt nhất?'},
+                content_type='application/json'
+            )
+        _, kwargs = post.call_args
+        self.assertTrue(kwargs['json']['context'][0].startswith('Sản phẩm Whey Gold'))
+        reset_llm_client()
+
+    def test_transcript_buffer_batches_writes(self):
+        from chatbot.models import ChatMessage
+        from chatbot.transcripts import TranscriptBuffer
+
+        buffer = TranscriptBuffer(batch_size=3, max_size=4, background=False)
+        with self.assertNumQueries(0):
+            buffer.record(user_message='q1', bot_response='a1', cache_hit=True, response_code='CACHE_HIT')
+            buffer.record(user_message='q2', bot_response='a2', latency_ms=812, backend_status=200)
+        self.assertEqual(ChatMessage.objects.count(), 0)
+
+        # Đủ batch_size → 1 bulk_create
+        with self.assertNumQueries(1):
+            buffer.record(user_message='q3', bot_response='a3')
+        self.assertEqual(ChatMessage.objects.get(user_message='q1').response_code, 'CACHE_HIT')
+        self.assertEqual(ChatMessage.objects.get(user_message='q2').latency_ms, 812)
+
+        # Buffer đầy → bỏ tin cũ nhất
+        buffer.batch_size = 10
+        for i in range(6):
+            buffer.record(user_message=f'x{i}', bot_response='a')
+        self.assertEqual(buffer.dropped, 2)
+        self.assertEqual(buffer.flush(), 4)
+        self.assertFalse(ChatMessage.objects.filter(user_message__in=['x0', 'x1']).exists())
+
+
+def _incr_shared_counter(location, times):
+    from fitblog_config.sqlite_cache import SQLiteCache
+
+    backend = SQLiteCache(location, {})
+    for _ in range(times):
+        backend.incr('hits')
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from fitblog_config.sqlite_cache import SQLiteCache
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.location = f'{self.tmpdir.name}/cache.sqlite3'
+        self.backend = SQLiteCache(self.location, {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_EVERY': 1}})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_basic_operations_and_expiry(self):
+        backend = self.backend
+        backend.set('a', {'x': 1})
+        self.assertEqual(backend.get('a'), {'x': 1})
+        self.assertFalse(backend.add('a', 'other'))
+        self.assertTrue(backend.add('b', 1, timeout=0))   # hết hạn ngay
+        self.assertIsNone(backend.get('b'))
+        self.assertTrue(backend.add('b', 2))               # key hết hạn → add được
+        self.assertEqual(backend.incr('b', 5), 7)
+        with self.assertRaises(ValueError):
+            backend.incr('missing')
+        self.assertEqual(backend.get_many(['a', 'b', 'missing']), {'a': {'x': 1}, 'b': 7})
+        backend.delete_many(['a', 'b'])
+        self.assertFalse(backend.has_key('a'))
+
+        for i in range(15):
+            backend.set(f'k{i}', i)
+        self.assertLessEqual(backend._connection().execute('SELECT COUNT(*) FROM cache').fetchone()[0], 10)
+
+    def test_incr_is_atomic_across_processes(self):
+        import multiprocessing
+
+        self.backend.set('hits', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_incr_shared_counter, args=(self.location, 50)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.backend.get('hits'), 200)
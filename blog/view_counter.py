@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Buffered view counter cho blog Post.
+
+Vấn đề cũ: mỗi lượt xem = post.views += 1; post.save() → read-modify-write
+(mất lượt khi 2 request song song) + khóa row của bài hot.
+
+Thiết kế:
+- record_view(): cache.incr() counter "pending" của bài viết (atomic, không chạm DB)
+- flush_views(): đọc các delta, trừ đúng delta đó khỏi cache (decr), rồi ghi
+  1 câu UPDATE duy nhất: views = views + CASE id WHEN ... THEN delta END
+- Flush tự động mỗi BLOG_VIEW_FLUSH_INTERVAL giây (request đầu tiên sau mốc đó
+  làm việc flush) hoặc khi có quá BLOG_VIEW_FLUSH_MAX_PENDING bài chờ
+- python manage.py flush_post_views: flush thủ công / cron
+- Mỗi lần flush bump blog content version (blog/cache.py)
+
+Lưu ý: counter nằm trong cache → nếu cache bị xóa trước khi flush thì mất
+tối đa 1 interval lượt xem (chấp nhận được cho số liệu lượt xem).
+
+Example:
+    record_view(post.id)
+    post.views + get_pending_views(post.id)   # số hiển thị ngay
+    flush_views()                             # → {post_id: delta}
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .cache import bump_content_version
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+PENDING_KEY_PREFIX = 'blog:views:pending:'
+FLUSH_LOCK_KEY = 'blog:views:flush_lock'
+FLUSH_LOCK_TIMEOUT = 60
+
+
+def _flush_interval():
+    return getattr(settings, 'BLOG_VIEW_FLUSH_INTERVAL', 30)
+
+
+def _max_pending():
+    return getattr(settings, 'BLOG_VIEW_FLUSH_MAX_PENDING', 200)
+
+
+# Các post có lượt xem chưa flush trong process này
+_dirty_ids = set()
+_dirty_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _pending_key(post_id):
+    return f'{PENDING_KEY_PREFIX}{post_id}'
+
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+def record_view(post_id):
+    """
+    Ghi nhận 1 lượt xem (không query DB, trừ khi tới lúc flush).
+
+    Returns:
+        int: số lượt xem đang chờ flush của bài viết
+    """
+    key = _pending_key(post_id)
+    cache.add(key, 0, None)
+    try:
+        pending = cache.incr(key)
+    except ValueError:
+        # Key vừa bị evict giữa add() và incr()
+        cache.set(key, 1, None)
+        pending = 1
+
+    with _dirty_lock:
+        _dirty_ids.add(post_id)
+        should_flush = (
+            time.monotonic() - _last_flush >= _flush_interval()
+            or len(_dirty_ids) >= _max_pending()
+        )
+
+    if should_flush:
+        flush_views()
+    return pending
+
+
+def get_pending_views(post_id):
+    """Số lượt xem đã ghi nhận nhưng chưa flush xuống DB"""
+    return cache.get(_pending_key(post_id)) or 0
+
+
+def flush_views(post_ids=None):
+    """
+    Ghi các delta đang chờ xuống Post.views bằng 1 câu UPDATE.
+
+    Args:
+        post_ids: danh sách post cần flush; None = các post dirty trong process
+                  này (management command truyền toàn bộ id bài viết)
+
+    Returns:
+        dict: {post_id: delta đã ghi}; {} nếu không có gì hoặc đang có flush khác
+    """
+    global _last_flush
+    from .models import Post
+
+    with _dirty_lock:
+        if post_ids is None:
+            post_ids = list(_dirty_ids)
+        _dirty_ids.difference_update(post_ids)
+        _last_flush = time.monotonic()
+
+    if not post_ids:
+        return {}
+
+    if not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        # Process khác đang flush → trả id lại để lần sau flush tiếp
+        with _dirty_lock:
+            _dirty_ids.update(post_ids)
+        return {}
+
+    try:
+        keys = {_pending_key(post_id): post_id for post_id in post_ids}
+        deltas = {
+            keys[key]: value
+            for key, value in cache.get_many(list(keys)).items()
+            if value and value > 0
+        }
+        if not deltas:
+            return {}
+
+        try:
+            Post.objects.filter(id__in=deltas).update(
+                views=F('views') + Case(
+                    *[When(id=post_id, then=Value(delta)) for post_id, delta in deltas.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+        except Exception:
+            # DB lỗi → counter vẫn nằm trong cache, flush lại lần sau
+            with _dirty_lock:
+                _dirty_ids.update(deltas)
+            raise
+
+        # Chỉ trừ đúng phần đã ghi → lượt xem tới trong lúc flush vẫn được giữ lại
+        for post_id, delta in deltas.items():
+            try:
+                cache.decr(_pending_key(post_id), delta)
+            except ValueError:
+                pass
+
+        # Featured-by-views / page cache phải thấy số lượt xem mới
+        bump_content_version()
+
+        logger.info(f"👁️ Flushed views for {len(deltas)} posts (+{sum(deltas.values())})")
+        return deltas
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
@@ -1,10 +1,18 @@
 from django.shortcuts import render, get_object_or_404
 from django.views import View
 from django.views.generic import ListView, DetailView
-from django.db.models import Q, Count
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from .models import Post, Category, Comment, NewsletterSubscriber
-
+from .view_counter import record_view
+from .search import search_posts
+from .related import get_related_posts
+from .cache import (
+    cache_anonymous_page, get_categories_overview, get_featured_posts,
+    get_latest_posts, get_sidebar_categories,
+)
+
+@method_decorator(cache_anonymous_page(), name='dispatch')
 class PostListView(ListView):
     """Danh sách bài viết"""
     model = Post
@@ -20,23 +28,17 @@ class PostListView(ListView):
         if category_slug:
             queryset = queryset.filter(category__slug=category_slug)
         
-        # Search
+        # Search: ranked full-text, bỏ dấu tiếng Việt (blog/search.py)
         search_query = self.request.GET.get('q')
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) | 
-                Q(content__icontains=search_query) |
-                Q(tags__icontains=search_query)
-            )
+            queryset = search_posts(queryset, search_query)
         
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.exclude(slug='').annotate(post_count=Count('posts'))
-        context['featured_posts'] = Post.objects.filter(
-            status='published'
-        ).order_by('-views')[:3]
+        context['categories'] = get_sidebar_categories()
+        context['featured_posts'] = get_featured_posts(3)
         context['search_query'] = self.request.GET.get('q', '')
         return context
 
@@ -53,22 +55,18 @@ class PostDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        post = self.get_object()
+        post = self.object
         
-        # Tăng lượt xem
-        post.views += 1
-        post.save(update_fields=['views'])
+        # Tăng lượt xem: cộng trong cache, flush định kỳ (blog/view_counter.py)
+        post.views += record_view(post.id)
         
         # Bình luận được phê duyệt
         context['comments'] = post.comments.filter(is_approved=True).order_by('-created_at')
         
-        # Bài viết liên quan
-        context['related_posts'] = Post.objects.filter(
-            category=post.category,
-            status='published'
-        ).exclude(id=post.id)[:3]
+        # Bài viết liên quan: TF-IDF tính sẵn (blog/related.py), 1 query
+        context['related_posts'] = get_related_posts(post, limit=3)
         
-        context['categories'] = Category.objects.exclude(slug='').annotate(post_count=Count('posts'))
+        context['categories'] = get_sidebar_categories()
         
         return context
 
@@ -92,6 +90,7 @@ class PostDetailView(DetailView):
         return self.get(request, *args, **kwargs)
 
 
+@method_decorator(cache_anonymous_page(), name='dispatch')
 class CategoryDetailView(ListView):
     """Danh sách bài viết theo danh mục"""
     model = Post
@@ -108,7 +107,7 @@ class CategoryDetailView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.exclude(slug='').annotate(post_count=Count('posts'))
+        context['categories'] = get_sidebar_categories()
         context['current_category'] = get_object_or_404(Category, slug=self.kwargs.get('slug'))
         return context
 
@@ -119,38 +118,26 @@ class CategoriesView(View):
     template_name = 'blog/categories.html'
 
     def get(self, request):
-        # Get all categories with post count
-        categories = Category.objects.exclude(slug='').annotate(
-            post_count=Count('posts')
-        ).filter(post_count__gt=0).order_by('name')
-        
-        # Get featured posts from each category
-        category_data = []
-        for category in categories:
-            posts = Post.objects.filter(
-                category=category,
-                status='published'
-            ).order_by('-published_at')[:3]
-            category_data.append({
-                'category': category,
-                'posts': posts
-            })
+        # Categories + top 3 bài mỗi category: 2 query (window function), cache theo content version
+        category_data = get_categories_overview()
         
         context = {
             'category_data': category_data,
-            'categories': categories,
+            'categories': [item['category'] for item in category_data],
         }
         return render(request, self.template_name, context)
 
 
+@method_decorator(cache_anonymous_page(), name='dispatch')
 class HomeView(View):
     """Trang chủ"""
     template_name = 'blog/home.html'
 
     def get(self, request):
-        categories = Category.objects.exclude(slug='').annotate(post_count=Count('posts'))
-        featured_posts = Post.objects.filter(status='published').order_by('-views')[:6]
-        latest_posts = Post.objects.filter(status='published').order_by('-published_at')[:3]
+        # Fragment dùng chung, tính 1 lần mỗi content version (blog/cache.py)
+        categories = get_sidebar_categories()
+        featured_posts = get_featured_posts(6)
+        latest_posts = get_latest_posts(3)
         
         context = {
             'categories': categories,
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import NgrokConfig, ChatMessage
+from .models import NgrokConfig, ChatMessage, ChatMessageHourlySummary
 
 
 @admin.register(NgrokConfig)
@@ -36,10 +36,14 @@ class NgrokConfigAdmin(admin.ModelAdmin):
 class ChatMessageAdmin(admin.ModelAdmin):
     """Admin interface cho Chat Messages"""
     
-    list_display = ('timestamp', 'user_message_preview', 'bot_response_preview')
-    list_filter = ('timestamp',)
+    list_display = ('timestamp', 'user_message_preview', 'bot_response_preview', 'response_code', 'latency_ms')
+    list_filter = ('timestamp', 'response_code', 'cache_hit', 'backend_status')
     search_fields = ('user_message', 'bot_response')
-    readonly_fields = ('user_message', 'bot_response', 'timestamp')
+    date_hierarchy = 'timestamp'
+    readonly_fields = (
+        'user_message', 'bot_response', 'timestamp',
+        'latency_ms', 'backend_status', 'cache_hit', 'response_code',
+    )
     
     def user_message_preview(self, obj):
         """Hiển thị preview user message"""
@@ -58,3 +62,18 @@ class ChatMessageAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         # Cho phép xóa message
         return True
+
+
+
+@admin.register(ChatMessageHourlySummary)
+class ChatMessageHourlySummaryAdmin(admin.ModelAdmin):
+    """Số tin nhắn theo giờ còn lại sau khi purge_old_records xóa ChatMessage cũ"""
+    
+    list_display = ('hour', 'message_count')
+    date_hierarchy = 'hour'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
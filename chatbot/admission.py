@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Admission control cho LLM backend: giới hạn số lời gọi đang chạy + hàng đợi FIFO có deadline.
+
+Colab GPU chỉ sinh được vài câu trả lời cùng lúc; gửi không giới hạn → tất cả
+cùng chậm rồi cùng timeout (goodput = 0). Ở đây:
+- Tối đa max_in_flight lời gọi backend / process (CHATBOT_MAX_IN_FLIGHT)
+- Request dư xếp hàng FIFO (tối đa max_queue), chờ tới khi có slot
+- Mỗi request có deadline (CHATBOT_ADMISSION_DEADLINE_SECONDS): nếu thời gian
+  chờ ước lượng vượt deadline - thời gian xử lý trung bình (EWMA) → từ chối NGAY
+  (AdmissionRejected → 503 + Retry-After) thay vì chờ rồi vẫn timeout.
+  Thời gian chờ tính từ thời gian CÒN LẠI của các lời gọi đang chạy (không phải
+  nguyên 1 service time / lượt) → LLM chậm (vd 20s, deadline 30s) vẫn nhận
+  request xếp hàng khi lời gọi phía trước sắp xong
+- Thống kê: in_flight, queue_depth, wait EWMA, admitted / rejected
+
+AdmissionController cho view sync (threading.Condition),
+AsyncAdmissionController cho async view (asyncio.Future, 1 instance / event loop).
+
+Example:
+    try:
+        with get_admission_controller().slot():
+            result = client.ask(url, query)
+    except AdmissionRejected as e:
+        ...  # 503, Retry-After: e.retry_after
+
+    async with get_async_admission_controller().slot():
+        result = await client.ask(url, query)
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_MAX_QUEUE = 50
+DEFAULT_DEADLINE = 30   # giây, nhỏ hơn timeout 35s phía messenger.js
+EWMA_ALPHA = 0.2
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class AdmissionRejected(Exception):
+    """Không nhận request: hàng đợi đầy hoặc không kịp deadline"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f'LLM admission rejected ({reason}), retry after {retry_after}s')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# ============================================================================
+# SHARED LOGIC
+# ============================================================================
+
+class _AdmissionBase:
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, max_queue=DEFAULT_MAX_QUEUE, deadline=DEFAULT_DEADLINE):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.in_flight = 0
+        self.waiters = deque()
+        self.started = deque()  # time.monotonic() lúc các lời gọi đang chạy nhận slot (cũ → mới)
+        # Thống kê (EWMA, giây)
+        self.service_time = None
+        self.wait_time = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+
+    def estimate_wait(self, position):
+        """
+        Thời gian chờ ước lượng cho request ở vị trí `position` (0 = đầu hàng):
+        slot thứ position % max_in_flight được trả (theo thời gian còn lại của
+        lời gọi đang chạy, dự đoán bằng EWMA) + mỗi vòng hàng đợi trước đó 1 service time
+        """
+        if self.service_time is None:
+            return 0.0
+        now = time.monotonic()
+        remaining = sorted(max(0.0, self.service_time - (now - started)) for started in self.started)
+        remaining = [0.0] * max(0, self.max_in_flight - len(remaining)) + remaining
+        rounds, index = divmod(position, self.max_in_flight)
+        return remaining[index] + rounds * self.service_time
+
+    def _check_admission(self, deadline_seconds):
+        """Raise AdmissionRejected nếu request mới không nên xếp hàng"""
+        position = len(self.waiters)
+        estimated_wait = self.estimate_wait(position)
+        retry_after = max(1, math.ceil(estimated_wait))
+        if position >= self.max_queue:
+            self._reject('queue_full', retry_after)
+        # Chờ xong còn phải đủ thời gian xử lý trong deadline
+        if estimated_wait > deadline_seconds - (self.service_time or 0.0):
+            self._reject('deadline', retry_after)
+
+    def _reject(self, reason, retry_after):
+        self.rejected += 1
+        logger.warning(
+            f"🚦 LLM admission rejected ({reason}): in_flight={self.in_flight}, "
+            f"queue={len(self.waiters)}, retry_after={retry_after}s"
+        )
+        raise AdmissionRejected(reason, retry_after)
+
+    def _slot_started(self):
+        self.started.append(time.monotonic())
+
+    def _slot_finished(self):
+        # release() không biết slot nào xong → bỏ lời gọi chạy lâu nhất (LLM trả lời ~FIFO)
+        if self.started:
+            self.started.popleft()
+
+    def _record_admitted(self, waited):
+        self.admitted += 1
+        self.wait_time = EWMA_ALPHA * waited + (1 - EWMA_ALPHA) * self.wait_time
+
+    def _record_service(self, elapsed):
+        if self.service_time is None:
+            self.service_time = elapsed
+        else:
+            self.service_time = EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.service_time
+
+    def _track_depth(self):
+        self.max_queue_depth = max(self.max_queue_depth, len(self.waiters))
+
+    def snapshot(self):
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'queue_depth': len(self.waiters),
+            'max_queue_depth': self.max_queue_depth,
+            'avg_wait_ms': round(self.wait_time * 1000),
+            'avg_service_ms': round(self.service_time * 1000) if self.service_time is not None else None,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+        }
+
+
+# ============================================================================
+# SYNC
+# ============================================================================
+
+class AdmissionController(_AdmissionBase):
+    """Giới hạn cho thread (view sync)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.condition = threading.Condition()
+
+    def acquire(self, deadline_seconds=None):
+        """Chờ tới khi có slot. Returns: số giây đã chờ"""
+        deadline_seconds = deadline_seconds or self.deadline
+        started = time.monotonic()
+        with self.condition:
+            if self.in_flight < self.max_in_flight and not self.waiters:
+                self.in_flight += 1
+                self._slot_started()
+                self._record_admitted(0.0)
+                return 0.0
+
+            self._check_admission(deadline_seconds)
+            ticket = object()
+            self.waiters.append(ticket)
+            self._track_depth()
+            try:
+                while not (self.waiters[0] is ticket and self.in_flight < self.max_in_flight):
+                    remaining = deadline_seconds - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._reject('deadline', max(1, math.ceil(self.estimate_wait(len(self.waiters)))))
+                    self.condition.wait(remaining)
+            finally:
+                self.waiters.remove(ticket)
+                self.condition.notify_all()
+            self.in_flight += 1
+            self._slot_started()
+            waited = time.monotonic() - started
+            self._record_admitted(waited)
+            return waited
+
+    def release(self, elapsed):
+        with self.condition:
+            self.in_flight -= 1
+            self._slot_finished()
+            self._record_service(elapsed)
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self, deadline_seconds=None):
+        self.acquire(deadline_seconds)
+        started = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.release(time.monotonic() - started)
+
+
+# ============================================================================
+# ASYNC
+# ============================================================================
+
+class AsyncAdmissionController(_AdmissionBase):
+    """Giới hạn cho coroutine trong 1 event loop (không cần lock)"""
+
+    async def acquire(self, deadline_seconds=None):
+        deadline_seconds = deadline_seconds or self.deadline
+        if self.in_flight < self.max_in_flight and not self.waiters:
+            self.in_flight += 1
+            self._slot_started()
+            self._record_admitted(0.0)
+            return 0.0
+
+        self._check_admission(deadline_seconds)
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        self._track_depth()
+        try:
+            # release() chuyển slot trực tiếp cho future đầu hàng (in_flight đã +1)
+            await asyncio.wait_for(future, deadline_seconds)
+        except asyncio.TimeoutError:
+            if not (future.done() and not future.cancelled()):
+                self._reject('deadline', max(1, math.ceil(self.estimate_wait(len(self.waiters)))))
+        except BaseException:
+            # Bị hủy (client ngắt) đúng lúc vừa nhận slot → trả slot lại
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if future in self.waiters:
+                self.waiters.remove(future)
+        waited = time.monotonic() - started
+        self._record_admitted(waited)
+        return waited
+
+    def release(self, elapsed=None):
+        if elapsed is not None:
+            self._record_service(elapsed)
+        self._slot_finished()
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(None)  # giữ nguyên in_flight: slot chuyển cho waiter
+                self._slot_started()
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, deadline_seconds=None):
+        await self.acquire(deadline_seconds)
+        started = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.release(time.monotonic() - started)
+
+
+# ============================================================================
+# SINGLETONS
+# ============================================================================
+
+def _options():
+    return {
+        'max_in_flight': _setting('CHATBOT_MAX_IN_FLIGHT', DEFAULT_MAX_IN_FLIGHT),
+        'max_queue': _setting('CHATBOT_MAX_QUEUE', DEFAULT_MAX_QUEUE),
+        'deadline': _setting('CHATBOT_ADMISSION_DEADLINE_SECONDS', DEFAULT_DEADLINE),
+    }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+_async_controllers = weakref.WeakKeyDictionary()
+
+
+def get_admission_controller():
+    """AdmissionController dùng chung cho các thread trong process"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(**_options())
+    return _controller
+
+
+def get_async_admission_controller():
+    """AsyncAdmissionController của event loop đang chạy"""
+    loop = asyncio.get_running_loop()
+    controller = _async_controllers.get(loop)
+    if controller is None:
+        controller = _async_controllers[loop] = AsyncAdmissionController(**_options())
+    return controller
+
+
+def reset_admission_controllers():
+    """Bỏ các controller hiện tại (test / đổi settings)"""
+    global _controller
+    with _controller_lock:
+        _controller = None
+    _async_controllers.clear()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Cache câu trả lời chatbot cho các câu hỏi lặp lại.
+
+- Key = câu hỏi đã chuẩn hóa: lowercase, bỏ dấu tiếng Việt
+  (blog.search.fold_diacritics), bỏ dấu câu, gộp khoảng trắng
+  → "Bao nhiêu ĐẠM trong gà?" == "bao nhieu dam trong ga"
+- LRU trong process (OrderedDict) + TTL: hit trả về ngay, không gọi LLM
+- Near-duplicate (tùy chọn, CHATBOT_ANSWER_CACHE_SIMILARITY > 0):
+  TF-IDF n-gram ký tự trên các key đang có, cosine >= ngưỡng → coi là cùng câu hỏi.
+  Đặt ngưỡng cao (~0.9): "đạm trong gà" và "đạm trong bò" khá giống nhau!
+- Seed từ lịch sử ChatMessage ở lần dùng đầu tiên (CHATBOT_ANSWER_CACHE_SEED)
+
+Example:
+    cache = get_answer_cache()
+    answer = cache.get(query)
+    if answer is None:
+        answer = ...  # gọi LLM
+        cache.set(query, answer)
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from blog.search import fold_diacritics
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL = 60 * 60 * 6        # 6 giờ
+DEFAULT_SIMILARITY = 0.0         # 0 = chỉ khớp chính xác (sau chuẩn hóa)
+DEFAULT_SEED_LIMIT = 500         # số ChatMessage gần nhất dùng để seed (0 = không seed)
+NGRAM_RANGE = (2, 4)
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]+', re.UNICODE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def normalize_query(query):
+    """
+    Example:
+        normalize_query('  Bao nhiêu ĐẠM   trong gà?? ') → 'bao nhieu dam trong ga'
+    """
+    text = _PUNCTUATION_RE.sub(' ', fold_diacritics(query or ''))
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+class AnswerCache:
+    """
+    LRU + TTL thread-safe, key là câu hỏi đã chuẩn hóa.
+
+    Attributes:
+        hits / misses: thống kê đơn giản cho admin / log
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, similarity=DEFAULT_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.entries = OrderedDict()  # key → (answer, expires_at)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Index near-duplicate, build lại lười khi entries thay đổi
+        self._index = None
+        self._index_dirty = True
+
+    def get(self, query):
+        """Câu trả lời đã cache hoặc None"""
+        key = normalize_query(query)
+        if not key:
+            return None
+
+        now = time.monotonic()
+        with self.lock:
+            answer = self._get_exact(key, now)
+            if answer is None and self.similarity > 0:
+                match = self._nearest(key)
+                if match is not None:
+                    answer = self._get_exact(match, now)
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return answer
+
+    def set(self, query, answer, ttl=None):
+        key = normalize_query(query)
+        if not key or not answer:
+            return
+        expires_at = time.monotonic() + (ttl or self.ttl)
+        with self.lock:
+            if key not in self.entries:
+                self._index_dirty = True
+            self.entries[key] = (answer, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)  # LRU: bỏ key ít dùng nhất
+                self._index_dirty = True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self._index = None
+            self._index_dirty = True
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    # ---------- internals (gọi khi đang giữ lock) ----------
+
+    def _get_exact(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        answer, expires_at = entry
+        if expires_at <= now:
+            del self.entries[key]
+            self._index_dirty = True
+            return None
+        self.entries.move_to_end(key)
+        return answer
+
+    def _nearest(self, key):
+        """Key đang cache giống `key` nhất (cosine >= similarity) hoặc None"""
+        if not self.entries:
+            return None
+        if self._index_dirty:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+
+            keys = list(self.entries)
+            vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=NGRAM_RANGE, sublinear_tf=True)
+            self._index = (keys, vectorizer, vectorizer.fit_transform(keys))
+            self._index_dirty = False
+
+        keys, vectorizer, matrix = self._index
+        scores = (matrix @ vectorizer.transform([key]).T).toarray().ravel()
+        best = int(scores.argmax())
+        if scores[best] >= self.similarity:
+            return keys[best]
+        return None
+
+    # ---------- seeding ----------
+
+    def seed_from_history(self, limit=DEFAULT_SEED_LIMIT):
+        """
+        Nạp các cặp (câu hỏi, câu trả lời) gần nhất còn trong TTL từ ChatMessage.
+        Chỉ câu trả lời LLM (LLM_SUCCESS): RETRIEVAL_ANSWER chứa giá / dữ liệu
+        catalogue (cache được kiểm tra trước retrieval → sẽ trả giá cũ), và bỏ
+        thông báo "không có câu trả lời" (dòng cũ ghi nhầm là LLM_SUCCESS).
+
+        Returns:
+            int: số entry đã nạp
+        """
+        from .models import ChatMessage
+        from .views import NO_ANSWER_MESSAGE
+
+        if limit <= 0:
+            return 0
+        since = timezone.now() - timedelta(seconds=self.ttl)
+        rows = list(
+            ChatMessage.objects.filter(timestamp__gte=since, response_code='LLM_SUCCESS')
+            .exclude(bot_response__in=['', NO_ANSWER_MESSAGE])
+            .order_by('-timestamp')
+            .values_list('user_message', 'bot_response', 'timestamp')[:limit]
+        )
+        now = timezone.now()
+        # Cũ → mới: câu hỏi mới nhất nằm cuối LRU; TTL còn lại tính theo timestamp gốc
+        for user_message, bot_response, timestamp in reversed(rows):
+            remaining = self.ttl - (now - timestamp).total_seconds()
+            if remaining > 0:
+                self.set(user_message, bot_response, ttl=remaining)
+        logger.info(f"💾 Chatbot answer cache seeded with {len(self)} entries")
+        return len(self)
+
+
+# ============================================================================
+# PER-PROCESS SINGLETON
+# ============================================================================
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """AnswerCache dùng chung trong process (seed từ ChatMessage ở lần gọi đầu)"""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                answer_cache = AnswerCache(
+                    max_entries=_setting('CHATBOT_ANSWER_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+                    ttl=_setting('CHATBOT_ANSWER_CACHE_TTL', DEFAULT_TTL),
+                    similarity=_setting('CHATBOT_ANSWER_CACHE_SIMILARITY', DEFAULT_SIMILARITY),
+                )
+                try:
+                    answer_cache.seed_from_history(_setting('CHATBOT_ANSWER_CACHE_SEED', DEFAULT_SEED_LIMIT))
+                except Exception:
+                    logger.exception("Không seed được chatbot answer cache (bỏ qua)")
+                _answer_cache = answer_cache
+    return _answer_cache
+
+
+def reset_answer_cache():
+    """Bỏ cache hiện tại (test / đổi settings)"""
+    global _answer_cache
+    with _answer_cache_lock:
+        _answer_cache = None
@@ -4,3 +4,7 @@ class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
     verbose_name = 'Chatbot'
+
+    def ready(self):
+        """Register retrieval index invalidation signals"""
+        import chatbot.signals
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Async chatbot endpoints (chạy qua ASGI: fitblog_config/asgi.py).
+
+Bản sync (chatbot/views.py) giữ 1 worker gunicorn tới 30s khi chờ LLM;
+ở đây lời gọi LLM là httpx (await) → event loop phục vụ request khác trong
+lúc chờ, 1 process giữ được hàng trăm câu hỏi đang chờ cùng lúc.
+Truy cập DB (NgrokConfig, seed answer cache, retrieval index) đi qua sync_to_async;
+ChatMessage chỉ vào buffer (chatbot/transcripts.py) nên gọi thẳng.
+
+Cùng request / response JSON với chatbot.views (dùng chung helpers).
+CHATBOT_ASYNC_VIEWS=True → /chatbot/api/chat/ và /chatbot/health/ trỏ tới đây.
+
+chat_stream: cùng request, trả Server-Sent Events (chatbot/streaming.py).
+Chỉ thực sự stream khi chạy ASGI; dưới WSGI Django gom hết rồi mới gửi.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .admission import AdmissionRejected, get_async_admission_controller
+from .answer_cache import get_answer_cache, normalize_query
+from .circuit_breaker import CircuitOpenError, get_llm_breaker
+from .llm_client import get_async_llm_client
+from .ngrok_config import get_ngrok_api_url
+from .retrieval import retrieve_for_chat
+from .single_flight import SingleFlightTimeout, get_async_single_flight
+from .streaming import SentenceFormatter, error_event, sse_event
+from .views import (
+    NO_ANSWER_MESSAGE, cached_health_response, chat_error, chat_success, format_bot_response,
+    health_offline_response, health_response, llm_answer_code, save_chat_message, validate_query,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _method_not_allowed(allowed):
+    response = JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+    response['Allow'] = ', '.join(allowed)
+    return response
+
+
+async def chat_api(request):
+    """
+    API Endpoint: POST /chatbot/api/chat/ (async)
+    Request: {"query": "bao nhiêu đạm có trong gà?"}
+    Response: {"success": true, "response": "...", "timestamp": "..."}
+    """
+    import httpx
+
+    if request.method != 'POST':
+        return _method_not_allowed(['POST'])
+
+    try:
+        data = json.loads(request.body)
+        user_query = data.get('query', '').strip()
+    except (json.JSONDecodeError, AttributeError):
+        return chat_error('JSON_ERROR')
+
+    invalid = validate_query(user_query)
+    if invalid is not None:
+        return invalid
+
+    logger.info(f"🔄 Chat request (async): {user_query[:50]}...")
+
+    try:
+        # Lần đầu seed từ ChatMessage (DB) → chạy trong thread
+        answer_cache = await sync_to_async(get_answer_cache)()
+        cached_response = answer_cache.get(user_query)
+        if cached_response is not None:
+            logger.info(f"⚡ Answer cache hit: {user_query[:50]}...")
+            save_chat_message(user_query, cached_response, cache_hit=True, response_code='CACHE_HIT')
+            return chat_success(cached_response, cached=True, code='CACHE_HIT')
+
+        # Build / query index đọc DB → chạy trong thread
+        retrieval = await sync_to_async(retrieve_for_chat)(user_query)
+        if retrieval.answer is not None:
+            logger.info(f"🔎 Retrieval answer: {user_query[:50]}...")
+            save_chat_message(user_query, retrieval.answer, response_code='RETRIEVAL_ANSWER')
+            return chat_success(retrieval.answer, sources=retrieval.sources, code='RETRIEVAL_ANSWER')
+
+        ngrok_api_url = await sync_to_async(get_ngrok_api_url)()
+
+        async def call_backend():
+            async with get_async_admission_controller().slot():
+                with get_llm_breaker().guard():
+                    return await get_async_llm_client().ask(ngrok_api_url, user_query, **retrieval.payload())
+
+        try:
+            # Cùng câu hỏi đang chờ LLM trong process → await chung 1 lời gọi
+            result, coalesced = await get_async_single_flight().do(normalize_query(user_query), call_backend)
+        except CircuitOpenError as e:
+            logger.warning(f"⚡ LLM circuit open, fail fast (retry after {e.retry_after}s)")
+            return chat_error('CIRCUIT_OPEN', retry_after=e.retry_after)
+        except AdmissionRejected as e:
+            return chat_error('OVERLOADED', retry_after=e.retry_after)
+        except (httpx.TimeoutException, SingleFlightTimeout):
+            logger.error("LLM Timeout")
+            return chat_error('TIMEOUT')
+        except httpx.TransportError:
+            logger.error("LLM Connection Error")
+            return chat_error('CONNECTION_ERROR')
+        except httpx.HTTPStatusError as e:
+            logger.error(f"LLM HTTP Error: {e}")
+            return chat_error('LLM_HTTP_ERROR')
+        except ValueError:
+            logger.error("❌ Invalid LLM response format")
+            return chat_error('INVALID_RESPONSE')
+
+        # LLM không trả lời → thông báo, KHÔNG cache
+        answer = format_bot_response(result.data.get('answer'))
+        bot_response = answer or NO_ANSWER_MESSAGE
+        code = llm_answer_code(answer)
+        logger.info(f"✅ LLM response ({result.latency_ms:.0f}ms): {bot_response[:100]}...")
+        if answer:
+            answer_cache.set(user_query, answer)
+        save_chat_message(
+            user_query, bot_response, latency_ms=round(result.latency_ms),
+            backend_status=result.status_code, response_code=code,
+        )
+
+        return chat_success(
+            bot_response, latency_ms=round(result.latency_ms), coalesced=coalesced, code=code
+        )
+
+    except Exception as e:
+        logger.error(f"❌ Unexpected error: {str(e)}")
+        return chat_error('SERVER_ERROR')
+
+
+async def chat_stream(request):
+    """
+    API Endpoint: POST /chatbot/api/chat/stream/
+    Request: {"query": "bao nhiêu đạm có trong gà?"}
+    Response: text/event-stream - các event 'chunk' rồi 'done' (hoặc 'error')
+    Câu hỏi không hợp lệ → JSON lỗi như chat_api (status 400).
+    """
+    if request.method != 'POST':
+        return _method_not_allowed(['POST'])
+
+    try:
+        data = json.loads(request.body)
+        user_query = data.get('query', '').strip()
+    except (json.JSONDecodeError, AttributeError):
+        return chat_error('JSON_ERROR')
+
+    invalid = validate_query(user_query)
+    if invalid is not None:
+        return invalid
+
+    logger.info(f"🔄 Chat stream request: {user_query[:50]}...")
+    answer_cache = await sync_to_async(get_answer_cache)()
+    ngrok_api_url = await sync_to_async(get_ngrok_api_url)()
+
+    response = StreamingHttpResponse(
+        _stream_answer(user_query, answer_cache, ngrok_api_url),
+        content_type='text/event-stream; charset=utf-8',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx / proxy không buffer SSE
+    return response
+
+
+async def _stream_answer(user_query, answer_cache, ngrok_api_url):
+    """Async generator các SSE event cho 1 câu hỏi"""
+    import httpx
+
+    cached_response = answer_cache.get(user_query)
+    if cached_response is not None:
+        logger.info(f"⚡ Answer cache hit: {user_query[:50]}...")
+        yield sse_event('chunk', {'text': cached_response})
+        save_chat_message(user_query, cached_response, cache_hit=True, response_code='CACHE_HIT')
+        yield sse_event('done', {
+            'success': True, 'response': cached_response, 'cached': True,
+            'code': 'CACHE_HIT', 'timestamp': datetime.now().isoformat(),
+        })
+        return
+
+    retrieval = await sync_to_async(retrieve_for_chat)(user_query)
+    if retrieval.answer is not None:
+        logger.info(f"🔎 Retrieval answer: {user_query[:50]}...")
+        yield sse_event('chunk', {'text': retrieval.answer})
+        save_chat_message(user_query, retrieval.answer, response_code='RETRIEVAL_ANSWER')
+        yield sse_event('done', {
+            'success': True, 'response': retrieval.answer, 'sources': retrieval.sources,
+            'code': 'RETRIEVAL_ANSWER', 'timestamp': datetime.now().isoformat(),
+        })
+        return
+
+    formatter = SentenceFormatter()
+    started = time.perf_counter()
+    admission = get_async_admission_controller()
+    try:
+        await admission.acquire()
+    except AdmissionRejected as e:
+        yield error_event('OVERLOADED', retry_after=e.retry_after)
+        return
+
+    # Slot giữ tới hết stream (giới hạn số câu trả lời Colab sinh cùng lúc), nhưng
+    # breaker + EWMA service time chỉ đo tới đoạn đầu tiên: thời gian stream /
+    # client đọc chậm không được tính là "gọi chậm"
+    backend_started = time.perf_counter()
+    service_time = None
+    pieces = get_async_llm_client().stream(ngrok_api_url, user_query, **retrieval.payload())
+    try:
+        with get_llm_breaker().guard():
+            first = await anext(pieces, None)
+        service_time = time.perf_counter() - backend_started
+        if first is not None:
+            for text in formatter.feed(first):
+                yield sse_event('chunk', {'text': text})
+            async for piece in pieces:
+                for text in formatter.feed(piece):
+                    yield sse_event('chunk', {'text': text})
+        for text in formatter.close():
+            yield sse_event('chunk', {'text': text})
+    except CircuitOpenError as e:
+        logger.warning("⚡ LLM circuit open, fail fast (stream)")
+        yield error_event('CIRCUIT_OPEN', retry_after=e.retry_after)
+        return
+    except httpx.TimeoutException:
+        logger.error("LLM Timeout (stream)")
+        yield error_event('TIMEOUT')
+        return
+    except httpx.TransportError:
+        logger.error("LLM Connection Error (stream)")
+        yield error_event('CONNECTION_ERROR')
+        return
+    except httpx.HTTPStatusError as e:
+        logger.error(f"LLM HTTP Error (stream): {e}")
+        yield error_event('LLM_HTTP_ERROR')
+        return
+    except ValueError:
+        logger.error("❌ Invalid LLM response format (stream)")
+        yield error_event('INVALID_RESPONSE')
+        return
+    except Exception as e:
+        logger.error(f"❌ Unexpected error (stream): {str(e)}")
+        yield error_event('SERVER_ERROR')
+        return
+    finally:
+        await pieces.aclose()  # client ngắt giữa chừng → đóng kết nối tới backend
+        admission.release(service_time if service_time is not None else time.perf_counter() - backend_started)
+
+    # Cùng format với chat_api (không phải các đoạn xem trước ghép lại)
+    answer = formatter.text
+    bot_response = answer or NO_ANSWER_MESSAGE
+    code = llm_answer_code(answer)
+    if not answer:
+        yield sse_event('chunk', {'text': bot_response})
+    logger.info(f"✅ LLM streamed response: {bot_response[:100]}...")
+    if answer:
+        answer_cache.set(user_query, answer)
+    # Stream chỉ bắt đầu khi backend trả 200 (lỗi HTTP → LLM_HTTP_ERROR ở trên)
+    save_chat_message(
+        user_query, bot_response, latency_ms=round((time.perf_counter() - started) * 1000),
+        backend_status=200, response_code=code,
+    )
+    yield sse_event('done', {
+        'success': True, 'response': bot_response,
+        'code': code, 'timestamp': datetime.now().isoformat(),
+    })
+
+
+async def health_check(request):
+    """
+    API Endpoint: GET /chatbot/health/ (async)
+    Kiểm tra kết nối với Colab LLM
+    """
+    import httpx
+
+    if request.method != 'GET':
+        return _method_not_allowed(['GET'])
+
+    breaker = get_llm_breaker()
+    admission = get_async_admission_controller()
+    cached = await sync_to_async(cached_health_response)(breaker, admission)
+    if cached is not None:
+        return cached
+
+    try:
+        ngrok_api_url = await sync_to_async(get_ngrok_api_url)()
+        with breaker.guard() as call:
+            result = await get_async_llm_client().health(ngrok_api_url)
+            if result.status_code != 200:
+                call.mark_failure()
+        breaker.remember_health(result)
+        return health_response(result, breaker, admission=admission)
+
+    except CircuitOpenError:
+        return health_offline_response(ngrok_api_url, breaker)
+
+    except httpx.TransportError:
+        breaker.remember_health(None)
+        return health_offline_response(ngrok_api_url, breaker)
+
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+
+# Async view không đi qua CsrfViewMiddleware (giống @csrf_exempt của bản sync)
+chat_api.csrf_exempt = True
+chat_stream.csrf_exempt = True
+health_check.csrf_exempt = True
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Circuit breaker cho LLM backend (Colab qua ngrok).
+
+Trạng thái:
+- closed:    gọi bình thường; mỗi lần gọi được ghi vào rolling window
+             (thành công / lỗi / latency). Lỗi + gọi quá chậm chiếm
+             >= failure_rate trong window (và đủ min_calls) → open
+- open:      fail fast (CircuitOpenError, vài µs) trong open_seconds
+- half_open: hết cool-down → cho ĐÚNG 1 request thăm dò; thành công → closed,
+             lỗi → open lại
+
+Chỉ lỗi do backend được tính là lỗi (is_backend_failure): mạng / timeout /
+HTTP 5xx. HTTP 4xx, lỗi code phía mình, client ngắt kết nối (CancelledError,
+GeneratorExit) không được ghi - không mở breaker khi backend vẫn khỏe.
+
+Health check dùng chung state: kết quả /health được cache health_ttl giây,
+breaker open → trả offline ngay, không probe mạng.
+
+Example:
+    breaker = get_llm_breaker()
+    try:
+        with breaker.guard():
+            result = get_llm_client().ask(url, query)
+    except CircuitOpenError as e:
+        ...  # 503, Retry-After: e.retry_after
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import httpx
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_MIN_CALLS = 5
+DEFAULT_FAILURE_RATE = 0.5
+DEFAULT_SLOW_CALL_MS = 25000    # gần read timeout (30s) → coi như lỗi
+DEFAULT_OPEN_SECONDS = 30
+DEFAULT_HEALTH_TTL = 15
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class CircuitOpenError(Exception):
+    """Breaker đang open: không gọi backend"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'LLM circuit open, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class _Call:
+    """Handle của guard(): mark_failure() khi backend trả kết quả xấu mà không raise"""
+
+    def __init__(self):
+        self.failed = False
+
+    def mark_failure(self):
+        self.failed = True
+
+
+def is_backend_failure(exc):
+    """Lỗi do backend (mạng, timeout, HTTP 5xx) - requests (view sync) hoặc httpx (async)"""
+    if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError, httpx.TransportError)):
+        return True
+    if isinstance(exc, (requests.exceptions.HTTPError, httpx.HTTPStatusError)):
+        return exc.response is None or exc.response.status_code >= 500
+    return False
+
+
+# ============================================================================
+# BREAKER
+# ============================================================================
+
+class CircuitBreaker:
+    """
+    Breaker thread-safe trong 1 process (mỗi worker tự phát hiện backend chết
+    sau vài request - đủ nhanh, không cần chia sẻ state qua cache).
+    """
+
+    def __init__(self, name='llm', window_seconds=DEFAULT_WINDOW_SECONDS, min_calls=DEFAULT_MIN_CALLS,
+                 failure_rate=DEFAULT_FAILURE_RATE, slow_call_ms=DEFAULT_SLOW_CALL_MS,
+                 open_seconds=DEFAULT_OPEN_SECONDS, health_ttl=DEFAULT_HEALTH_TTL):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_ms = slow_call_ms
+        self.open_seconds = open_seconds
+        self.health_ttl = health_ttl
+
+        self.lock = threading.Lock()
+        self.calls = deque()  # (monotonic time, failed, latency_ms)
+        self.state = CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.health = None  # (checked_at, LLMResult | None)
+
+    # ---------- state machine ----------
+
+    def allow_request(self):
+        """True nếu được gọi backend (half_open: chỉ 1 request thăm dò)"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    return False
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+                logger.info(f"🟡 Circuit '{self.name}' half-open: sending 1 probe")
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            return True
+
+    def record_success(self, latency_ms):
+        if self.slow_call_ms and latency_ms >= self.slow_call_ms:
+            self.record_failure(latency_ms)
+            return
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self._close()
+                return
+            self._append(False, latency_ms)
+
+    def record_failure(self, latency_ms=0.0):
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self._open()
+                return
+            self._append(True, latency_ms)
+            total = len(self.calls)
+            failures = sum(1 for _, failed, _ in self.calls if failed)
+            if self.state == CLOSED and total >= self.min_calls and failures / total >= self.failure_rate:
+                self._open()
+
+    def release_probe(self):
+        """Lời gọi kết thúc mà không ghi kết quả → half_open cho request sau thăm dò lại"""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+
+    def retry_after(self):
+        """Số giây còn lại tới khi half-open (>= 1)"""
+        if self.state != OPEN:
+            return 1
+        remaining = self.open_seconds - (time.monotonic() - self.opened_at)
+        return max(1, int(remaining + 0.999))
+
+    @contextmanager
+    def guard(self):
+        """
+        Bọc 1 lời gọi backend: raise CircuitOpenError nếu không được gọi,
+        tự ghi thành công / lỗi + latency. Dùng được quanh `await` trong async view.
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(self.retry_after())
+        call = _Call()
+        started = time.perf_counter()
+        try:
+            yield call
+        except Exception as e:
+            if is_backend_failure(e):
+                self.record_failure((time.perf_counter() - started) * 1000)
+            else:
+                self.release_probe()
+            raise
+        except BaseException:
+            # Client ngắt (CancelledError / GeneratorExit): không biết backend khỏe hay không
+            self.release_probe()
+            raise
+        latency_ms = (time.perf_counter() - started) * 1000
+        if call.failed:
+            self.record_failure(latency_ms)
+        else:
+            self.record_success(latency_ms)
+
+    # ---------- health cache ----------
+
+    def remember_health(self, result):
+        """Lưu kết quả /health (None = không kết nối được)"""
+        with self.lock:
+            self.health = (time.monotonic(), result)
+
+    def cached_health(self):
+        """(True, result) nếu còn trong health_ttl, ngược lại (False, None)"""
+        health = self.health
+        if health is None or time.monotonic() - health[0] >= self.health_ttl:
+            return False, None
+        return True, health[1]
+
+    # ---------- stats ----------
+
+    def snapshot(self):
+        """State + thống kê window, dùng cho /health và log"""
+        with self.lock:
+            self._prune(time.monotonic())
+            latencies = sorted(latency for _, _, latency in self.calls)
+            failures = sum(1 for _, failed, _ in self.calls if failed)
+            total = len(self.calls)
+            return {
+                'state': self.state,
+                'calls': total,
+                'failure_rate': round(failures / total, 3) if total else 0.0,
+                'p50_latency_ms': round(latencies[total // 2]) if total else None,
+                'p95_latency_ms': round(latencies[min(total - 1, int(total * 0.95))]) if total else None,
+                'retry_after': self.retry_after() if self.state == OPEN else None,
+            }
+
+    # ---------- internals (đang giữ lock) ----------
+
+    def _append(self, failed, latency_ms):
+        now = time.monotonic()
+        self.calls.append((now, failed, latency_ms))
+        self._prune(now)
+
+    def _prune(self, now):
+        while self.calls and now - self.calls[0][0] > self.window_seconds:
+            self.calls.popleft()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+        logger.warning(f"🔴 Circuit '{self.name}' open for {self.open_seconds}s")
+
+    def _close(self):
+        self.state = CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.calls.clear()
+        logger.info(f"🟢 Circuit '{self.name}' closed")
+
+
+# ============================================================================
+# PER-PROCESS SINGLETON
+# ============================================================================
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_llm_breaker():
+    """CircuitBreaker dùng chung cho mọi lời gọi LLM backend trong process"""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    name='llm',
+                    window_seconds=_setting('LLM_BREAKER_WINDOW_SECONDS', DEFAULT_WINDOW_SECONDS),
+                    min_calls=_setting('LLM_BREAKER_MIN_CALLS', DEFAULT_MIN_CALLS),
+                    failure_rate=_setting('LLM_BREAKER_FAILURE_RATE', DEFAULT_FAILURE_RATE),
+                    slow_call_ms=_setting('LLM_BREAKER_SLOW_CALL_MS', DEFAULT_SLOW_CALL_MS),
+                    open_seconds=_setting('LLM_BREAKER_OPEN_SECONDS', DEFAULT_OPEN_SECONDS),
+                    health_ttl=_setting('LLM_HEALTH_CACHE_TTL', DEFAULT_HEALTH_TTL),
+                )
+    return _breaker
+
+
+def reset_llm_breaker():
+    """Bỏ breaker hiện tại (test / đổi ngrok URL)"""
+    global _breaker
+    with _breaker_lock:
+        _breaker = None
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP client dùng chung cho LLM backend (Colab qua ngrok).
+
+- 1 requests.Session sống lâu cho mỗi process → giữ kết nối keep-alive,
+  không bắt tay TCP + TLS lại với ngrok ở mỗi tin nhắn
+- HTTPAdapter có pool (LLM_POOL_CONNECTIONS / LLM_POOL_MAXSIZE) cho các
+  thread gunicorn dùng chung
+- Timeout tách riêng: connect (nhanh, phát hiện tunnel chết) / read (LLM sinh chậm)
+- Retry + backoff CHỈ cho GET /health (idempotent, session riêng); POST /ask
+  không retry kể cả lỗi kết nối để không gửi câu hỏi 2 lần / chờ lâu khi tunnel chết
+- Mỗi lần gọi trả latency_ms để view log / trả về client
+
+Example:
+    client = get_llm_client()
+    result = client.ask(url, 'bao nhiêu đạm có trong gà?')
+    result.data['answer'], result.latency_ms
+
+    health = client.health(url)
+    health.ok, health.status_code, health.latency_ms
+
+    # Trong async view (ASGI): httpx.AsyncClient, không giữ thread khi chờ LLM
+    result = await get_async_llm_client().ask(url, query)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_HEALTH_READ_TIMEOUT = 5
+DEFAULT_POOL_CONNECTIONS = 4   # số host được giữ pool (thường chỉ 1 tunnel)
+DEFAULT_POOL_MAXSIZE = 16      # số kết nối keep-alive / host
+DEFAULT_HEALTH_RETRIES = 2
+DEFAULT_HEALTH_BACKOFF = 0.3
+DEFAULT_ASYNC_MAX_CONNECTIONS = 500  # số LLM call đang chờ tối đa / process (ASGI)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+@dataclass
+class LLMResult:
+    """Kết quả 1 lần gọi LLM backend"""
+    status_code: int
+    latency_ms: float
+    data: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 300
+
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+
+class LLMClient:
+    """
+    Wrapper quanh requests.Session có pool: session /ask (không retry) và
+    health_session (retry + backoff).
+
+    Lỗi mạng (Timeout, ConnectionError) và HTTPError được raise nguyên dạng
+    requests.exceptions → view giữ nguyên cách map sang mã lỗi JSON.
+    """
+
+    def __init__(self, connect_timeout=None, read_timeout=None, health_read_timeout=None,
+                 pool_connections=None, pool_maxsize=None, health_retries=None, health_backoff=None):
+        self.connect_timeout = connect_timeout or _setting('LLM_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)
+        self.read_timeout = read_timeout or _setting('LLM_READ_TIMEOUT', DEFAULT_READ_TIMEOUT)
+        self.health_read_timeout = health_read_timeout or _setting(
+            'LLM_HEALTH_READ_TIMEOUT', DEFAULT_HEALTH_READ_TIMEOUT
+        )
+        if health_retries is None:
+            health_retries = _setting('LLM_HEALTH_RETRIES', DEFAULT_HEALTH_RETRIES)
+        if health_backoff is None:
+            health_backoff = _setting('LLM_HEALTH_BACKOFF', DEFAULT_HEALTH_BACKOFF)
+
+        # /health: retry + backoff (GET idempotent). Adapter riêng trên session riêng:
+        # Retry(connect=...) áp dụng cho MỌI method, kể cả POST
+        retry = Retry(
+            total=health_retries,
+            connect=health_retries,
+            read=health_retries,
+            status=health_retries,
+            backoff_factor=health_backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,  # hết retry → trả response cuối cùng, không raise
+        )
+        pool_connections = pool_connections or _setting('LLM_POOL_CONNECTIONS', DEFAULT_POOL_CONNECTIONS)
+        pool_maxsize = pool_maxsize or _setting('LLM_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE)
+
+        # POST /ask không bao giờ retry (kể cả lỗi kết nối): tunnel chết → fail ngay
+        self.session = self._build_session(HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0,
+        ))
+        self.health_session = self._build_session(HTTPAdapter(
+            pool_connections=1, pool_maxsize=1, max_retries=retry,
+        ))
+
+    @staticmethod
+    def _build_session(adapter):
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Content-Type': 'application/json',
+            # Bỏ trang cảnh báo của ngrok free cho request không phải trình duyệt
+            'ngrok-skip-browser-warning': '1',
+        })
+        return session
+
+    # ---------- calls ----------
+
+    def ask(self, url, query, **payload):
+        """
+        POST {query} tới endpoint /ask.
+
+        Returns:
+            LLMResult: data = JSON backend trả về
+
+        Raises:
+            requests.exceptions.Timeout / ConnectionError / HTTPError,
+            ValueError nếu body không phải JSON
+        """
+        started = time.perf_counter()
+        response = self.session.post(
+            url,
+            json={'query': query, **payload},
+            timeout=(self.connect_timeout, self.read_timeout),
+        )
+        latency_ms = (time.perf_counter() - started) * 1000
+        response.raise_for_status()
+        result = LLMResult(status_code=response.status_code, latency_ms=latency_ms, data=response.json())
+        logger.debug(f"🤖 LLM /ask {response.status_code} in {latency_ms:.0f}ms")
+        return result
+
+    def health(self, url):
+        """
+        GET endpoint /health (có retry + backoff).
+
+        Args:
+            url: URL /ask hoặc /health của backend
+
+        Returns:
+            LLMResult: status_code của lần thử cuối
+
+        Raises:
+            requests.exceptions.Timeout / ConnectionError khi hết retry
+        """
+        started = time.perf_counter()
+        response = self.health_session.get(
+            health_url(url),
+            timeout=(self.connect_timeout, self.health_read_timeout),
+        )
+        latency_ms = (time.perf_counter() - started) * 1000
+        return LLMResult(status_code=response.status_code, latency_ms=latency_ms)
+
+    def close(self):
+        self.session.close()
+        self.health_session.close()
+
+
+class AsyncLLMClient:
+    """
+    Bản async của LLMClient trên httpx.AsyncClient (pool keep-alive, HTTP/1.1).
+
+    Dùng trong chatbot/async_views.py: khi chờ LLM, coroutine nhường event loop
+    → 1 process giữ được hàng trăm request đang chờ mà không tốn thread.
+
+    Lỗi được raise dạng httpx: TimeoutException, ConnectError (TransportError),
+    HTTPStatusError; body không phải JSON → ValueError.
+    """
+
+    def __init__(self, connect_timeout=None, read_timeout=None, health_read_timeout=None,
+                 max_connections=None, health_retries=None, health_backoff=None, transport=None):
+        import httpx
+
+        self.connect_timeout = connect_timeout or _setting('LLM_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)
+        self.read_timeout = read_timeout or _setting('LLM_READ_TIMEOUT', DEFAULT_READ_TIMEOUT)
+        self.health_read_timeout = health_read_timeout or _setting(
+            'LLM_HEALTH_READ_TIMEOUT', DEFAULT_HEALTH_READ_TIMEOUT
+        )
+        self.health_retries = health_retries if health_retries is not None else _setting(
+            'LLM_HEALTH_RETRIES', DEFAULT_HEALTH_RETRIES
+        )
+        self.health_backoff = health_backoff if health_backoff is not None else _setting(
+            'LLM_HEALTH_BACKOFF', DEFAULT_HEALTH_BACKOFF
+        )
+        max_connections = max_connections or _setting('LLM_ASYNC_MAX_CONNECTIONS', DEFAULT_ASYNC_MAX_CONNECTIONS)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=_setting('LLM_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+            ),
+            headers={
+                'Content-Type': 'application/json',
+                'ngrok-skip-browser-warning': '1',
+            },
+            transport=transport,
+        )
+
+    async def ask(self, url, query, **payload):
+        """POST {query} tới /ask (không retry). Returns: LLMResult"""
+        started = time.perf_counter()
+        response = await self.client.post(url, json={'query': query, **payload})
+        latency_ms = (time.perf_counter() - started) * 1000
+        response.raise_for_status()
+        result = LLMResult(status_code=response.status_code, latency_ms=latency_ms, data=response.json())
+        logger.debug(f"🤖 LLM /ask (async) {response.status_code} in {latency_ms:.0f}ms")
+        return result
+
+    async def stream(self, url, query, **payload):
+        """
+        POST {query, stream: true} tới /ask, yield từng đoạn text ngay khi backend gửi.
+
+        Backend có thể trả:
+        - text/event-stream: mỗi dòng 'data: ...' là text thô hoặc JSON
+          {"token" | "text" | "answer": "..."}; 'data: [DONE]' kết thúc
+        - application/json (backend chưa hỗ trợ stream): 1 đoạn = toàn bộ answer
+        - text thô chunked: mỗi chunk là 1 đoạn
+
+        Raises:
+            giống ask() (lỗi xảy ra trước đoạn đầu tiên hoặc giữa chừng)
+        """
+        started = time.perf_counter()
+        async with self.client.stream('POST', url, json={'query': query, 'stream': True, **payload}) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('content-type', '')
+            first = True
+
+            if content_type.startswith('application/json'):
+                body = await response.aread()
+                yield json.loads(body).get('answer', '')
+                return
+
+            if content_type.startswith('text/event-stream'):
+                async for line in response.aiter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    text = _sse_text(data)
+                    if text:
+                        if first:
+                            logger.debug(f"🤖 LLM first token in {(time.perf_counter() - started) * 1000:.0f}ms")
+                            first = False
+                        yield text
+                return
+
+            async for text in response.aiter_text():
+                if text:
+                    yield text
+
+    async def health(self, url):
+        """GET /health, retry + backoff khi lỗi kết nối / 502-504. Returns: LLMResult"""
+        import httpx
+
+        started = time.perf_counter()
+        for attempt in range(self.health_retries + 1):
+            last_attempt = attempt == self.health_retries
+            try:
+                response = await self.client.get(
+                    health_url(url),
+                    timeout=httpx.Timeout(self.health_read_timeout, connect=self.connect_timeout),
+                )
+                if response.status_code not in (502, 503, 504) or last_attempt:
+                    break
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            await asyncio.sleep(self.health_backoff * (2 ** attempt))
+        latency_ms = (time.perf_counter() - started) * 1000
+        return LLMResult(status_code=response.status_code, latency_ms=latency_ms)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def _sse_text(data):
+    """Payload 1 dòng 'data:' của backend → text (JSON token hoặc text thô)"""
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(payload, dict):
+        for key in ('token', 'text', 'answer', 'delta'):
+            if isinstance(payload.get(key), str):
+                return payload[key]
+        return ''
+    return payload if isinstance(payload, str) else ''
+
+
+def health_url(url):
+    """'https://x.ngrok-free.app/ask' → 'https://x.ngrok-free.app/health'"""
+    return url.replace('/ask', '/health')
+
+
+# ============================================================================
+# PER-PROCESS SINGLETON
+# ============================================================================
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """
+    LLMClient dùng chung trong process hiện tại.
+    Tạo lại sau fork (gunicorn preload) để không chia sẻ socket giữa các worker.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = LLMClient()
+                _client_pid = pid
+    return _client
+
+
+def reset_llm_client():
+    """Đóng client hiện tại (settings đổi / test)"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+# AsyncClient gắn với event loop tạo ra nó: uvicorn có 1 loop / process, nhưng
+# async view chạy dưới WSGI (hoặc test) được Django chạy trên loop mới mỗi request
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_llm_client():
+    """AsyncLLMClient dùng chung trong event loop đang chạy"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncLLMClient()
+    return client
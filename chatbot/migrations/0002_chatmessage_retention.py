@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMessageHourlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(unique=True, verbose_name='Giờ')),
+                ('message_count', models.PositiveIntegerField(default=0, verbose_name='Số tin nhắn')),
+            ],
+            options={
+                'verbose_name': 'Chat Message Summary',
+                'verbose_name_plural': 'Chat Message Summaries',
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['-timestamp'], name='chatbot_cha_timesta_c63751_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:37
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_chatmessage_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='backend_status',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='HTTP status của LLM backend (trống nếu không gọi LLM)', null=True, verbose_name='Backend status'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='cache_hit',
+            field=models.BooleanField(default=False, verbose_name='Cache hit'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='latency_ms',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Latency (ms)'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='response_code',
+            field=models.CharField(blank=True, help_text='LLM_SUCCESS / CACHE_HIT / RETRIEVAL_ANSWER', max_length=32, verbose_name='Response code'),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
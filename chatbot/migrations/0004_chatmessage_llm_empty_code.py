@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_chatmessage_analytics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='response_code',
+            field=models.CharField(blank=True, help_text='LLM_SUCCESS / LLM_EMPTY / CACHE_HIT / RETRIEVAL_ANSWER', max_length=32, verbose_name='Response code'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 class NgrokConfig(models.Model):
     """Model để lưu cấu hình Ngrok API URL"""
@@ -33,10 +34,21 @@ class NgrokConfig(models.Model):
         return f"{self.name} - {'🟢 Active' if self.is_active else '🔴 Inactive'}"
     
     def save(self, *args, **kwargs):
+        from .ngrok_config import invalidate_ngrok_url
+
         # Chỉ cho phép 1 config active duy nhất
         if self.is_active:
             NgrokConfig.objects.filter(is_active=True).exclude(pk=self.pk).update(is_active=False)
         super().save(*args, **kwargs)
+        # Mọi worker đọc lại URL (chatbot/ngrok_config.py)
+        invalidate_ngrok_url()
+    
+    def delete(self, *args, **kwargs):
+        from .ngrok_config import invalidate_ngrok_url
+
+        result = super().delete(*args, **kwargs)
+        invalidate_ngrok_url()
+        return result
     
     @classmethod
     def get_active_url(cls):
@@ -48,16 +60,45 @@ class NgrokConfig(models.Model):
 
 
 class ChatMessage(models.Model):
-    """Model để lưu lịch sử chat (tùy chọn)"""
+    """Model để lưu lịch sử chat (tùy chọn) - ghi theo batch qua chatbot/transcripts.py"""
     
     user_message = models.TextField()
     bot_response = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Lúc trả lời (transcripts buffer gán sẵn, không phải lúc bulk_create)
+    timestamp = models.DateTimeField(default=timezone.now)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name="Latency (ms)")
+    backend_status = models.PositiveSmallIntegerField(
+        null=True, blank=True, verbose_name="Backend status",
+        help_text="HTTP status của LLM backend (trống nếu không gọi LLM)"
+    )
+    cache_hit = models.BooleanField(default=False, verbose_name="Cache hit")
+    response_code = models.CharField(
+        max_length=32, blank=True, verbose_name="Response code",
+        help_text="LLM_SUCCESS / LLM_EMPTY / CACHE_HIT / RETRIEVAL_ANSWER"
+    )
     
     class Meta:
         verbose_name = "Chat Message"
         verbose_name_plural = "Chat Messages"
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['-timestamp']),
+        ]
     
     def __str__(self):
         return f"Chat at {self.timestamp}"
+
+
+class ChatMessageHourlySummary(models.Model):
+    """Số tin nhắn chat theo giờ - giữ lại sau khi ChatMessage cũ bị xóa (blog/retention.py)"""
+    
+    hour = models.DateTimeField(unique=True, verbose_name="Giờ")
+    message_count = models.PositiveIntegerField(default=0, verbose_name="Số tin nhắn")
+    
+    class Meta:
+        verbose_name = "Chat Message Summary"
+        verbose_name_plural = "Chat Message Summaries"
+        ordering = ['-hour']
+    
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} x{self.message_count}"
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Resolve Ngrok LLM API URL (NgrokConfig active → env NGROK_LLM_API) không cần query mỗi request.
+
+- Cache trong process với TTL ngắn (CHATBOT_NGROK_URL_TTL giây): trong TTL → 0 I/O
+- Hết TTL: chỉ đọc version key trong cache dùng chung; version không đổi →
+  dùng tiếp URL cũ, đổi → query DB 1 lần
+- NgrokConfig.save / delete và endpoint update-ngrok gọi invalidate_ngrok_url()
+  (sau commit) → bump version → mọi worker thấy URL mới sau tối đa TTL giây
+- URL đổi → reset circuit breaker (lỗi / health của tunnel cũ không còn đúng)
+
+Example:
+    url = get_ngrok_api_url()
+    invalidate_ngrok_url()
+"""
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+NGROK_VERSION_KEY = 'chatbot:ngrok_version'
+DEFAULT_URL_TTL = 5
+FALLBACK_URL = 'https://yyyyy.ngrok-free.app/ask'
+
+_state = {'url': None, 'version': None, 'checked_at': 0.0}
+_state_lock = threading.Lock()
+
+
+def _get_version():
+    version = cache.get(NGROK_VERSION_KEY)
+    if version is None:
+        cache.add(NGROK_VERSION_KEY, 1, None)
+        version = cache.get(NGROK_VERSION_KEY, 1)
+    return version
+
+
+def _load_url():
+    """Ưu tiên database, fallback sang environment variable"""
+    from .models import NgrokConfig
+
+    url = NgrokConfig.get_active_url()
+    if url:
+        return url
+    return os.getenv('NGROK_LLM_API', FALLBACK_URL)
+
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+def get_ngrok_api_url():
+    """URL /ask của LLM backend đang active"""
+    ttl = getattr(settings, 'CHATBOT_NGROK_URL_TTL', DEFAULT_URL_TTL)
+    now = time.monotonic()
+    if _state['url'] is not None and now - _state['checked_at'] < ttl:
+        return _state['url']
+
+    version = _get_version()
+    with _state_lock:
+        if _state['url'] is not None and _state['version'] == version:
+            _state['checked_at'] = now
+            return _state['url']
+
+        previous = _state['url']
+        url = _load_url()
+        _state.update(url=url, version=version, checked_at=now)
+
+    if previous is not None and previous != url:
+        from .circuit_breaker import reset_llm_breaker
+
+        reset_llm_breaker()
+        logger.info(f"🔁 Ngrok URL changed: {url}")
+    return url
+
+
+def reset_ngrok_url_cache():
+    """Bỏ URL đã cache trong process hiện tại (lần gọi sau đọc lại)"""
+    with _state_lock:
+        _state.update(url=None, version=None, checked_at=0.0)
+
+
+def invalidate_ngrok_url():
+    """Sau khi transaction commit: bump version (mọi worker) + bỏ giá trị trong process"""
+    def bump():
+        try:
+            cache.incr(NGROK_VERSION_KEY)
+        except ValueError:
+            cache.set(NGROK_VERSION_KEY, 2, None)
+        with _state_lock:
+            _state['checked_at'] = 0.0
+            _state['version'] = None
+
+    transaction.on_commit(bump)
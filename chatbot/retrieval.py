@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+Retrieval trước khi gọi LLM: trả lời câu hỏi về sản phẩm từ dữ liệu có cấu trúc.
+
+Index trong process (build lười, build lại khi Product / Post đổi - chatbot/signals.py):
+- Tên sản phẩm (đã bỏ dấu) làm entity: "whey gold có bao nhiêu đạm" → Whey Gold
+- TF-IDF chung cho sản phẩm + bài viết (products.cross_links.product_document /
+  post_document)
+
+Câu hỏi có độ tin cậy cao → trả lời bằng template, KHÔNG gọi LLM:
+- entity + protein / calo / giá  → "Whey Gold có 24g protein mỗi khẩu phần (30g)."
+- mục tiêu ("tăng cơ", "giảm cân"...) + hỏi gợi ý sản phẩm → top sản phẩm phù hợp
+Còn lại → top-k đoạn liên quan gửi kèm cho LLM làm context.
+
+Example:
+    retrieval = retrieve('Whey Gold bao nhiêu protein?')
+    retrieval.answer     # 'Whey Gold có 24g protein mỗi khẩu phần (30g).'
+    retrieval.context    # [] khi đã có answer, ngược lại top-k snippet
+    retrieval.payload()  # {'context': [...]} gửi kèm câu hỏi tới LLM
+"""
+
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+
+from blog.search import fold_diacritics
+
+from .answer_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+RETRIEVAL_VERSION_KEY = 'chatbot:retrieval_version'
+TOP_K = 3
+MIN_CONTEXT_SCORE = 0.1
+MAX_GOAL_PRODUCTS = 3
+
+# Ý định (trên câu hỏi đã bỏ dấu)
+INTENT_PATTERNS = {
+    'protein': re.compile(r'\b(protein|dam)\b'),
+    'calories': re.compile(r'\b(calo|calories|calorie|kcal|nang luong)\b'),
+    'price': re.compile(r'\b(gia|bao nhieu tien|price)\b'),
+}
+RECOMMEND_PATTERN = re.compile(r'\b(san pham|nen dung|nen uong|nen mua|phu hop|goi y|loai nao|recommend)\b')
+
+
+@dataclass
+class RetrievalResult:
+    answer: str = None
+    context: list = field(default_factory=list)
+    sources: list = field(default_factory=list)  # [{'type', 'id', 'name', 'url'}]
+
+    def payload(self):
+        """Tham số thêm cho LLMClient.ask / stream"""
+        return {'context': self.context} if self.context else {}
+
+
+def _format_price(value):
+    from products.templatetags.product_filters import format_price
+
+    return format_price(value)
+
+
+def _number(value):
+    """24.0 → '24', 24.5 → '24.5'"""
+    return f'{value:g}'
+
+
+# ============================================================================
+# INDEX
+# ============================================================================
+
+class RetrievalIndex:
+    """Snapshot sản phẩm active + bài viết published, TF-IDF + entity"""
+
+    def __init__(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        from blog.models import Post
+        from products.cross_links import post_document, product_document, product_tags
+        from products.models import Product, UserProfile
+
+        products = list(Product.objects.filter(status='active').order_by('id'))
+        posts = list(
+            Post.objects.filter(status='published')
+            .only('id', 'title', 'slug', 'tags', 'excerpt', 'content').order_by('id')
+        )
+
+        self.products = [
+            {
+                'id': product.id,
+                'name': product.name,
+                'url': product.get_absolute_url(),
+                'folded_name': normalize_query(product.name),
+                'serving_size': product.serving_size,
+                'protein': product.protein_per_serving,
+                'calories': product.calories_per_serving,
+                'carbs': product.carbs_per_serving,
+                'fat': product.fat_per_serving,
+                'price': product.get_discounted_price(),
+                'list_price': float(product.price),
+                'discount_percent': product.discount_percent,
+                'goals': product_tags(product),
+            }
+            for product in products
+        ]
+        self.posts = [
+            {
+                'id': post.id,
+                'name': post.title,
+                'url': post.get_absolute_url(),
+                'excerpt': post.excerpt or '',
+            }
+            for post in posts
+        ]
+        # "tang co" → 'muscle-gain' (nhãn tiếng Việt + mã, đã bỏ dấu)
+        self.goals = {}
+        for code, label in UserProfile.GOAL_CHOICES:
+            self.goals[normalize_query(label)] = (code, label)
+            self.goals[code.replace('-', ' ')] = (code, label)
+
+        documents = [product_document(product) for product in products] + \
+                    [post_document(post) for post in posts]
+        self.vectorizer = None
+        self.matrix = None
+        if documents:
+            self.vectorizer = TfidfVectorizer(sublinear_tf=True, max_features=50000)
+            self.matrix = self.vectorizer.fit_transform(documents)
+
+    # ---------- matching ----------
+
+    def match_product(self, folded_query):
+        """Sản phẩm có tên (đã bỏ dấu) xuất hiện trong câu hỏi; tên dài nhất thắng"""
+        padded = f' {folded_query} '
+        best = None
+        for product in self.products:
+            name = product['folded_name']
+            if name and f' {name} ' in padded and (best is None or len(name) > len(best['folded_name'])):
+                best = product
+        return best
+
+    def match_goal(self, folded_query):
+        padded = f' {folded_query} '
+        for phrase in sorted(self.goals, key=len, reverse=True):
+            if f' {phrase} ' in padded:
+                return self.goals[phrase]
+        return None
+
+    def search(self, query, k=TOP_K):
+        """Top-k (score, 'product' | 'post', item) theo cosine TF-IDF"""
+        if self.matrix is None:
+            return []
+        scores = (self.matrix @ self.vectorizer.transform([fold_diacritics(query)]).T).toarray().ravel()
+        ranked = scores.argsort()[::-1][:k]
+        results = []
+        for index in ranked:
+            if scores[index] < MIN_CONTEXT_SCORE:
+                break
+            if index < len(self.products):
+                results.append((float(scores[index]), 'product', self.products[index]))
+            else:
+                results.append((float(scores[index]), 'post', self.posts[index - len(self.products)]))
+        return results
+
+
+# ============================================================================
+# TEMPLATES
+# ============================================================================
+
+def _product_answer(product, intents):
+    lines = []
+    serving = product['serving_size']
+    if 'protein' in intents:
+        lines.append(f"{product['name']} có {_number(product['protein'])}g protein mỗi khẩu phần ({serving}).")
+    if 'calories' in intents:
+        lines.append(
+            f"{product['name']} cung cấp {_number(product['calories'])} kcal mỗi khẩu phần ({serving}) "
+            f"- carbs {_number(product['carbs'])}g, fat {_number(product['fat'])}g."
+        )
+    if 'price' in intents:
+        if product['discount_percent']:
+            lines.append(
+                f"Giá {product['name']}: {_format_price(product['price'])}đ "
+                f"(giảm {product['discount_percent']}% từ {_format_price(product['list_price'])}đ)."
+            )
+        else:
+            lines.append(f"Giá {product['name']}: {_format_price(product['price'])}đ.")
+    return '\n'.join(lines)
+
+
+def _goal_answer(index, query, goal):
+    code, label = goal
+    candidates = [product for product in index.products if code in product['goals']]
+    if not candidates:
+        return None
+    # Ưu tiên sản phẩm liên quan tới câu hỏi, sau đó nhiều protein hơn
+    relevance = {item['id']: score for score, kind, item in index.search(query, k=50) if kind == 'product'}
+    candidates.sort(key=lambda product: (-relevance.get(product['id'], 0.0), -product['protein']))
+    lines = [f"Sản phẩm phù hợp cho mục tiêu {label.lower()}:"]
+    for product in candidates[:MAX_GOAL_PRODUCTS]:
+        lines.append(
+            f"- {product['name']}: {_number(product['protein'])}g protein, "
+            f"{_number(product['calories'])} kcal / khẩu phần, {_format_price(product['price'])}đ"
+        )
+    return '\n'.join(lines), candidates[:MAX_GOAL_PRODUCTS]
+
+
+def _snippet(kind, item):
+    if kind == 'product':
+        return (
+            f"Sản phẩm {item['name']}: {_number(item['protein'])}g protein, "
+            f"{_number(item['calories'])} kcal mỗi khẩu phần {item['serving_size']}, "
+            f"giá {_format_price(item['price'])}đ, mục tiêu: {', '.join(sorted(item['goals'])) or '-'}"
+        )
+    return f"Bài viết '{item['name']}': {item['excerpt'][:300]}"
+
+
+def _source(kind, item):
+    return {'type': kind, 'id': item['id'], 'name': item['name'], 'url': item['url']}
+
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_retrieval_version():
+    version = cache.get(RETRIEVAL_VERSION_KEY)
+    if version is None:
+        cache.add(RETRIEVAL_VERSION_KEY, 1, None)
+        version = cache.get(RETRIEVAL_VERSION_KEY, 1)
+    return version
+
+
+def bump_retrieval_version():
+    """Product / Post thay đổi → mọi process build lại index ở lần retrieve sau"""
+    try:
+        return cache.incr(RETRIEVAL_VERSION_KEY)
+    except ValueError:
+        cache.set(RETRIEVAL_VERSION_KEY, 2, None)
+        return 2
+
+
+def get_retrieval_index():
+    global _index, _index_version
+    version = get_retrieval_version()
+    if _index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                _index = RetrievalIndex()
+                _index_version = version
+                logger.info(
+                    f"🔎 Chatbot retrieval index built: {len(_index.products)} products, {len(_index.posts)} posts"
+                )
+    return _index
+
+
+def reset_retrieval_index():
+    """Bỏ index hiện tại (test / sau khi import dữ liệu hàng loạt)"""
+    global _index, _index_version
+    with _index_lock:
+        _index = None
+        _index_version = None
+
+
+def retrieve(query, k=TOP_K):
+    """
+    Trả lời bằng template nếu chắc chắn, ngược lại top-k context cho LLM.
+
+    Returns:
+        RetrievalResult
+    """
+    index = get_retrieval_index()
+    folded = normalize_query(query)
+    intents = [name for name, pattern in INTENT_PATTERNS.items() if pattern.search(folded)]
+
+    product = index.match_product(folded)
+    if product is not None and intents:
+        return RetrievalResult(answer=_product_answer(product, intents), sources=[_source('product', product)])
+
+    goal = index.match_goal(folded)
+    if product is None and goal is not None and RECOMMEND_PATTERN.search(folded):
+        templated = _goal_answer(index, query, goal)
+        if templated is not None:
+            answer, products = templated
+            return RetrievalResult(answer=answer, sources=[_source('product', item) for item in products])
+
+    hits = index.search(query, k=k)
+    if product is not None and all(item['id'] != product['id'] for _, kind, item in hits if kind == 'product'):
+        hits.insert(0, (1.0, 'product', product))
+    return RetrievalResult(
+        context=[_snippet(kind, item) for _, kind, item in hits[:k]],
+        sources=[_source(kind, item) for _, kind, item in hits[:k]],
+    )
+
+
+def retrieve_for_chat(query):
+    """
+    retrieve() cho chat view: tắt bằng CHATBOT_RETRIEVAL_ENABLED=False, lỗi
+    index không làm hỏng request (trả RetrievalResult rỗng → gọi LLM như cũ).
+    """
+    if not getattr(settings, 'CHATBOT_RETRIEVAL_ENABLED', True):
+        return RetrievalResult()
+    try:
+        return retrieve(query, k=getattr(settings, 'CHATBOT_RETRIEVAL_TOP_K', TOP_K))
+    except Exception as e:
+        logger.exception(f"❌ Chatbot retrieval failed: {e}")
+        return RetrievalResult()
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Chatbot signals:
+- Product / Post thay đổi → build lại retrieval index (chatbot/retrieval.py)
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from blog.models import Post
+from products.models import Product
+
+from .retrieval import bump_retrieval_version
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_retrieval_index(sender, raw=False, **kwargs):
+    """Sau commit: đổi retrieval version (bỏ qua khi loaddata)"""
+    if not raw:
+        transaction.on_commit(bump_retrieval_version)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Single-flight: gộp các câu hỏi GIỐNG NHAU đang chờ LLM cùng lúc thành 1 lời gọi.
+
+- Key = câu hỏi đã chuẩn hóa (answer_cache.normalize_query)
+- Request đầu tiên (leader) gọi backend; các request cùng key tới trong lúc đó
+  (follower) chờ kết quả / exception của leader, tối đa wait_timeout giây
+- Tùy chọn shared_lock (CHATBOT_COALESCE_SHARED_LOCK): leader giữ thêm khóa
+  cache.add trên cache dùng chung → process khác cùng câu hỏi poll kết quả
+  leader ghi vào cache thay vì tự gọi backend (cần cache dùng chung, vd Redis)
+- SingleFlight cho view sync (threading.Event), AsyncSingleFlight cho async
+  view (asyncio.Future, 1 instance / event loop)
+
+Example:
+    result, shared = get_single_flight().do(normalize_query(query), lambda: client.ask(url, query))
+    result, shared = await get_async_single_flight().do(key, lambda: client.ask(url, query))
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DEFAULT_WAIT_TIMEOUT = 35      # > LLM read timeout: follower không bỏ cuộc trước leader
+DEFAULT_POLL_INTERVAL = 0.2    # giây giữa 2 lần poll kết quả của process khác
+LOCK_KEY = 'chatbot:inflight:{}'
+RESULT_KEY = 'chatbot:inflight_result:{}'
+RESULT_TTL = 60
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class SingleFlightTimeout(Exception):
+    """Follower chờ leader quá wait_timeout"""
+
+
+def _digest(key):
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+# ============================================================================
+# SYNC
+# ============================================================================
+
+class SingleFlight:
+    """Coalescing cho thread (gunicorn sync / threaded worker)"""
+
+    def __init__(self, wait_timeout=DEFAULT_WAIT_TIMEOUT, shared_lock=False, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.wait_timeout = wait_timeout
+        self.shared_lock = shared_lock
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        """
+        Gọi fn() 1 lần cho mỗi key đang chạy.
+
+        Returns:
+            tuple: (kết quả, shared) - shared=True nếu dùng lại kết quả của request khác
+
+        Raises:
+            exception của fn (cho cả leader và follower), SingleFlightTimeout
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if not call.event.wait(self.wait_timeout):
+                raise SingleFlightTimeout(key)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, shared = self._run_leader(key, fn)
+            return call.result, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            if call.waiters:
+                logger.info(f"🔀 Coalesced {call.waiters} identical chatbot requests")
+            call.event.set()
+
+    def _run_leader(self, key, fn):
+        if not self.shared_lock:
+            return fn(), False
+
+        digest = _digest(key)
+        lock_key, result_key = LOCK_KEY.format(digest), RESULT_KEY.format(digest)
+        deadline = time.monotonic() + self.wait_timeout
+        while not cache.add(lock_key, 1, self.wait_timeout):
+            # Process khác đang gọi backend cho câu hỏi này → chờ kết quả của nó
+            found = cache.get(result_key)
+            if found is not None:
+                return found, True
+            if time.monotonic() >= deadline:
+                return fn(), False
+            time.sleep(self.poll_interval)
+        try:
+            result = fn()
+            cache.set(result_key, result, RESULT_TTL)
+            return result, False
+        finally:
+            cache.delete(lock_key)
+
+
+# ============================================================================
+# ASYNC
+# ============================================================================
+
+class AsyncSingleFlight:
+    """Coalescing cho coroutine trong 1 event loop (ASGI)"""
+
+    def __init__(self, wait_timeout=DEFAULT_WAIT_TIMEOUT, shared_lock=False, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.wait_timeout = wait_timeout
+        self.shared_lock = shared_lock
+        self.poll_interval = poll_interval
+        self.calls = {}  # key → asyncio.Future (cùng loop, không cần lock)
+
+    async def do(self, key, coro_fn):
+        """Giống SingleFlight.do; coro_fn() trả coroutine"""
+        future = self.calls.get(key)
+        if future is not None:
+            try:
+                # shield: follower timeout không hủy lời gọi của leader
+                return await asyncio.wait_for(asyncio.shield(future), self.wait_timeout), True
+            except asyncio.TimeoutError:
+                raise SingleFlightTimeout(key)
+
+        future = self.calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result, shared = await self._run_leader(key, coro_fn)
+            future.set_result(result)
+            return result, shared
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # đánh dấu đã đọc nếu không có follower
+            raise
+        finally:
+            del self.calls[key]
+
+    async def _run_leader(self, key, coro_fn):
+        if not self.shared_lock:
+            return await coro_fn(), False
+
+        digest = _digest(key)
+        lock_key, result_key = LOCK_KEY.format(digest), RESULT_KEY.format(digest)
+        deadline = time.monotonic() + self.wait_timeout
+        while not await cache.aadd(lock_key, 1, self.wait_timeout):
+            found = await cache.aget(result_key)
+            if found is not None:
+                return found, True
+            if time.monotonic() >= deadline:
+                return await coro_fn(), False
+            await asyncio.sleep(self.poll_interval)
+        try:
+            result = await coro_fn()
+            await cache.aset(result_key, result, RESULT_TTL)
+            return result, False
+        finally:
+            await cache.adelete(lock_key)
+
+
+# ============================================================================
+# SINGLETONS
+# ============================================================================
+
+def _options():
+    return {
+        'wait_timeout': _setting('CHATBOT_COALESCE_WAIT_SECONDS', DEFAULT_WAIT_TIMEOUT),
+        'shared_lock': _setting('CHATBOT_COALESCE_SHARED_LOCK', False),
+    }
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+_async_single_flights = weakref.WeakKeyDictionary()
+
+
+def get_single_flight():
+    """SingleFlight dùng chung trong process"""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight(**_options())
+    return _single_flight
+
+
+def get_async_single_flight():
+    """AsyncSingleFlight của event loop đang chạy"""
+    loop = asyncio.get_running_loop()
+    single_flight = _async_single_flights.get(loop)
+    if single_flight is None:
+        single_flight = _async_single_flights[loop] = AsyncSingleFlight(**_options())
+    return single_flight
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming câu trả lời chatbot tới trình duyệt dưới dạng Server-Sent Events.
+
+- Backend trả token / chunk (AsyncLLMClient.stream) → gom thành câu hoàn chỉnh
+  → format_bot_response từng câu → gửi ngay 1 event 'chunk' (bản xem trước:
+  người dùng thấy câu đầu tiên sau vài trăm ms thay vì chờ LLM sinh xong)
+- Xuống dòng giữa các câu có thể khác bản không stream (format từng câu không
+  thấy câu sau) → event cuối 'done' mang format_bot_response(toàn bộ text thô),
+  giống hệt chat_api; trình duyệt thay bản xem trước bằng text này, answer
+  cache + lịch sử chat cũng lưu text này
+- Lỗi → event 'error' với cùng code như chat_api (TIMEOUT, CONNECTION_ERROR, ...)
+
+Protocol (text/event-stream):
+    event: chunk
+    data: {"text": "Ức gà có khoảng 31g protein."}
+
+    event: done
+    data: {"response": "...", "code": "LLM_SUCCESS", "timestamp": "..."}
+"""
+
+import json
+import re
+
+from .views import CHAT_ERRORS, format_bot_response
+
+
+# Hết câu: . ! ? (không phải "1." của danh sách đánh số / "31.5") + khoảng trắng, hoặc xuống dòng
+_SENTENCE_END_RE = re.compile(r'(?<!\d)[.!?](?=\s)|\n')
+
+
+class SentenceFormatter:
+    """
+    Format incremental: nhận text thô theo từng mảnh, trả về các đoạn đã
+    format (bản xem trước) mỗi khi có ít nhất 1 câu hoàn chỉnh.
+    text = format_bot_response(toàn bộ text thô), giống bản không stream.
+
+    Example:
+        formatter = SentenceFormatter()
+        formatter.feed('Ức gà giàu đạm. Nên ')   → ['Ức gà giàu đạm.']
+        formatter.feed('ăn sau tập.')           → []
+        formatter.close()                       → ['\\nNên ăn sau tập.']
+        formatter.text                          → 'Ức gà giàu đạm.\\nNên ăn sau tập.'
+    """
+
+    def __init__(self):
+        self.raw = ''
+        self.buffer = ''
+        self.parts = []
+
+    def feed(self, text):
+        self.raw += text
+        self.buffer += text
+        last_end = None
+        for match in _SENTENCE_END_RE.finditer(self.buffer):
+            last_end = match.end()
+        if last_end is None:
+            return []
+        ready, self.buffer = self.buffer[:last_end], self.buffer[last_end:]
+        return self._emit(ready)
+
+    def close(self):
+        ready, self.buffer = self.buffer, ''
+        return self._emit(ready)
+
+    def _emit(self, raw):
+        formatted = format_bot_response(raw)
+        if not formatted:
+            return []
+        if self.parts:
+            formatted = '\n' + formatted
+        self.parts.append(formatted)
+        return [formatted]
+
+    @property
+    def text(self):
+        """Toàn bộ câu trả lời đã format, cùng quy tắc xuống dòng với chat_api"""
+        return format_bot_response(self.raw)
+
+
+def sse_event(event, data):
+    """1 Server-Sent Event (data là JSON 1 dòng)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def error_event(code, retry_after=None):
+    """Event 'error' cùng code / thông báo (+ retry_after như header Retry-After) với JSON của chat_api"""
+    data = {'success': False, 'error': CHAT_ERRORS[code][0], 'code': code}
+    if retry_after:
+        data['retry_after'] = retry_after
+    return sse_event('error', data)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Lưu lịch sử chat (ChatMessage) không chặn request.
+
+Trước đây mỗi câu trả lời = 1 INSERT ngay trên thread của request (sau khi
+đã chờ LLM vài giây). Ở đây:
+- record() chỉ thêm 1 dict vào buffer trong RAM (gọi được cả trong async view,
+  không đụng DB)
+- 1 flusher thread / process ghi bằng ChatMessage.objects.bulk_create khi đủ
+  batch_size tin nhắn hoặc sau flush_interval giây
+- Buffer có giới hạn (max_size): đầy thì bỏ tin nhắn CŨ NHẤT (giống
+  blog/logging_handlers.py) → RAM bị chặn kể cả khi DB chậm
+- atexit: dừng thread + ghi nốt phần còn lại
+- background=False (test, CHATBOT_TRANSCRIPT_BACKGROUND): không có thread,
+  ghi khi đủ batch hoặc khi gọi flush_transcripts()
+
+Ghi thêm latency_ms, backend_status, cache_hit, response_code cho analytics.
+
+Example:
+    get_transcript_buffer().record(
+        user_message=query, bot_response=answer,
+        latency_ms=812, backend_status=200, response_code='LLM_SUCCESS',
+    )
+    flush_transcripts()
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_MAX_SIZE = 5000
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ============================================================================
+# BUFFER
+# ============================================================================
+
+class TranscriptBuffer:
+    """Buffer ChatMessage trong process, flush bằng bulk_create"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_size=DEFAULT_MAX_SIZE, background=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.background = background
+
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()  # 1 bulk_create tại 1 thời điểm
+        self.thread = None
+        self.stopping = False
+        self.dropped = 0
+        self.written = 0
+
+    def record(self, **fields):
+        """Thêm 1 tin nhắn (timestamp = lúc trả lời, không phải lúc flush)"""
+        fields.setdefault('timestamp', timezone.now())
+        with self.condition:
+            if self.max_size and len(self.items) >= self.max_size:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(fields)
+            full = len(self.items) >= self.batch_size
+            if full:
+                self.condition.notify()
+
+        if self.background:
+            self._ensure_thread()
+        elif full:
+            self.flush()
+
+    def flush(self):
+        """Ghi mọi tin nhắn đang chờ. Returns: số dòng đã ghi"""
+        from django.db import close_old_connections
+
+        from .models import ChatMessage
+
+        with self.flush_lock:
+            with self.condition:
+                batch = list(self.items)
+                self.items.clear()
+            if not batch:
+                return 0
+            try:
+                if self.background:
+                    close_old_connections()
+                ChatMessage.objects.bulk_create(
+                    [ChatMessage(**fields) for fields in batch], batch_size=self.batch_size
+                )
+            except Exception as e:
+                logger.error(f"❌ Chat transcripts: dropped {len(batch)} messages ({e})")
+                return 0
+            self.written += len(batch)
+            return len(batch)
+
+    def __len__(self):
+        return len(self.items)
+
+    # ---------- flusher thread ----------
+
+    def _ensure_thread(self):
+        if self.thread is not None:
+            return
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='chat-transcripts', daemon=True)
+                self.thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.stopping or len(self.items) >= self.batch_size, self.flush_interval
+                )
+                stopping = self.stopping
+            self.flush()
+            if stopping:
+                return
+
+    def stop(self):
+        """Dừng flusher thread, ghi nốt phần còn lại"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+            thread = self.thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=10)
+        self.flush()
+
+
+# ============================================================================
+# PER-PROCESS SINGLETON
+# ============================================================================
+
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+
+def get_transcript_buffer():
+    """
+    TranscriptBuffer dùng chung trong process hiện tại.
+    Tạo lại sau fork (gunicorn preload): thread không đi theo process con.
+    """
+    global _buffer, _buffer_pid
+    pid = os.getpid()
+    if _buffer is None or _buffer_pid != pid:
+        with _buffer_lock:
+            if _buffer is None or _buffer_pid != pid:
+                _buffer = TranscriptBuffer(
+                    batch_size=_setting('CHATBOT_TRANSCRIPT_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                    flush_interval=_setting('CHATBOT_TRANSCRIPT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL),
+                    max_size=_setting('CHATBOT_TRANSCRIPT_MAX_BUFFER', DEFAULT_MAX_SIZE),
+                    background=_setting('CHATBOT_TRANSCRIPT_BACKGROUND', True),
+                )
+                _buffer_pid = pid
+    return _buffer
+
+
+def flush_transcripts():
+    """Ghi ngay các tin nhắn đang chờ trong process hiện tại"""
+    return get_transcript_buffer().flush()
+
+
+def reset_transcript_buffer():
+    """Dừng + bỏ buffer hiện tại, KHÔNG ghi các tin nhắn đang chờ (test / đổi settings)"""
+    global _buffer, _buffer_pid
+    with _buffer_lock:
+        buffer, _buffer, _buffer_pid = _buffer, None, None
+    if buffer is not None:
+        with buffer.condition:
+            buffer.items.clear()
+        buffer.stop()
@@ -1,10 +1,20 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
 
 app_name = 'chatbot'
 
+# ASGI (uvicorn): dùng bản async cho các endpoint gọi LLM
+if settings.CHATBOT_ASYNC_VIEWS:
+    chat_view, health_view = async_views.chat_api, async_views.health_check
+else:
+    chat_view, health_view = views.chat_api, views.health_check
+
 urlpatterns = [
-    path('api/chat/', views.chat_api, name='chat_api'),
-    path('health/', views.health_check, name='health_check'),
+    path('api/chat/', chat_view, name='chat_api'),
+    path('api/chat/stream/', async_views.chat_stream, name='chat_stream'),
+    path('health/', health_view, name='health_check'),
+    path('async/api/chat/', async_views.chat_api, name='chat_api_async'),
+    path('async/health/', async_views.health_check, name='health_check_async'),
     path('update-ngrok/', views.update_ngrok_url, name='update_ngrok'),
 ]
@@ -1,25 +1,25 @@
+from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 import requests
-import os
+import hmac
 import json
 import logging
 import re
 from datetime import datetime
-from .models import NgrokConfig, ChatMessage
+from .models import NgrokConfig
+from .ngrok_config import get_ngrok_api_url
+from .llm_client import get_llm_client
+from .admission import AdmissionRejected, get_admission_controller
+from .answer_cache import get_answer_cache, normalize_query
+from .circuit_breaker import CircuitOpenError, get_llm_breaker
+from .retrieval import retrieve_for_chat
+from .single_flight import SingleFlightTimeout, get_single_flight
+from .transcripts import get_transcript_buffer
 
 logger = logging.getLogger(__name__)
 
-def get_ngrok_api_url():
-    """Lấy Ngrok API URL từ database hoặc environment"""
-    # Ưu tiên database trước
-    url = NgrokConfig.get_active_url()
-    if url:
-        return url
-    # Fallback sang environment variable
-    return os.getenv('NGROK_LLM_API', 'https://yyyyy.ngrok-free.app/ask')
-
 def format_bot_response(text):
     """
     Format bot response để dễ đọc hơn:
@@ -44,8 +44,123 @@ def format_bot_response(text):
     
     return text.strip()
 
-# Health check cache
-health_cache = {'last_check': None, 'status': None}
+# ============================================================================
+# SHARED HELPERS (dùng chung cho views sync và chatbot/async_views.py)
+# ============================================================================
+
+MAX_QUERY_LENGTH = 500
+
+# code → (thông báo cho người dùng, HTTP status)
+CHAT_ERRORS = {
+    'EMPTY_QUERY': ('Query không được trống', 400),
+    'QUERY_TOO_LONG': (f'Câu hỏi quá dài (tối đa {MAX_QUERY_LENGTH} ký tự)', 400),
+    'TIMEOUT': ('⏱️ Chatbot đang xử lý chậm, vui lòng thử lại sau', 504),
+    'CONNECTION_ERROR': ('📡 Chatbot tạm thời offline, vui lòng thử lại sau', 503),
+    'CIRCUIT_OPEN': ('📡 Chatbot tạm thời offline, vui lòng thử lại sau', 503),
+    'OVERLOADED': ('🚦 Chatbot đang quá tải, vui lòng thử lại sau ít phút', 503),
+    'LLM_HTTP_ERROR': ('🚨 Chatbot gặp lỗi, vui lòng thử lại sau', 502),
+    'INVALID_RESPONSE': ('❌ Không nhận được phản hồi từ chatbot', 502),
+    'JSON_ERROR': ('⚠️ Yêu cầu không hợp lệ', 400),
+    'SERVER_ERROR': ('⚠️ Lỗi server, vui lòng thử lại sau', 500),
+}
+
+# LLM trả 200 nhưng không có câu trả lời → thông báo này, code LLM_EMPTY
+# (không cache, không seed lại answer cache từ lịch sử)
+NO_ANSWER_MESSAGE = 'Không có câu trả lời từ LLM'
+
+
+def llm_answer_code(answer):
+    return 'LLM_SUCCESS' if answer else 'LLM_EMPTY'
+
+
+def chat_error(code, retry_after=None):
+    message, status = CHAT_ERRORS[code]
+    response = JsonResponse({'success': False, 'error': message, 'code': code}, status=status)
+    if retry_after:
+        response['Retry-After'] = str(retry_after)
+    return response
+
+
+def validate_query(user_query):
+    """Trả JsonResponse lỗi nếu câu hỏi không hợp lệ, ngược lại None"""
+    if not user_query:
+        return chat_error('EMPTY_QUERY')
+    if len(user_query) > MAX_QUERY_LENGTH:
+        return chat_error('QUERY_TOO_LONG')
+    return None
+
+
+def chat_success(bot_response, **extra):
+    return JsonResponse({
+        'success': True,
+        'response': bot_response,
+        'timestamp': datetime.now().isoformat(),
+        **extra,
+    })
+
+
+def save_chat_message(user_query, bot_response, **fields):
+    """
+    Save chat history (optional) so admin can review conversations.
+    Chỉ đưa vào buffer (chatbot/transcripts.py), không chờ DB → gọi thẳng được trong async view.
+    fields: latency_ms, backend_status, cache_hit, response_code
+    """
+    try:
+        get_transcript_buffer().record(user_message=user_query, bot_response=bot_response, **fields)
+    except Exception:
+        logger.exception("Không thể lưu ChatMessage (bỏ qua)")
+
+
+def health_response(result, breaker, cached=False, admission=None):
+    """
+    LLMResult của /health (None = không kết nối được) → JsonResponse.
+    admission: controller để báo thống kê hàng đợi (mặc định bản sync)
+    """
+    if result is None:
+        return health_offline_response(get_ngrok_api_url(), breaker)
+    if result.status_code == 200:
+        return JsonResponse({
+            'success': True,
+            'status': 'healthy',
+            'message': '✅ Colab LLM online',
+            'latency_ms': round(result.latency_ms),
+            'cached': cached,
+            'circuit': breaker.snapshot(),
+            'admission': (admission or get_admission_controller()).snapshot(),
+            'timestamp': datetime.now().isoformat()
+        })
+    return JsonResponse({
+        'success': False,
+        'status': 'unhealthy',
+        'message': f'⚠️ LLM trả về status {result.status_code}',
+        'latency_ms': round(result.latency_ms),
+        'cached': cached,
+        'circuit': breaker.snapshot()
+    }, status=503)
+
+
+def health_offline_response(ngrok_api_url, breaker):
+    return JsonResponse({
+        'success': False,
+        'status': 'offline',
+        'message': '❌ Ngrok offline - Không kết nối được Colab',
+        'ngrok_url': ngrok_api_url,
+        'circuit': breaker.snapshot()
+    }, status=503)
+
+
+def cached_health_response(breaker, admission=None):
+    """
+    Trả lời /health không cần probe mạng: kết quả còn trong TTL, hoặc breaker
+    đang open (backend vừa lỗi liên tục). None → cần probe.
+    """
+    fresh, result = breaker.cached_health()
+    if fresh:
+        return health_response(result, breaker, cached=True, admission=admission)
+    if breaker.state == 'open':
+        return health_offline_response(get_ngrok_api_url(), breaker)
+    return None
+
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -59,101 +174,89 @@ def chat_api(request):
         data = json.loads(request.body)
         user_query = data.get('query', '').strip()
         
-        if not user_query:
-            return JsonResponse({
-                'success': False,
-                'error': 'Query không được trống',
-                'code': 'EMPTY_QUERY'
-            }, status=400)
-        
-        if len(user_query) > 500:
-            return JsonResponse({
-                'success': False,
-                'error': 'Câu hỏi quá dài (tối đa 500 ký tự)',
-                'code': 'QUERY_TOO_LONG'
-            }, status=400)
+        invalid = validate_query(user_query)
+        if invalid is not None:
+            return invalid
         
         logger.info(f"🔄 Chat request: {user_query[:50]}...")
         
+        # ⚡ Câu hỏi lặp lại → trả từ cache, không gọi LLM
+        answer_cache = get_answer_cache()
+        cached_response = answer_cache.get(user_query)
+        if cached_response is not None:
+            logger.info(f"⚡ Answer cache hit: {user_query[:50]}...")
+            save_chat_message(user_query, cached_response, cache_hit=True, response_code='CACHE_HIT')
+            return chat_success(cached_response, cached=True, code='CACHE_HIT')
+        
+        # 🔎 Câu hỏi về sản phẩm trả lời được từ catalogue → không gọi LLM
+        retrieval = retrieve_for_chat(user_query)
+        if retrieval.answer is not None:
+            logger.info(f"🔎 Retrieval answer: {user_query[:50]}...")
+            save_chat_message(user_query, retrieval.answer, response_code='RETRIEVAL_ANSWER')
+            return chat_success(retrieval.answer, sources=retrieval.sources, code='RETRIEVAL_ANSWER')
+        
         # Lấy Ngrok API URL từ database
         ngrok_api_url = get_ngrok_api_url()
         
-        # 🔗 Gọi Colab LLM Backend qua Ngrok
+        # 🔗 Gọi Colab LLM Backend qua Ngrok (session keep-alive dùng chung)
+        def call_backend():
+            # Xếp hàng chờ slot (giới hạn số lời gọi đồng thời tới Colab) rồi mới gọi
+            with get_admission_controller().slot(), get_llm_breaker().guard():
+                # Kèm top-k đoạn liên quan (sản phẩm / bài viết) làm context cho LLM
+                return get_llm_client().ask(ngrok_api_url, user_query, **retrieval.payload())
+        
         try:
-            response = requests.post(
-                ngrok_api_url,
-                json={'query': user_query},
-                timeout=30,
-                headers={'Content-Type': 'application/json'}
-            )
-            response.raise_for_status()
+            # Cùng câu hỏi đang được hỏi ở request khác → chờ chung 1 lời gọi
+            result, coalesced = get_single_flight().do(normalize_query(user_query), call_backend)
             
-            llm_data = response.json()
-            bot_response = llm_data.get('answer', 'Không có câu trả lời từ LLM')
+            llm_data = result.data
+            answer = format_bot_response(llm_data.get('answer'))
             
-            # Format response để dễ đọc hơn
-            bot_response = format_bot_response(bot_response)
+            # Format response để dễ đọc hơn; LLM không trả lời → thông báo, KHÔNG cache
+            bot_response = answer or NO_ANSWER_MESSAGE
+            code = llm_answer_code(answer)
             
-            logger.info(f"✅ LLM response: {bot_response[:100]}...")
-            # Save chat history (optional) so admin can review conversations
-            try:
-                ChatMessage.objects.create(user_message=user_query, bot_response=bot_response)
-            except Exception:
-                logger.exception("Không thể lưu ChatMessage (bỏ qua)")
+            logger.info(f"✅ LLM response ({result.latency_ms:.0f}ms): {bot_response[:100]}...")
+            if answer:
+                answer_cache.set(user_query, answer)
+            save_chat_message(
+                user_query, bot_response, latency_ms=round(result.latency_ms),
+                backend_status=result.status_code, response_code=code,
+            )
 
-            return JsonResponse({
-                'success': True,
-                'response': bot_response,
-                'timestamp': datetime.now().isoformat(),
-                'code': 'LLM_SUCCESS'
-            })
+            return chat_success(
+                bot_response, latency_ms=round(result.latency_ms), coalesced=coalesced, code=code
+            )
+            
+        except CircuitOpenError as e:
+            logger.warning(f"⚡ LLM circuit open, fail fast (retry after {e.retry_after}s)")
+            return chat_error('CIRCUIT_OPEN', retry_after=e.retry_after)
             
-        except requests.exceptions.Timeout:
+        except AdmissionRejected as e:
+            return chat_error('OVERLOADED', retry_after=e.retry_after)
+            
+        except (requests.exceptions.Timeout, SingleFlightTimeout):
             logger.error("LLM Timeout")
-            return JsonResponse({
-                'success': False,
-                'error': '⏱️ Chatbot đang xử lý chậm, vui lòng thử lại sau',
-                'code': 'TIMEOUT'
-            }, status=504)
+            return chat_error('TIMEOUT')
             
         except requests.exceptions.ConnectionError:
             logger.error("LLM Connection Error")
-            return JsonResponse({
-                'success': False,
-                'error': '📡 Chatbot tạm thời offline, vui lòng thử lại sau',
-                'code': 'CONNECTION_ERROR'
-            }, status=503)
+            return chat_error('CONNECTION_ERROR')
             
         except requests.exceptions.HTTPError as e:
             logger.error(f"LLM HTTP Error: {e}")
-            return JsonResponse({
-                'success': False,
-                'error': '🚨 Chatbot gặp lỗi, vui lòng thử lại sau',
-                'code': 'LLM_HTTP_ERROR'
-            }, status=502)
+            return chat_error('LLM_HTTP_ERROR')
             
         except (json.JSONDecodeError, KeyError):
             logger.error("❌ Invalid LLM response format")
-            return JsonResponse({
-                'success': False,
-                'error': '❌ Không nhận được phản hồi từ chatbot',
-                'code': 'INVALID_RESPONSE'
-            }, status=502)
+            return chat_error('INVALID_RESPONSE')
             
     except json.JSONDecodeError:
-        return JsonResponse({
-            'success': False,
-            'error': '⚠️ Yêu cầu không hợp lệ',
-            'code': 'JSON_ERROR'
-        }, status=400)
+        return chat_error('JSON_ERROR')
         
     except Exception as e:
         logger.error(f"❌ Unexpected error: {str(e)}")
-        return JsonResponse({
-            'success': False,
-            'error': '⚠️ Lỗi server, vui lòng thử lại sau',
-            'code': 'SERVER_ERROR'
-        }, status=500)
+        return chat_error('SERVER_ERROR')
 
 
 @csrf_exempt
@@ -163,34 +266,26 @@ def health_check(request):
     API Endpoint: GET /chatbot/health/
     Kiểm tra kết nối với Colab LLM
     """
+    breaker = get_llm_breaker()
+    cached = cached_health_response(breaker)
+    if cached is not None:
+        return cached
+    
     try:
         ngrok_api_url = get_ngrok_api_url()
-        response = requests.get(
-            ngrok_api_url.replace('/ask', '/health'),
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            return JsonResponse({
-                'success': True,
-                'status': 'healthy',
-                'message': '✅ Colab LLM online',
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
-            return JsonResponse({
-                'success': False,
-                'status': 'unhealthy',
-                'message': f'⚠️ LLM trả về status {response.status_code}'
-            }, status=503)
+        with breaker.guard() as call:
+            result = get_llm_client().health(ngrok_api_url)
+            if result.status_code != 200:
+                call.mark_failure()
+        breaker.remember_health(result)
+        return health_response(result, breaker)
+    
+    except CircuitOpenError:
+        return health_offline_response(get_ngrok_api_url(), breaker)
             
     except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
-        return JsonResponse({
-            'success': False,
-            'status': 'offline',
-            'message': '❌ Ngrok offline - Không kết nối được Colab',
-            'ngrok_url': get_ngrok_api_url()
-        }, status=503)
+        breaker.remember_health(None)
+        return health_offline_response(get_ngrok_api_url(), breaker)
         
     except Exception as e:
         return JsonResponse({
@@ -200,15 +295,29 @@ def health_check(request):
         }, status=500)
 
 
+def can_update_ngrok_url(request):
+    """
+    Staff đã đăng nhập, hoặc header X-Ngrok-Token khớp settings.NGROK_UPDATE_TOKEN
+    (cho notebook Colab tự đẩy URL mới). Token trống → chỉ staff.
+    """
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = getattr(settings, 'NGROK_UPDATE_TOKEN', '')
+    provided = request.headers.get('X-Ngrok-Token', '')
+    return bool(token) and hmac.compare_digest(provided.encode(), token.encode())
+
+
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
 def update_ngrok_url(request):
     """
     API Endpoint: POST /chatbot/update-ngrok/
-    Cập nhật Ngrok URL (trong production, thêm authentication)
+    Cập nhật Ngrok URL - URL được lưu vào NgrokConfig và áp dụng cho MỌI worker,
+    nên chỉ staff hoặc request có header X-Ngrok-Token hợp lệ được gọi.
     Request: {"ngrok_url": "https://xxxxx.ngrok-free.app/ask"}
     """
-    global NGROK_LLM_API
+    if not can_update_ngrok_url(request):
+        return JsonResponse({'success': False, 'error': 'Forbidden'}, status=403)
     
     if request.method == "POST":
         try:
@@ -221,8 +330,10 @@ def update_ngrok_url(request):
                     'error': 'URL không hợp lệ'
                 }, status=400)
             
-            NGROK_LLM_API = new_url
-            os.environ['NGROK_LLM_API'] = new_url
+            # Lưu vào NgrokConfig active → save() invalidate URL cache của mọi worker
+            config = NgrokConfig.objects.filter(is_active=True).first() or NgrokConfig(is_active=True)
+            config.ngrok_api_url = new_url
+            config.save()
             
             logger.info(f"✅ Ngrok URL cập nhật: {new_url}")
             
@@ -240,6 +351,6 @@ def update_ngrok_url(request):
     
     else:  # GET
         return JsonResponse({
-            'current_ngrok_url': NGROK_LLM_API,
+            'current_ngrok_url': get_ngrok_api_url(),
             'timestamp': datetime.now().isoformat()
         })
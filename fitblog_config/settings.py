@@ -79,6 +79,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'fitblog_config.wsgi.application'
+ASGI_APPLICATION = 'fitblog_config.asgi.application'  # uvicorn (Procfile / Dockerfile) - chatbot async views
 
 
 # Database
@@ -153,17 +154,61 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # Session tồn tại lâu dài, không
 
 # ===== CACHE CONFIGURATION =====
 # ✅ OPTIMIZATION: Added caching to reduce database queries
+# Cache dùng chung giữa các worker (cache_page, DRF throttle, LoginThrottle, view counter):
+# REDIS_URL → Redis, MEMCACHED_LOCATION → Memcached, không có → file SQLite WAL trên
+# cùng máy (fitblog_config/sqlite_cache.py, không cần service ngoài).
+REDIS_URL = config('REDIS_URL', default='')
+MEMCACHED_LOCATION = config('MEMCACHED_LOCATION', default='')
+
+if REDIS_URL:
+    _default_cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',  # cần package redis
+        'LOCATION': REDIS_URL,
+    }
+elif MEMCACHED_LOCATION:
+    _default_cache = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',  # cần package pymemcache
+        'LOCATION': MEMCACHED_LOCATION.split(','),
+    }
+else:
+    _default_cache = {
+        'BACKEND': 'fitblog_config.sqlite_cache.SQLiteCache',
+        # Khi chạy test: SQLite trong RAM (fitblog_config/test_settings.py)
+        'LOCATION': config('CACHE_SQLITE_PATH', default=str(BASE_DIR / 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=50000, cast=int),
+            'MMAP_SIZE': 64 * 1024 * 1024,
+        },
+    }
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'fitblog-cache',
         'TIMEOUT': 300,  # 5 minutes
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000
-        }
+        **_default_cache,
     }
 }
 
+# Cache alias giữ bộ đếm đăng nhập thất bại (products/auth_throttle.py).
+# Cần cache dùng chung giữa các worker (incr / add atomic).
+LOGIN_THROTTLE_CACHE = config('LOGIN_THROTTLE_CACHE', default='default')
+
+# ===== BLOG VIEW COUNTER (blog/view_counter.py) =====
+# Lượt xem được cộng trong cache, flush xuống Post.views mỗi N giây
+BLOG_VIEW_FLUSH_INTERVAL = config('BLOG_VIEW_FLUSH_INTERVAL', default=30, cast=int)
+# Flush sớm khi có quá nhiều bài viết đang chờ
+BLOG_VIEW_FLUSH_MAX_PENDING = config('BLOG_VIEW_FLUSH_MAX_PENDING', default=200, cast=int)
+
+# ===== DATA RETENTION (blog/retention.py, python manage.py purge_old_records) =====
+RETENTION_POLICIES = {
+    'blog.SystemLog': {'days': config('SYSTEMLOG_RETENTION_DAYS', default=30, cast=int)},
+    'chatbot.ChatMessage': {'days': config('CHATMESSAGE_RETENTION_DAYS', default=90, cast=int)},
+}
+
+# ===== NEWSLETTER DELIVERY (blog/newsletter.py) =====
+NEWSLETTER_BATCH_SIZE = config('NEWSLETTER_BATCH_SIZE', default=100, cast=int)  # email / SMTP connection
+NEWSLETTER_WORKERS = config('NEWSLETTER_WORKERS', default=4, cast=int)
+NEWSLETTER_RATE_PER_SECOND = config('NEWSLETTER_RATE_PER_SECOND', default=20, cast=float)  # 0 = không giới hạn
+
 
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
@@ -229,8 +274,61 @@ REST_FRAMEWORK = {
 # )
 # Chatbot API
 NGROK_LLM_API = config('NGROK_LLM_API', default='http://localhost:8001/ask')
+CHATBOT_NGROK_URL_TTL = config('CHATBOT_NGROK_URL_TTL', default=5, cast=int)  # giây cache URL trong process (chatbot/ngrok_config.py)
+# Token cho POST /chatbot/update-ngrok/ (header X-Ngrok-Token); trống → chỉ staff được đổi URL
+NGROK_UPDATE_TOKEN = config('NGROK_UPDATE_TOKEN', default='')
+
+# True khi chạy ASGI (Procfile: uvicorn worker) → /chatbot/api/chat/ dùng chatbot/async_views.py
+CHATBOT_ASYNC_VIEWS = config('CHATBOT_ASYNC_VIEWS', default=False, cast=bool)
+
+# LLM HTTP client (chatbot/llm_client.py) - 1 Session keep-alive / process
+LLM_CONNECT_TIMEOUT = config('LLM_CONNECT_TIMEOUT', default=3.05, cast=float)
+LLM_READ_TIMEOUT = config('LLM_READ_TIMEOUT', default=30, cast=float)
+LLM_HEALTH_READ_TIMEOUT = config('LLM_HEALTH_READ_TIMEOUT', default=5, cast=float)
+LLM_POOL_MAXSIZE = config('LLM_POOL_MAXSIZE', default=16, cast=int)
+LLM_ASYNC_MAX_CONNECTIONS = config('LLM_ASYNC_MAX_CONNECTIONS', default=500, cast=int)  # async: LLM call đang chờ / process
+LLM_HEALTH_RETRIES = config('LLM_HEALTH_RETRIES', default=2, cast=int)  # chỉ GET /health được retry
+
+# Circuit breaker cho LLM backend (chatbot/circuit_breaker.py)
+LLM_BREAKER_WINDOW_SECONDS = config('LLM_BREAKER_WINDOW_SECONDS', default=60, cast=int)
+LLM_BREAKER_MIN_CALLS = config('LLM_BREAKER_MIN_CALLS', default=5, cast=int)
+LLM_BREAKER_FAILURE_RATE = config('LLM_BREAKER_FAILURE_RATE', default=0.5, cast=float)
+LLM_BREAKER_SLOW_CALL_MS = config('LLM_BREAKER_SLOW_CALL_MS', default=25000, cast=int)  # chậm hơn → tính là lỗi
+LLM_BREAKER_OPEN_SECONDS = config('LLM_BREAKER_OPEN_SECONDS', default=30, cast=int)  # fail fast trong khoảng này
+LLM_HEALTH_CACHE_TTL = config('LLM_HEALTH_CACHE_TTL', default=15, cast=int)
+
+# Admission control (chatbot/admission.py) - giới hạn / process, tổng = số worker x CHATBOT_MAX_IN_FLIGHT
+CHATBOT_MAX_IN_FLIGHT = config('CHATBOT_MAX_IN_FLIGHT', default=4, cast=int)
+CHATBOT_MAX_QUEUE = config('CHATBOT_MAX_QUEUE', default=50, cast=int)
+CHATBOT_ADMISSION_DEADLINE_SECONDS = config('CHATBOT_ADMISSION_DEADLINE_SECONDS', default=30, cast=float)
+
+# Gộp câu hỏi giống nhau đang chờ LLM (chatbot/single_flight.py)
+CHATBOT_COALESCE_WAIT_SECONDS = config('CHATBOT_COALESCE_WAIT_SECONDS', default=35, cast=float)
+CHATBOT_COALESCE_SHARED_LOCK = config('CHATBOT_COALESCE_SHARED_LOCK', default=False, cast=bool)  # cần cache dùng chung
+
+# Cache câu trả lời chatbot (chatbot/answer_cache.py) - LRU + TTL trong process
+CHATBOT_ANSWER_CACHE_MAX_ENTRIES = config('CHATBOT_ANSWER_CACHE_MAX_ENTRIES', default=1000, cast=int)
+CHATBOT_ANSWER_CACHE_TTL = config('CHATBOT_ANSWER_CACHE_TTL', default=60 * 60 * 6, cast=int)
+CHATBOT_ANSWER_CACHE_SIMILARITY = config('CHATBOT_ANSWER_CACHE_SIMILARITY', default=0.0, cast=float)  # 0 = tắt near-duplicate
+CHATBOT_ANSWER_CACHE_SEED = config('CHATBOT_ANSWER_CACHE_SEED', default=500, cast=int)  # seed từ ChatMessage
+
+# Retrieval trước LLM (chatbot/retrieval.py) - câu hỏi về sản phẩm trả lời từ catalogue
+CHATBOT_RETRIEVAL_ENABLED = config('CHATBOT_RETRIEVAL_ENABLED', default=True, cast=bool)
+CHATBOT_RETRIEVAL_TOP_K = config('CHATBOT_RETRIEVAL_TOP_K', default=3, cast=int)  # số đoạn context gửi kèm LLM
+
+# Lưu ChatMessage theo batch ngoài request (chatbot/transcripts.py). Khi chạy test
+# không có flusher thread (ghi khi gọi flush_transcripts()) - fitblog_config/test_settings.py.
+CHATBOT_TRANSCRIPT_BATCH_SIZE = config('CHATBOT_TRANSCRIPT_BATCH_SIZE', default=100, cast=int)
+CHATBOT_TRANSCRIPT_FLUSH_INTERVAL = config('CHATBOT_TRANSCRIPT_FLUSH_INTERVAL', default=2.0, cast=float)
+CHATBOT_TRANSCRIPT_MAX_BUFFER = config('CHATBOT_TRANSCRIPT_MAX_BUFFER', default=5000, cast=int)  # đầy → bỏ tin cũ nhất
+CHATBOT_TRANSCRIPT_BACKGROUND = config('CHATBOT_TRANSCRIPT_BACKGROUND', default=True, cast=bool)
 
 # ===== Logging =====
+# Ghi log vào SystemLog (xem trong admin) qua handler non-blocking, batch bulk_create
+# (blog/logging_handlers.py). Tắt khi chạy test (fitblog_config/test_settings.py).
+DB_LOGGING_ENABLED = config('DB_LOGGING_ENABLED', default=True, cast=bool)
+_app_log_handlers = ['console', 'database'] if DB_LOGGING_ENABLED else ['console']
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -253,21 +351,29 @@ LOGGING = {
             'class': 'blog.logging_handlers.DatabaseLogHandler',
             'formatter': 'verbose',
             'level': 'INFO',  # Only log INFO and above to DB to avoid noise
+            'batch_size': config('DB_LOGGING_BATCH_SIZE', default=200, cast=int),
+            'flush_interval': config('DB_LOGGING_FLUSH_INTERVAL', default=2.0, cast=float),
+            'max_queue_size': config('DB_LOGGING_MAX_QUEUE', default=10000, cast=int),
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console'],  # Disable database handler for now
+            'handlers': _app_log_handlers,
             'level': 'INFO',
             'propagate': False,
         },
         'blog': {
-            'handlers': ['console'],  # Disable database handler for now
+            'handlers': _app_log_handlers,
             'level': 'INFO',
             'propagate': False,
         },
         'chatbot': {
-            'handlers': ['console'],  # Disable database handler for now
+            'handlers': _app_log_handlers,
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'products': {
+            'handlers': _app_log_handlers,
             'level': 'INFO',
             'propagate': False,
         },
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Cache backend SQLite (WAL) dùng chung giữa các process trên cùng 1 máy.
+
+LocMemCache: mỗi gunicorn / uvicorn worker có cache riêng → cache_page,
+DRF throttle, LoginThrottle, view counter... khác nhau tùy worker phục vụ
+request. Backend này lưu trong 1 file SQLite:
+- journal_mode=WAL: đọc không chặn ghi, nhiều process đọc / ghi cùng file
+- mmap_size: đọc qua memory-mapped I/O (OPTIONS['MMAP_SIZE'])
+- add / touch / delete: 1 câu SQL (atomic); incr: BEGIN IMMEDIATE (khóa ghi)
+  → đếm đúng khi nhiều worker incr cùng lúc
+- Mỗi thread / process 1 connection (tạo lại sau fork)
+- Cull: mỗi CULL_EVERY lần set → xóa key hết hạn, vượt MAX_ENTRIES thì bỏ
+  1/CULL_FREQUENCY key sắp hết hạn nhất
+
+Có Redis / Memcached thì settings dùng chúng thay (xem CACHES).
+LOCATION dạng 'file:...?mode=memory&cache=shared' → SQLite trong RAM, dùng
+chung giữa các thread của 1 process (test).
+
+Config (settings.CACHES):
+    'default': {
+        'BACKEND': 'fitblog_config.sqlite_cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache.sqlite3',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 50000, 'CULL_EVERY': 200, 'MMAP_SIZE': 64 * 1024 * 1024},
+    }
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+NOT_EXPIRED = '(expires IS NULL OR expires > ?)'
+DEFAULT_CULL_EVERY = 200
+DEFAULT_BUSY_TIMEOUT = 5.0
+
+
+class SQLiteCache(BaseCache):
+    """Django cache backend trên 1 file SQLite WAL (xem module docstring)"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = str(location)
+        self.cull_every = int(options.get('CULL_EVERY', DEFAULT_CULL_EVERY))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', DEFAULT_BUSY_TIMEOUT))
+        self.mmap_size = int(options.get('MMAP_SIZE', 0))
+        self._local = threading.local()
+        self._sets = 0
+        self._schema_lock = threading.Lock()
+        self._schema_pid = None
+
+    # ---------- connection ----------
+
+    def _connection(self):
+        pid = os.getpid()
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == pid:
+            return connection
+
+        # isolation_level=None: autocommit, transaction tự quản lý (BEGIN IMMEDIATE)
+        connection = sqlite3.connect(
+            self.location, timeout=self.busy_timeout, isolation_level=None,
+            check_same_thread=False, uri=self.location.startswith('file:'),
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        if self.mmap_size:
+            connection.execute(f'PRAGMA mmap_size={self.mmap_size}')
+        self._ensure_schema(connection, pid)
+        self._local.connection, self._local.pid = connection, pid
+        return connection
+
+    def _ensure_schema(self, connection, pid):
+        if self._schema_pid == pid:
+            return
+        with self._schema_lock:
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._schema_pid = pid
+
+    # ---------- helpers ----------
+
+    def _expiry(self, timeout):
+        """Thời điểm hết hạn (epoch) hoặc None = không hết hạn"""
+        return self.get_backend_timeout(timeout)
+
+    @staticmethod
+    def _dumps(value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    # ---------- BaseCache API ----------
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, self._dumps(value), self._expiry(timeout), time.time()),
+        )
+        added = cursor.rowcount == 1
+        if added:
+            self._maybe_cull()
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            f'SELECT value FROM cache WHERE key = ? AND {NOT_EXPIRED}', (key, time.time())
+        ).fetchone()
+        if row is None:
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, self._dumps(value), self._expiry(timeout)),
+        )
+        self._maybe_cull()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {NOT_EXPIRED}',
+            (self._expiry(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {NOT_EXPIRED}', (key, time.time())
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Atomic giữa các process: đọc + ghi trong cùng 1 transaction có khóa ghi"""
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {NOT_EXPIRED}', (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute('UPDATE cache SET value = ? WHERE key = ?', (self._dumps(value), key))
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return value
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        placeholders = ', '.join('?' * len(key_map))
+        rows = self._connection().execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) AND {NOT_EXPIRED}',
+            (*key_map, time.time()),
+        ).fetchall()
+        return {key_map[key]: pickle.loads(value) for key, value in rows}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expiry(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), self._dumps(value), expires)
+            for key, value in data.items()
+        ]
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)', rows)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        self._maybe_cull(len(rows))
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            self._connection().execute(
+                f"DELETE FROM cache WHERE key IN ({', '.join('?' * len(keys))})", keys
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Gọi sau mỗi request (request_finished): giữ connection để dùng lại
+        pass
+
+    # ---------- culling ----------
+
+    def _maybe_cull(self, count=1):
+        self._sets += count
+        if self._sets >= self.cull_every:
+            self._sets = 0
+            self.cull()
+
+    def cull(self):
+        """Xóa key hết hạn; vẫn vượt MAX_ENTRIES → bỏ 1/CULL_FREQUENCY key sắp hết hạn nhất"""
+        connection = self._connection()
+        connection.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        if not self._max_entries:
+            return
+        total = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if total > self._max_entries:
+            # CULL_FREQUENCY=0: xóa hết (giống backend có sẵn của Django)
+            limit = total // self._cull_frequency if self._cull_frequency else total
+            connection.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)', (limit,)
+            )
@@ -0,0 +1,23 @@
+"""
+Settings khi chạy test: python manage.py test (manage.py tự chọn module này,
+DJANGO_SETTINGS_MODULE đặt sẵn thì vẫn ưu tiên).
+"""
+from .settings import *  # noqa: F401,F403
+
+# Không ghi log vào SystemLog: listener thread ghi vào test DB ngoài transaction của test
+DB_LOGGING_ENABLED = False
+for _logger in LOGGING['loggers'].values():
+    _logger['handlers'] = ['console']
+
+# ChatMessage: không có flusher thread, test gọi flush_transcripts() rồi mới kiểm tra DB
+CHATBOT_TRANSCRIPT_BACKGROUND = False
+
+# Cache: SQLite trong RAM (mỗi lần chạy test bắt đầu với cache rỗng), kể cả khi
+# có REDIS_URL / MEMCACHED_LOCATION - cache.clear() trong test không đụng cache thật
+CACHES = {
+    'default': {
+        'BACKEND': 'fitblog_config.sqlite_cache.SQLiteCache',
+        'LOCATION': 'file:fitblog-test-cache?mode=memory&cache=shared',
+        'TIMEOUT': 300,
+    }
+}
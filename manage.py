@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fitblog_config.settings')
+    # `manage.py test` → fitblog_config/test_settings.py
+    default_settings = 'fitblog_config.test_settings' if sys.argv[1:2] == ['test'] else 'fitblog_config.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
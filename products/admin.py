@@ -11,7 +11,10 @@ from django.contrib.auth.models import User
 from django.db.models import Count, Q
 from datetime import timedelta
 from django.utils import timezone
-from .models import ProductCategory, Product, ProductReview, UserProfile, EventLog, ProductFlavor
+from .models import (
+    ProductCategory, Product, ProductReview, UserProfile, EventLog, ProductFlavor,
+    RecommendationDailyStat,
+)
 from .admin_user import UserAdmin, AdminUserFilter
 
 
@@ -470,7 +473,7 @@ class UserProfileAdmin(admin.ModelAdmin):
         }),
     )
     
-    actions = ['delete_old_sessions']
+    actions = ['delete_old_sessions', 'event_stats_report']
 
     def username_display(self, obj):
         """Hiển thị username hoặc session_id"""
@@ -618,6 +621,26 @@ class UserProfileAdmin(admin.ModelAdmin):
         
         self.message_user(request, f"Đã xóa {count} session cũ hơn 30 ngày")
     delete_old_sessions.short_description = "Xóa sessions cũ hơn 30 ngày"
+    
+    def event_stats_report(self, request, queryset):
+        """Action: Báo cáo event 30 ngày cho các profile được chọn (1 query cho tất cả)"""
+        from .utils_recommendations import get_event_stats_bulk
+        
+        profiles = list(queryset.select_related('user'))
+        stats_by_profile = get_event_stats_bulk(profiles, days=30)
+        
+        for profile in profiles:
+            stats = stats_by_profile[profile.id]
+            last_event = stats['last_event'].strftime('%d/%m/%Y %H:%M') if stats['last_event'] else '—'
+            self.message_user(
+                request,
+                f"{profile}: {stats['total_events']} events, "
+                f"{stats['unique_products_viewed']} sản phẩm, "
+                f"{stats['rec_shown_count']} gợi ý hiển thị, "
+                f"{stats['product_view_count']} lượt xem, "
+                f"lần cuối: {last_event}"
+            )
+    event_stats_report.short_description = "📊 Báo cáo event (30 ngày)"
 
 
 @admin.register(EventLog)
@@ -667,6 +690,62 @@ class EventLogAdmin(admin.ModelAdmin):
     product_name.short_description = "Product"
 
 
+@admin.register(RecommendationDailyStat)
+class RecommendationDailyStatAdmin(admin.ModelAdmin):
+    """Hiệu quả gợi ý theo ngày - CTR / conversion (read-only, tính bởi compute_rec_analytics)"""
+    list_display = [
+        'date',
+        'recommendation_type',
+        'product',
+        'impressions',
+        'clicks',
+        'purchases',
+        'ctr_display',
+        'conversion_display',
+    ]
+    list_filter = ['recommendation_type', 'date']
+    search_fields = ['product__name']
+    date_hierarchy = 'date'
+    list_select_related = ['product']
+    ordering = ['-date', '-impressions']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    change_list_template = 'admin/products/recommendationdailystat/change_list.html'
+
+    def changelist_view(self, request, extra_context=None):
+        """
+        Thêm tổng CTR / conversion theo loại gợi ý (30 ngày) vào đầu trang.
+        Truyền qua template (không dùng message_user: message lưu trong session,
+        dồn lại qua redirect và hiện ở trang admin khác).
+        """
+        from .rec_analytics import get_recommendation_report
+
+        report = get_recommendation_report(days=30, group_by='type')
+        rows = [
+            {
+                **row,
+                'ctr_display': f"{row['ctr']:.1%}",
+                'conversion_display': f"{row['conversion_rate']:.1%}",
+            }
+            for row in report['rows']
+        ]
+        extra_context = {**(extra_context or {}), 'rec_report': {**report, 'rows': rows}}
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def ctr_display(self, obj):
+        return f"{obj.ctr:.1%}"
+    ctr_display.short_description = "CTR"
+
+    def conversion_display(self, obj):
+        return f"{obj.conversion_rate:.1%}"
+    conversion_display.short_description = "Conversion"
+
+
 # ============================================================================
 # PASSWORD RESET TOKEN ADMIN
 # ============================================================================
@@ -737,6 +816,7 @@ fitblog_admin.register(ProductReview, ProductReviewAdmin)
 
 # Recommendations
 fitblog_admin.register(EventLog, EventLogAdmin)
+fitblog_admin.register(RecommendationDailyStat, RecommendationDailyStatAdmin)
 
 # Password reset tokens
 fitblog_admin.register(PasswordResetToken, PasswordResetTokenAdmin)
\ No newline at end of file
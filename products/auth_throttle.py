@@ -2,12 +2,27 @@
 """
 Rate Limiting (Throttling) for login attempts
 Prevent brute force attacks by tracking failed login attempts
+
+Sliding window counter (chỉ dùng cache.add + cache.incr - atomic trên
+Redis / Memcached / LocMem, không get-rồi-set nên không đếm thiếu khi nhiều
+request thất bại cùng lúc):
+- Mỗi key (IP + username) có 2 counter cố định theo cửa sổ ATTEMPT_WINDOW:
+  cửa sổ hiện tại và cửa sổ trước
+- Số lần thất bại ước lượng = hiện tại + trước × (phần cửa sổ trước còn nằm
+  trong 15 phút gần nhất) → O(1) bộ nhớ / key, O(1) mỗi lần kiểm tra
+- Đủ MAX_ATTEMPTS → lockout key (cache.add: request đồng thời không kéo dài lockout)
+
+State nằm trong cache alias settings.LOGIN_THROTTLE_CACHE: phải là cache dùng
+chung giữa các worker, nếu không mỗi worker có bộ đếm riêng
+(MAX_ATTEMPTS × số worker lần thử).
 """
 
-from django.core.cache import cache
-from django.utils import timezone
-from datetime import timedelta
+import hashlib
 import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +35,7 @@ class LoginThrottle:
     Tracks login attempts and locks account after too many failures.
     
     Rules:
-    - Max 5 failed attempts within 15 minutes
+    - Max 5 failed attempts within 15 minutes (sliding window)
     - After 5 failures: Lock for 15 minutes
     - Attempts tracked by IP + username/email combo
     - Clean attempts on successful login
@@ -40,19 +55,62 @@ class LoginThrottle:
     LOCKOUT_TIME = 15 * 60              # 15 minutes in seconds
     ATTEMPT_WINDOW = 15 * 60            # 15 minutes to track attempts
     
+    def __init__(self, cache_alias=None, clock=time.time):
+        self.cache_alias = cache_alias
+        self.clock = clock
+    
+    @property
+    def cache(self):
+        return caches[self.cache_alias or getattr(settings, 'LOGIN_THROTTLE_CACHE', 'default')]
+    
     def _get_client_ip(self, request):
-        """Get client IP address from request"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+        """
+        Get client IP address from request.
+        KHÔNG đọc X-Forwarded-For trực tiếp (client tự đặt được → đổi IP để né
+        khóa): uvicorn --proxy-headers đã lấy IP thật vào REMOTE_ADDR, chỉ khi
+        request đến từ proxy tin cậy (FORWARDED_ALLOW_IPS, xem Procfile).
+        """
+        return request.META.get('REMOTE_ADDR')
     
     def _get_cache_key(self, ip, username_or_email, key_type='attempts'):
         """Generate cache key for throttle tracking"""
         # key_type: 'attempts' or 'lockout'
-        return f'login_throttle:{key_type}:{ip}:{username_or_email}'
+        # Hash: username tự do (khoảng trắng, unicode) không hợp lệ làm key Memcached
+        digest = hashlib.sha1(f'{ip}:{username_or_email}'.encode('utf-8')).hexdigest()
+        return f'login_throttle:{key_type}:{digest}'
+    
+    # ---------- sliding window counter ----------
+    
+    def _window(self, now):
+        """(số thứ tự cửa sổ hiện tại, phần đã trôi qua của cửa sổ 0..1)"""
+        window, offset = divmod(now, self.ATTEMPT_WINDOW)
+        return int(window), offset / self.ATTEMPT_WINDOW
+    
+    def _estimate(self, current, previous, elapsed):
+        return current + previous * (1 - elapsed)
+    
+    def _count(self, attempts_key, now):
+        """Số lần thất bại ước lượng trong ATTEMPT_WINDOW giây gần nhất"""
+        window, elapsed = self._window(now)
+        counts = self.cache.get_many([f'{attempts_key}:{window}', f'{attempts_key}:{window - 1}'])
+        return self._estimate(
+            counts.get(f'{attempts_key}:{window}', 0), counts.get(f'{attempts_key}:{window - 1}', 0), elapsed
+        )
+    
+    def _increment(self, key):
+        """Tăng atomic; counter sống 2 cửa sổ (còn dùng làm 'cửa sổ trước')"""
+        cache = self.cache
+        cache.add(key, 0, 2 * self.ATTEMPT_WINDOW)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Hết hạn / bị evict giữa add và incr
+            cache.add(key, 0, 2 * self.ATTEMPT_WINDOW)
+            return cache.incr(key)
+    
+    def _lock(self, lockout_key, now):
+        """Khóa LOCKOUT_TIME giây; đã khóa rồi thì giữ nguyên thời điểm mở khóa"""
+        self.cache.add(lockout_key, now + self.LOCKOUT_TIME, self.LOCKOUT_TIME)
     
     def allow_attempt(self, request, username_or_email):
         """
@@ -64,23 +122,22 @@ class LoginThrottle:
         ip = self._get_client_ip(request)
         lockout_key = self._get_cache_key(ip, username_or_email, 'lockout')
         attempts_key = self._get_cache_key(ip, username_or_email, 'attempts')
+        now = self.clock()
         
         # Check if account is locked
-        lockout_time = cache.get(lockout_key)
+        lockout_time = self.cache.get(lockout_key)
         if lockout_time:
-            remaining = int(lockout_time - timezone.now().timestamp())
+            remaining = int(lockout_time - now)
             if remaining > 0:
                 return False, f'❌ Quá nhiều lần đăng nhập thất bại. Vui lòng thử lại sau {remaining} giây.'
             else:
                 # Lockout expired, remove it
-                cache.delete(lockout_key)
+                self.cache.delete(lockout_key)
         
         # Check attempt count
-        attempts = cache.get(attempts_key, 0)
-        if attempts >= self.MAX_ATTEMPTS:
+        if self._count(attempts_key, now) >= self.MAX_ATTEMPTS:
             # Lock the account
-            lockout_timestamp = (timezone.now() + timedelta(seconds=self.LOCKOUT_TIME)).timestamp()
-            cache.set(lockout_key, lockout_timestamp, self.LOCKOUT_TIME)
+            self._lock(lockout_key, now)
             return False, f'❌ Tài khoản bị khóa do quá nhiều lần thất bại. Vui lòng thử lại sau {self.LOCKOUT_TIME // 60} phút.'
         
         return True, ''
@@ -89,14 +146,18 @@ class LoginThrottle:
         """Record a failed login attempt"""
         ip = self._get_client_ip(request)
         attempts_key = self._get_cache_key(ip, username_or_email, 'attempts')
+        now = self.clock()
+        window, elapsed = self._window(now)
         
-        # Increment attempt counter
-        attempts = cache.get(attempts_key, 0)
-        attempts += 1
-        cache.set(attempts_key, attempts, self.ATTEMPT_WINDOW)
+        # Increment attempt counter (atomic)
+        current = self._increment(f'{attempts_key}:{window}')
+        previous = self.cache.get(f'{attempts_key}:{window - 1}', 0)
+        attempts = self._estimate(current, previous, elapsed)
+        if attempts >= self.MAX_ATTEMPTS:
+            self._lock(self._get_cache_key(ip, username_or_email, 'lockout'), now)
         
         logger.warning(
-            f'Failed login attempt: {ip} - {username_or_email} (Attempt {attempts}/{self.MAX_ATTEMPTS})'
+            f'Failed login attempt: {ip} - {username_or_email} (Attempt {attempts:.0f}/{self.MAX_ATTEMPTS})'
         )
         
         return attempts
@@ -106,9 +167,9 @@ class LoginThrottle:
         ip = self._get_client_ip(request)
         attempts_key = self._get_cache_key(ip, username_or_email, 'attempts')
         lockout_key = self._get_cache_key(ip, username_or_email, 'lockout')
+        window, _ = self._window(self.clock())
         
-        cache.delete(attempts_key)
-        cache.delete(lockout_key)
+        self.cache.delete_many([f'{attempts_key}:{window}', f'{attempts_key}:{window - 1}', lockout_key])
         
         logger.info(f'Login successful: {ip} - {username_or_email}')
 
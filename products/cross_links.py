@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed cross links: blog.Post ↔ Product.
+
+Điểm liên quan = TAG_WEIGHT * Jaccard(tag chung) + TEXT_WEIGHT * cosine(TF-IDF)
+- Tag bài viết: Post.tags
+- Tag sản phẩm: Product.tags + suitable_for_goals + supplement_type
+- Tag được chuẩn hóa (bỏ dấu, '-' thay khoảng trắng) và map nhãn tiếng Việt
+  về mã: "Tăng cơ" → 'muscle-gain', "Creatine" → 'creatine'
+- TF-IDF fit trên chung 1 corpus (bài viết + sản phẩm) → cùng không gian vector
+
+Lưu top-K sản phẩm mỗi bài + top-K bài mỗi sản phẩm vào PostProductLink
+→ trang chi tiết chỉ cần 1 query theo id, không tìm kiếm lúc request.
+
+Dùng chung cho:
+- Management command: python manage.py rebuild_cross_links (offline / cron)
+- Template tags: {% products_for_post post %}, {% posts_for_product product %}
+
+Example:
+    rebuild_cross_links()
+    get_products_for_post(post.id, limit=4)
+    get_posts_for_product(product.id, limit=3)
+"""
+
+import logging
+import re
+
+import numpy as np
+from django.db import transaction
+from django.utils.html import strip_tags
+
+from blog.models import Post
+from blog.search import fold_diacritics
+
+from .models import PostProductLink, Product, UserProfile
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+TAG_WEIGHT = 0.5
+TEXT_WEIGHT = 0.5
+MIN_LINK_SCORE = 0.08
+PRODUCTS_PER_POST = 6
+POSTS_PER_PRODUCT = 6
+SIMILARITY_CHUNK_SIZE = 256
+
+
+# ============================================================================
+# TAG NORMALIZATION
+# ============================================================================
+
+def normalize_tag(tag):
+    """'Tăng cơ' → 'tang-co', 'muscle_gain' → 'muscle-gain'"""
+    return re.sub(r'[\s_]+', '-', fold_diacritics(tag).strip()).strip('-')
+
+
+def _build_tag_aliases():
+    """Nhãn hiển thị (tiếng Việt / tiếng Anh) → mã dùng trong Product"""
+    aliases = {}
+    for code, label in UserProfile.GOAL_CHOICES + Product.SUPPLEMENT_TYPE_CHOICES:
+        aliases[normalize_tag(label)] = code
+        aliases[normalize_tag(code)] = code
+    return aliases
+
+
+TAG_ALIASES = _build_tag_aliases()
+
+
+def canonical_tags(raw):
+    """Chuỗi tag phân tách bằng dấu phẩy → set mã tag chuẩn"""
+    tags = set()
+    for tag in (raw or '').split(','):
+        normalized = normalize_tag(tag)
+        if normalized:
+            tags.add(TAG_ALIASES.get(normalized, normalized))
+    return tags
+
+
+def post_tags(post):
+    return canonical_tags(post.tags)
+
+
+def product_tags(product):
+    return canonical_tags(','.join([product.tags, product.suitable_for_goals, product.supplement_type]))
+
+
+# ============================================================================
+# DOCUMENTS
+# ============================================================================
+
+def post_document(post):
+    return fold_diacritics(' '.join([
+        post.title, post.tags or '', post.excerpt or '', strip_tags(post.content or ''),
+    ]))
+
+
+def product_document(product):
+    return fold_diacritics(' '.join([
+        product.name, product.name,
+        product.get_supplement_type_display(),
+        product.tags, product.suitable_for_goals,
+        product.short_description or '', product.description or '',
+    ]))
+
+
+def _jaccard(left, right):
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def _top_indices(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def compute_cross_links():
+    """
+    Tính toàn bộ liên kết (không ghi DB).
+
+    Returns:
+        dict: {(post_id, product_id): (score, shared_tags)}
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    posts = list(
+        Post.objects.filter(status='published')
+        .only('id', 'title', 'tags', 'excerpt', 'content').order_by('id')
+    )
+    products = list(
+        Product.objects.filter(status='active')
+        .only('id', 'name', 'tags', 'suitable_for_goals', 'supplement_type',
+              'short_description', 'description').order_by('id')
+    )
+    if not posts or not products:
+        return {}
+
+    vectorizer = TfidfVectorizer(sublinear_tf=True, max_features=50000)
+    matrix = vectorizer.fit_transform(
+        [post_document(post) for post in posts] + [product_document(product) for product in products]
+    )
+    post_matrix, product_matrix = matrix[:len(posts)], matrix[len(posts):]
+
+    post_tag_sets = [post_tags(post) for post in posts]
+    product_tag_sets = [product_tags(product) for product in products]
+
+    # Ma trận điểm posts x products, tính theo từng khối hàng (giới hạn RAM)
+    links = {}
+    column_best = [[] for _ in products]  # top bài viết cho mỗi sản phẩm
+    for start in range(0, len(posts), SIMILARITY_CHUNK_SIZE):
+        text_scores = (post_matrix[start:start + SIMILARITY_CHUNK_SIZE] @ product_matrix.T).toarray()
+        for offset, row in enumerate(text_scores):
+            post_index = start + offset
+            tag_scores = np.array([
+                _jaccard(post_tag_sets[post_index], tags) for tags in product_tag_sets
+            ])
+            scores = TEXT_WEIGHT * row + TAG_WEIGHT * tag_scores
+
+            for product_index in _top_indices(scores, PRODUCTS_PER_POST):
+                if scores[product_index] >= MIN_LINK_SCORE:
+                    links[(post_index, product_index)] = float(scores[product_index])
+
+            for product_index in np.nonzero(scores >= MIN_LINK_SCORE)[0]:
+                best = column_best[product_index]
+                best.append((float(scores[product_index]), post_index))
+                if len(best) > POSTS_PER_PRODUCT * 4:
+                    best.sort(reverse=True)
+                    del best[POSTS_PER_PRODUCT:]
+
+    for product_index, best in enumerate(column_best):
+        best.sort(reverse=True)
+        for score, post_index in best[:POSTS_PER_PRODUCT]:
+            links[(post_index, product_index)] = score
+
+    return {
+        (posts[post_index].id, products[product_index].id): (
+            score,
+            sorted(post_tag_sets[post_index] & product_tag_sets[product_index]),
+        )
+        for (post_index, product_index), score in links.items()
+    }
+
+
+def rebuild_cross_links():
+    """
+    Tính lại và thay toàn bộ bảng PostProductLink (1 transaction).
+
+    Returns:
+        int: số liên kết đã lưu
+    """
+    links = compute_cross_links()
+    with transaction.atomic():
+        PostProductLink.objects.all().delete()
+        PostProductLink.objects.bulk_create([
+            PostProductLink(post_id=post_id, product_id=product_id, score=score, shared_tags=shared)
+            for (post_id, product_id), (score, shared) in links.items()
+        ], batch_size=1000)
+    logger.info(f"🔗 Post ↔ product cross links rebuilt: {len(links)} links")
+    return len(links)
+
+
+# ============================================================================
+# LOOKUPS (1 query, dùng trong template tags)
+# ============================================================================
+
+def get_products_for_post(post_id, limit=4):
+    """Sản phẩm liên quan tới 1 bài viết, điểm cao nhất trước"""
+    return [
+        link.product for link in
+        PostProductLink.objects.filter(post_id=post_id, product__status='active')
+        .select_related('product').order_by('-score')[:limit]
+    ]
+
+
+def get_posts_for_product(product_id, limit=3):
+    """Bài viết liên quan tới 1 sản phẩm, điểm cao nhất trước"""
+    return [
+        link.post for link in
+        PostProductLink.objects.filter(product_id=product_id, post__status='published')
+        .select_related('post').order_by('-score')[:limit]
+    ]
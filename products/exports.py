@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming export of interaction data (EventLog, ProductReview) for model training.
+
+Dùng chung cho:
+- Staff API: GET /api/export/<dataset>/  (products.views.export_data)
+- Management command: python manage.py export_interactions
+
+Thiết kế:
+- Đọc DB bằng .values(...).iterator(chunk_size) → không load toàn bộ bảng vào RAM
+- Render từng dòng CSV / NDJSON, nén gzip theo luồng (zlib.compressobj)
+- Cursor dựa trên id (after_id + limit) → export có thể resume khi bị ngắt
+
+Example:
+    export = build_export('events', {'format': 'ndjson', 'event_type': 'rec_shown'})
+    for chunk in export.stream():
+        output.write(chunk)
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import EventLog, ProductReview
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 2000
+MAX_CHUNK_SIZE = 20000
+
+# Gom nhiều dòng nhỏ thành 1 chunk ~64KB trước khi gửi đi (giảm overhead mỗi lần write)
+STREAM_BUFFER_SIZE = 64 * 1024
+
+EXPORT_DATASETS = {
+    'events': {
+        'model': EventLog,
+        'time_field': 'timestamp',
+        'fields': [
+            'id', 'timestamp', 'event_type', 'user_profile_id',
+            'user_profile__user_id', 'product_id', 'metadata',
+        ],
+    },
+    'reviews': {
+        'model': ProductReview,
+        'time_field': 'created_at',
+        # Không export author_email / author_name (PII)
+        'fields': [
+            'id', 'created_at', 'updated_at', 'user_id', 'product_id',
+            'rating', 'title', 'content', 'is_verified_purchase',
+            'is_approved', 'helpful_count',
+        ],
+    },
+}
+
+
+# ============================================================================
+# PARAMETER PARSING
+# ============================================================================
+
+def _parse_moment(value, end_of_day=False):
+    """Parse ISO date/datetime string → aware datetime (None nếu rỗng)"""
+    if not value:
+        return None
+
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date/datetime: {value}')
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _parse_int(value, name, minimum=0):
+    if value in (None, ''):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+    if number < minimum:
+        raise ValueError(f'{name} must be >= {minimum}')
+    return number
+
+
+def parse_export_params(params):
+    """
+    Validate export parameters from a QueryDict / dict.
+
+    Supported keys:
+        format:      'csv' | 'ndjson' (default 'ndjson')
+        since/until: ISO date or datetime (until is inclusive for plain dates)
+        event_type:  one or more event types (comma separated or repeated)
+        after_id:    resume cursor - only rows with id > after_id
+        limit:       max rows in this export (use with after_id to page)
+        chunk_size:  DB iterator chunk size
+        gzip:        '0' to disable compression (default on)
+
+    Raises:
+        ValueError: invalid parameter (message is safe to return to client)
+    """
+    if hasattr(params, 'getlist'):
+        raw_types = params.getlist('event_type')
+    else:
+        raw_types = params.get('event_type') or []
+        if isinstance(raw_types, str):
+            raw_types = [raw_types]
+
+    event_types = [
+        t.strip() for value in raw_types for t in value.split(',') if t.strip()
+    ]
+    valid_types = {choice for choice, _ in EventLog.EVENT_TYPE_CHOICES}
+    unknown = [t for t in event_types if t not in valid_types]
+    if unknown:
+        raise ValueError(f'Unknown event_type: {", ".join(unknown)}')
+
+    export_format = (params.get('format') or 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'format must be one of: {", ".join(EXPORT_FORMATS)}')
+
+    chunk_size = _parse_int(params.get('chunk_size'), 'chunk_size', minimum=1) or DEFAULT_CHUNK_SIZE
+
+    since = _parse_moment(params.get('since'))
+    until = _parse_moment(params.get('until'), end_of_day=True)
+    if since and until and since > until:
+        raise ValueError('since must be before until')
+
+    return {
+        'format': export_format,
+        'since': since,
+        'until': until,
+        'event_types': event_types,
+        'after_id': _parse_int(params.get('after_id'), 'after_id'),
+        'limit': _parse_int(params.get('limit'), 'limit', minimum=1),
+        'chunk_size': min(chunk_size, MAX_CHUNK_SIZE),
+        'gzip': str(params.get('gzip', '1')).lower() not in ('0', 'false', 'no'),
+    }
+
+
+# ============================================================================
+# ROW RENDERING
+# ============================================================================
+
+def _render_csv(rows, fields):
+    """Yield CSV text blocks, reusing one small buffer"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+
+    for row in rows:
+        values = []
+        for field in fields:
+            value = row[field]
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, ensure_ascii=False, cls=DjangoJSONEncoder)
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        writer.writerow(values)
+
+        if buffer.tell() >= STREAM_BUFFER_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _render_ndjson(rows, fields):
+    """Yield newline-delimited JSON blocks"""
+    parts = []
+    size = 0
+    for row in rows:
+        line = json.dumps(
+            {field: row[field] for field in fields},
+            ensure_ascii=False,
+            cls=DjangoJSONEncoder,
+        ) + '\n'
+        parts.append(line)
+        size += len(line)
+
+        if size >= STREAM_BUFFER_SIZE:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+
+    if parts:
+        yield ''.join(parts)
+
+
+def gzip_stream(text_chunks, level=6):
+    """Compress an iterable of str chunks into a gzip byte stream (constant memory)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in text_chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# ============================================================================
+# EXPORT OBJECT
+# ============================================================================
+
+class InteractionExport:
+    """
+    Một lần export: queryset đã lọc + format + cursor.
+
+    Attributes:
+        dataset: 'events' | 'reviews'
+        params: dict từ parse_export_params()
+    """
+
+    def __init__(self, dataset, params):
+        if dataset not in EXPORT_DATASETS:
+            raise ValueError(f'Unknown dataset: {dataset}')
+        if params['event_types'] and dataset != 'events':
+            raise ValueError('event_type filter only applies to events')
+
+        self.dataset = dataset
+        self.params = params
+        self.config = EXPORT_DATASETS[dataset]
+        self.fields = self.config['fields']
+
+    def get_queryset(self, apply_limit=True):
+        """Filtered queryset ordered by id (stable cursor order)"""
+        time_field = self.config['time_field']
+        queryset = self.config['model'].objects.all()
+
+        if self.params['since']:
+            queryset = queryset.filter(**{f'{time_field}__gte': self.params['since']})
+        if self.params['until']:
+            queryset = queryset.filter(**{f'{time_field}__lte': self.params['until']})
+        if self.params['event_types']:
+            queryset = queryset.filter(event_type__in=self.params['event_types'])
+        if self.params['after_id'] is not None:
+            queryset = queryset.filter(id__gt=self.params['after_id'])
+
+        queryset = queryset.order_by('id')
+        if apply_limit and self.params['limit']:
+            queryset = queryset[:self.params['limit']]
+        return queryset
+
+    def get_next_cursor(self):
+        """
+        id của dòng cuối trong trang này nếu còn dữ liệu phía sau, None nếu
+        export đã tới cuối. Lấy limit + 1 id (1 query index trên id): chỉ
+        trả cursor khi có dòng thứ limit + 1 → trang cuối vừa đủ limit dòng
+        không sinh cursor dẫn tới 1 trang rỗng.
+        """
+        limit = self.params['limit']
+        if not limit:
+            return None
+        ids = list(self.get_queryset(apply_limit=False).values_list(
+            'id', flat=True
+        )[limit - 1:limit + 1])
+        if len(ids) < 2:
+            return None
+        return ids[0]
+
+    def iter_rows(self):
+        return self.get_queryset().values(*self.fields).iterator(
+            chunk_size=self.params['chunk_size']
+        )
+
+    def stream(self):
+        """Yield export content: bytes if gzip enabled, otherwise str"""
+        render = _render_csv if self.params['format'] == 'csv' else _render_ndjson
+        chunks = render(self.iter_rows(), self.fields)
+        if self.params['gzip']:
+            return gzip_stream(chunks)
+        return chunks
+
+    @property
+    def content_type(self):
+        if self.params['gzip']:
+            return 'application/gzip'
+        if self.params['format'] == 'csv':
+            return 'text/csv; charset=utf-8'
+        return 'application/x-ndjson; charset=utf-8'
+
+    @property
+    def filename(self):
+        stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+        name = f'{self.dataset}-{stamp}.{self.params["format"]}'
+        return f'{name}.gz' if self.params['gzip'] else name
+
+
+def build_export(dataset, raw_params):
+    """Shortcut: InteractionExport(dataset, parse_export_params(raw_params))"""
+    return InteractionExport(dataset, parse_export_params(raw_params))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Incrementally aggregate recommendation events into RecommendationDailyStat.
+
+Usage (cron, ví dụ mỗi 10 phút):
+    python manage.py compute_rec_analytics
+    python manage.py compute_rec_analytics --batch-size 10000 --max-batches 50
+
+Mỗi lần chạy chỉ đọc EventLog mới hơn high-water mark, tối đa
+batch-size x max-batches event → thời gian chạy bị chặn.
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.rec_analytics import (
+    DEFAULT_BATCH_SIZE, DEFAULT_MAX_BATCHES, DEFAULT_SETTLE_SECONDS,
+    RecommendationAnalyticsEngine,
+)
+
+
+class Command(BaseCommand):
+    help = 'Aggregate rec_shown / rec_clicked / rec_purchased events into daily CTR stats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='EventLog rows scanned per batch')
+        parser.add_argument('--max-batches', type=int, default=DEFAULT_MAX_BATCHES,
+                            help='Maximum batches per run')
+        parser.add_argument('--settle-seconds', type=int, default=DEFAULT_SETTLE_SECONDS,
+                            help='Skip events newer than this many seconds')
+
+    def handle(self, *args, **options):
+        engine = RecommendationAnalyticsEngine(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            settle_seconds=options['settle_seconds'],
+        )
+        summary = engine.run()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Processed {summary['events']} events in {summary['batches']} batches "
+            f"({summary['rows']} stat rows), HWM={summary['last_event_id']}"
+        ))
+        if not summary['caught_up']:
+            self.stdout.write(self.style.WARNING('⚠️  Backlog remains - run again to catch up'))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Export EventLog / ProductReview rows as (gzip) CSV or NDJSON.
+
+Usage:
+    python manage.py export_interactions events --format ndjson -o events.ndjson.gz
+    python manage.py export_interactions events --event-type rec_shown --event-type rec_clicked \\
+        --since 2026-01-01 --until 2026-01-31 -o jan.ndjson.gz
+    python manage.py export_interactions reviews --format csv --no-gzip > reviews.csv
+
+Resume an interrupted export:
+    python manage.py export_interactions events --after-id 120000 --limit 50000 -o part2.ndjson.gz
+    (the next cursor is printed to stderr when --limit is used)
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.exports import EXPORT_DATASETS, EXPORT_FORMATS, build_export
+
+
+class Command(BaseCommand):
+    help = 'Stream EventLog / ProductReview rows to a file as gzip CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORT_DATASETS))
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--since', help='ISO date/datetime (inclusive)')
+        parser.add_argument('--until', help='ISO date/datetime (inclusive)')
+        parser.add_argument(
+            '--event-type', action='append', default=[], dest='event_type',
+            help='Filter by event type (repeatable, events only)'
+        )
+        parser.add_argument('--after-id', help='Resume cursor: only rows with id > AFTER_ID')
+        parser.add_argument('--limit', help='Maximum number of rows to export')
+        parser.add_argument('--chunk-size', help='DB iterator chunk size')
+        parser.add_argument('--no-gzip', action='store_true', help='Write plain text instead of gzip')
+        parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        raw_params = {
+            'format': options['format'],
+            'since': options['since'],
+            'until': options['until'],
+            'event_type': options['event_type'],
+            'after_id': options['after_id'],
+            'limit': options['limit'],
+            'chunk_size': options['chunk_size'],
+            'gzip': '0' if options['no_gzip'] else '1',
+        }
+
+        try:
+            export = build_export(options['dataset'], raw_params)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        next_cursor = export.get_next_cursor()
+
+        if options['output']:
+            mode = 'wb' if export.params['gzip'] else 'w'
+            encoding = None if export.params['gzip'] else 'utf-8'
+            with open(options['output'], mode, encoding=encoding) as output:
+                written = self._write(export, output)
+        else:
+            output = sys.stdout.buffer if export.params['gzip'] else sys.stdout
+            written = self._write(export, output)
+
+        self.stderr.write(f'✅ Exported {options["dataset"]}: {written} bytes')
+        if next_cursor is not None:
+            self.stderr.write(f'➡️  Next cursor: --after-id {next_cursor}')
+
+    def _write(self, export, output):
+        written = 0
+        for chunk in export.stream():
+            output.write(chunk)
+            written += len(chunk)
+        output.flush()
+        return written
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Rebuild the blog post ↔ product cross-link index.
+
+Usage (offline / cron, ví dụ mỗi đêm):
+    python manage.py rebuild_cross_links
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.cross_links import rebuild_cross_links
+
+
+class Command(BaseCommand):
+    help = 'Recompute PostProductLink from shared tags and TF-IDF similarity'
+
+    def handle(self, *args, **options):
+        count = rebuild_cross_links()
+        self.stdout.write(self.style.SUCCESS(f"✅ Saved {count} post ↔ product links"))
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+HISTORY_EXCLUDED_EVENT_TYPES = {
+    'review_helpful', 'page_load', 'api_call', 'login', 'logout',
+    'search', 'filter_apply', 'sort_applied',
+}
+RECOMMENDATION_EVENT_TYPES = {'rec_shown', 'rec_clicked'}
+
+
+def backfill_interactions(apps, schema_editor):
+    """Build latest interaction per (user_profile, product) from existing EventLog rows"""
+    EventLog = apps.get_model('products', 'EventLog')
+    UserProductInteraction = apps.get_model('products', 'UserProductInteraction')
+
+    rows = {}
+    events = EventLog.objects.filter(
+        user_profile__isnull=False,
+        product__isnull=False,
+    ).exclude(
+        event_type__in=HISTORY_EXCLUDED_EVENT_TYPES
+    ).order_by('id').values(
+        'user_profile_id', 'product_id', 'event_type', 'metadata', 'timestamp'
+    ).iterator(chunk_size=2000)
+
+    for event in events:
+        key = (event['user_profile_id'], event['product_id'])
+        row = rows.setdefault(key, {})
+        row.update(
+            event_type=event['event_type'],
+            metadata=event['metadata'] or {},
+            timestamp=event['timestamp'],
+        )
+        if event['event_type'] in RECOMMENDATION_EVENT_TYPES:
+            row.update(
+                rec_event_type=event['event_type'],
+                rec_metadata=event['metadata'] or {},
+                rec_timestamp=event['timestamp'],
+            )
+
+    UserProductInteraction.objects.bulk_create(
+        [
+            UserProductInteraction(user_profile_id=user_profile_id, product_id=product_id, **fields)
+            for (user_profile_id, product_id), fields in rows.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_eventlog_delete_recommendationlog_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProductInteraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('product_view', 'Product viewed'), ('product_click', 'Product clicked'), ('review_submit', 'Review submitted'), ('review_helpful', 'Review marked helpful'), ('rec_shown', 'Recommendation shown to user'), ('rec_clicked', 'Recommendation clicked'), ('rec_purchased', 'Recommended product purchased'), ('search', 'Search performed'), ('filter_apply', 'Filter applied'), ('sort_applied', 'Sort applied'), ('login', 'User logged in'), ('logout', 'User logged out'), ('register', 'User registered'), ('profile_setup', 'Profile setup completed'), ('profile_update', 'Profile updated'), ('page_load', 'Page loaded'), ('api_call', 'API called')], max_length=30, verbose_name='Loại event mới nhất')),
+                ('metadata', models.JSONField(blank=True, default=dict, verbose_name='Metadata (JSON)')),
+                ('timestamp', models.DateTimeField(verbose_name='Thời gian')),
+                ('rec_event_type', models.CharField(blank=True, max_length=30, verbose_name='Loại gợi ý mới nhất')),
+                ('rec_metadata', models.JSONField(blank=True, default=dict, verbose_name='Metadata gợi ý (JSON)')),
+                ('rec_timestamp', models.DateTimeField(blank=True, null=True, verbose_name='Thời gian gợi ý')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interactions', to='products.product', verbose_name='Sản phẩm')),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interactions', to='products.userprofile', verbose_name='Hồ sơ người dùng')),
+            ],
+            options={
+                'verbose_name_plural': 'User Product Interactions',
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['user_profile', '-timestamp'], name='products_us_user_pr_7b008d_idx'), models.Index(fields=['user_profile', '-rec_timestamp'], name='products_us_user_pr_f49518_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='userproductinteraction',
+            constraint=models.UniqueConstraint(fields=('user_profile', 'product'), name='unique_user_product_interaction'),
+        ),
+        migrations.RunPython(backfill_interactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_userproductinteraction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Tên job')),
+                ('last_event_id', models.BigIntegerField(default=0, verbose_name='EventLog.id đã xử lý')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Cập nhật lúc')),
+            ],
+            options={
+                'verbose_name_plural': 'Analytics Checkpoints',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecommendationDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Ngày')),
+                ('recommendation_type', models.CharField(max_length=50, verbose_name='Loại gợi ý')),
+                ('impressions', models.PositiveIntegerField(default=0, verbose_name='Lượt hiển thị')),
+                ('clicks', models.PositiveIntegerField(default=0, verbose_name='Lượt click')),
+                ('purchases', models.PositiveIntegerField(default=0, verbose_name='Lượt mua')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Cập nhật lúc')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendation_stats', to='products.product', verbose_name='Sản phẩm')),
+            ],
+            options={
+                'verbose_name_plural': 'Hiệu quả gợi ý (theo ngày)',
+                'ordering': ['-date', 'recommendation_type'],
+                'indexes': [models.Index(fields=['-date'], name='products_re_date_c785c3_idx'), models.Index(fields=['recommendation_type', '-date'], name='products_re_recomme_d21184_idx'), models.Index(fields=['product', '-date'], name='products_re_product_b53e4d_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recommendationdailystat',
+            constraint=models.UniqueConstraint(fields=('date', 'recommendation_type', 'product'), name='unique_rec_daily_stat'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_relatedpost'),
+        ('products', '0012_recommendation_analytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostProductLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Điểm liên quan')),
+                ('shared_tags', models.JSONField(blank=True, default=list, verbose_name='Tag chung')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Cập nhật lúc')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_links', to='blog.post', verbose_name='Bài viết')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_links', to='products.product', verbose_name='Sản phẩm')),
+            ],
+            options={
+                'verbose_name_plural': 'Liên kết bài viết ↔ sản phẩm',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['post', '-score'], name='products_po_post_id_991af1_idx'), models.Index(fields=['product', '-score'], name='products_po_product_5f5f24_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postproductlink',
+            constraint=models.UniqueConstraint(fields=('post', 'product'), name='unique_post_product_link'),
+        ),
+    ]
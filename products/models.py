@@ -722,6 +722,228 @@ class EventLog(models.Model):
         super().save(*args, **kwargs)
 
 
+# ============================================================================
+# USER PRODUCT INTERACTION MODEL (Materialized latest event per user/product)
+# ============================================================================
+
+class UserProductInteraction(models.Model):
+    """
+    Interaction MỚI NHẤT của mỗi (user_profile, product) - materialized từ EventLog.
+    
+    Được upsert mỗi khi EventLog mới được ghi (xem utils_recommendations.record_interactions),
+    thay cho các query group-by Max('id') trên EventLog:
+    - Lịch sử xem (profile page): filter(user_profile=...).order_by('-timestamp')
+    - Gợi ý đã hiển thị: filter(user_profile=..., rec_timestamp__isnull=False).order_by('-rec_timestamp')
+    
+    Fields event_type / metadata / timestamp có cùng tên với EventLog
+    để template dùng chung được (log.product, log.event_type, log.metadata, log.timestamp).
+    
+    Example:
+        - user_profile: john_doe
+        - product: Whey Gold
+        - event_type: 'rec_clicked', timestamp: 2026-01-21 10:30
+        - rec_event_type: 'rec_clicked', rec_timestamp: 2026-01-21 10:30
+    """
+    
+    # Event types không tính là "tương tác với sản phẩm" (không hiện trong lịch sử)
+    HISTORY_EXCLUDED_EVENT_TYPES = [
+        'review_helpful', 'page_load', 'api_call', 'login', 'logout',
+        'search', 'filter_apply', 'sort_applied',
+    ]
+    # Event types dùng cho section "Gợi ý cho bạn"
+    RECOMMENDATION_EVENT_TYPES = ['rec_shown', 'rec_clicked']
+
+    user_profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='interactions',
+        verbose_name="Hồ sơ người dùng"
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='interactions',
+        verbose_name="Sản phẩm"
+    )
+
+    # ========== LATEST INTERACTION (any tracked event) ==========
+    event_type = models.CharField(
+        max_length=30,
+        choices=EventLog.EVENT_TYPE_CHOICES,
+        verbose_name="Loại event mới nhất"
+    )
+    metadata = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Metadata (JSON)"
+    )
+    timestamp = models.DateTimeField(verbose_name="Thời gian")
+
+    # ========== LATEST RECOMMENDATION EVENT (rec_shown / rec_clicked) ==========
+    rec_event_type = models.CharField(
+        max_length=30,
+        blank=True,
+        verbose_name="Loại gợi ý mới nhất"
+    )
+    rec_metadata = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Metadata gợi ý (JSON)"
+    )
+    rec_timestamp = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Thời gian gợi ý"
+    )
+
+    class Meta:
+        verbose_name_plural = "User Product Interactions"
+        ordering = ['-timestamp']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user_profile', 'product'],
+                name='unique_user_product_interaction'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user_profile', '-timestamp']),
+            models.Index(fields=['user_profile', '-rec_timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_profile_id} | {self.event_type} | {self.product_id}"
+
+
+# ============================================================================
+# RECOMMENDATION ANALYTICS MODELS (CTR / Conversion per type, product, day)
+# ============================================================================
+
+class RecommendationDailyStat(models.Model):
+    """
+    Số liệu hiệu quả gợi ý theo ngày - tính incremental từ EventLog
+    (xem products/rec_analytics.py).
+    
+    - impressions: số event rec_shown
+    - clicks: số event rec_clicked
+    - purchases: số event rec_purchased
+    
+    Example:
+        - date: 2026-01-21
+        - recommendation_type: 'personalized'
+        - product: Whey Gold
+        - impressions: 120, clicks: 18, purchases: 3  → CTR 15%, conversion 16.7%
+    """
+    date = models.DateField(verbose_name="Ngày")
+    recommendation_type = models.CharField(
+        max_length=50,
+        verbose_name="Loại gợi ý"
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='recommendation_stats',
+        verbose_name="Sản phẩm"
+    )
+    impressions = models.PositiveIntegerField(default=0, verbose_name="Lượt hiển thị")
+    clicks = models.PositiveIntegerField(default=0, verbose_name="Lượt click")
+    purchases = models.PositiveIntegerField(default=0, verbose_name="Lượt mua")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Cập nhật lúc")
+
+    class Meta:
+        verbose_name_plural = "Hiệu quả gợi ý (theo ngày)"
+        ordering = ['-date', 'recommendation_type']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'recommendation_type', 'product'],
+                name='unique_rec_daily_stat'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['-date']),
+            models.Index(fields=['recommendation_type', '-date']),
+            models.Index(fields=['product', '-date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} | {self.recommendation_type} | {self.product_id}"
+
+    @property
+    def ctr(self):
+        """Click-through rate = clicks / impressions"""
+        return self.clicks / self.impressions if self.impressions else 0.0
+
+    @property
+    def conversion_rate(self):
+        """Conversion = purchases / clicks"""
+        return self.purchases / self.clicks if self.clicks else 0.0
+
+
+class AnalyticsCheckpoint(models.Model):
+    """
+    High-water mark của các analytics job đọc EventLog theo id tăng dần.
+    
+    Example:
+        - name: 'recommendation_stats'
+        - last_event_id: 152340 (đã xử lý tất cả EventLog.id <= 152340)
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name="Tên job")
+    last_event_id = models.BigIntegerField(default=0, verbose_name="EventLog.id đã xử lý")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Cập nhật lúc")
+
+    class Meta:
+        verbose_name_plural = "Analytics Checkpoints"
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
+
+
+# ============================================================================
+# POST ↔ PRODUCT CROSS LINKS (blog.Post ↔ Product, precomputed)
+# ============================================================================
+
+class PostProductLink(models.Model):
+    """
+    Liên kết bài viết blog ↔ sản phẩm, tính offline bởi products/cross_links.py
+    (tag chung + TF-IDF). Dùng cho cả 2 chiều:
+    - post.product_links → sản phẩm nhắc tới trong bài
+    - product.post_links → bài viết liên quan tới sản phẩm
+    
+    Example:
+        - post: "Hướng dẫn dùng creatine"
+        - product: Creatine Monohydrate
+        - score: 0.61, shared_tags: ['creatine', 'strength']
+    """
+    post = models.ForeignKey(
+        'blog.Post',
+        on_delete=models.CASCADE,
+        related_name='product_links',
+        verbose_name="Bài viết"
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='post_links',
+        verbose_name="Sản phẩm"
+    )
+    score = models.FloatField(verbose_name="Điểm liên quan")
+    shared_tags = models.JSONField(default=list, blank=True, verbose_name="Tag chung")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Cập nhật lúc")
+
+    class Meta:
+        verbose_name_plural = "Liên kết bài viết ↔ sản phẩm"
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'product'], name='unique_post_product_link')
+        ]
+        indexes = [
+            models.Index(fields=['post', '-score']),
+            models.Index(fields=['product', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} ↔ {self.product_id} ({self.score:.3f})"
+
+
 # ============================================================================
 # PRODUCT FLAVOR MODEL
 # ============================================================================
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental recommendation analytics: impressions, CTR, conversion.
+
+Nguồn dữ liệu: EventLog (rec_shown / rec_clicked / rec_purchased,
+metadata['recommendation_type']).
+Kết quả: RecommendationDailyStat (1 row / ngày / loại gợi ý / sản phẩm).
+
+Thiết kế:
+- High-water mark (AnalyticsCheckpoint.last_event_id): mỗi lần chạy chỉ đọc
+  EventLog.id > HWM → không bao giờ quét lại toàn bảng
+- Mỗi batch là 1 khoảng id giới hạn (batch_size) → thời gian chạy bị chặn
+  kể cả khi bảng event rất lớn / job bị trễ lâu
+- Aggregate trong SQL (GROUP BY ngày, loại, sản phẩm, event_type), cộng dồn
+  vào bảng stat + dời HWM trong cùng 1 transaction → không đếm trùng / sót
+- Settle delay: track_product_click() có thể đổi event_type của event trong
+  5 phút đầu → chỉ xử lý event cũ hơn settle_seconds
+
+Dùng chung cho:
+- Management command: python manage.py compute_rec_analytics (cron)
+- Staff API: GET /api/analytics/recommendations/ (products.views.recommendation_analytics)
+- Admin: RecommendationDailyStatAdmin
+
+Example:
+    engine = RecommendationAnalyticsEngine(batch_size=5000)
+    summary = engine.run()
+    # {'batches': 3, 'events': 12000, 'rows': 450, 'last_event_id': 152340}
+
+    report = get_recommendation_report(days=30, group_by='type')
+"""
+
+import logging
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AnalyticsCheckpoint, EventLog, RecommendationDailyStat
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+CHECKPOINT_NAME = 'recommendation_stats'
+
+# event_type → cột counter trong RecommendationDailyStat
+EVENT_COUNTERS = {
+    'rec_shown': 'impressions',
+    'rec_clicked': 'clicks',
+    'rec_purchased': 'purchases',
+}
+
+UNKNOWN_RECOMMENDATION_TYPE = 'unknown'
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_MAX_BATCHES = 20
+# > 5 phút cửa sổ update event của track_product_click
+DEFAULT_SETTLE_SECONDS = 6 * 60
+
+REPORT_CACHE_TIMEOUT = 300
+REPORT_GROUPINGS = {
+    'type': ['recommendation_type'],
+    'product': ['product_id', 'product__name'],
+    'day': ['date'],
+    'type_day': ['date', 'recommendation_type'],
+}
+
+
+# ============================================================================
+# INCREMENTAL ENGINE
+# ============================================================================
+
+class RecommendationAnalyticsEngine:
+    """
+    Xử lý EventLog theo từng batch id tăng dần từ high-water mark.
+
+    Attributes:
+        batch_size: số EventLog tối đa (mọi loại) quét trong 1 batch
+        max_batches: số batch tối đa mỗi lần run() → chặn thời gian chạy
+        settle_seconds: bỏ qua event mới hơn now - settle_seconds
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, max_batches=DEFAULT_MAX_BATCHES,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS):
+        self.batch_size = max(1, batch_size)
+        self.max_batches = max(1, max_batches)
+        self.settle_seconds = max(0, settle_seconds)
+
+    def run(self):
+        """
+        Chạy tối đa max_batches batch, dừng sớm khi đã bắt kịp.
+
+        Returns:
+            dict: {'batches', 'events', 'rows', 'last_event_id', 'caught_up'}
+        """
+        summary = {'batches': 0, 'events': 0, 'rows': 0, 'last_event_id': None, 'caught_up': False}
+
+        for _ in range(self.max_batches):
+            result = self.process_batch()
+            if result is None:
+                summary['caught_up'] = True
+                break
+            summary['batches'] += 1
+            summary['events'] += result['events']
+            summary['rows'] += result['rows']
+            summary['last_event_id'] = result['last_event_id']
+
+        if summary['batches']:
+            invalidate_report_cache()
+            logger.info(
+                f"📈 Rec analytics: {summary['batches']} batches, {summary['events']} events, "
+                f"{summary['rows']} stat rows, HWM={summary['last_event_id']}"
+            )
+        return summary
+
+    def _batch_upper_bound(self, last_event_id):
+        """
+        id lớn nhất của batch tiếp theo: (last_event_id, upper] chứa tối đa
+        batch_size event đã "settle". None nếu không còn gì để xử lý.
+        """
+        pending = EventLog.objects.filter(id__gt=last_event_id)
+        if self.settle_seconds:
+            cutoff = timezone.now() - timedelta(seconds=self.settle_seconds)
+            pending = pending.filter(timestamp__lt=cutoff)
+
+        ids = pending.order_by('id').values_list('id', flat=True)
+        upper = next(iter(ids[self.batch_size - 1:self.batch_size]), None)
+        if upper is None:
+            upper = pending.aggregate(max_id=Max('id'))['max_id']
+        return upper
+
+    def process_batch(self):
+        """
+        Xử lý 1 batch trong 1 transaction.
+
+        Returns:
+            dict {'events', 'rows', 'last_event_id'} hoặc None nếu đã bắt kịp
+        """
+        with transaction.atomic():
+            checkpoint, _ = AnalyticsCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+            # Khóa checkpoint → 2 job chạy song song không cộng trùng 1 batch
+            checkpoint = AnalyticsCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+
+            upper = self._batch_upper_bound(checkpoint.last_event_id)
+            if upper is None:
+                return None
+
+            rows = (
+                EventLog.objects
+                .filter(
+                    id__gt=checkpoint.last_event_id,
+                    id__lte=upper,
+                    event_type__in=EVENT_COUNTERS,
+                    product__isnull=False,
+                )
+                .annotate(
+                    day=TruncDate('timestamp'),
+                    rec_type=KeyTextTransform('recommendation_type', 'metadata'),
+                )
+                .values('day', 'rec_type', 'product_id', 'event_type')
+                .annotate(n=Count('id'))
+                .order_by()
+            )
+
+            increments = {}
+            events = 0
+            for row in rows:
+                key = (row['day'], row['rec_type'] or UNKNOWN_RECOMMENDATION_TYPE, row['product_id'])
+                counters = increments.setdefault(key, dict.fromkeys(EVENT_COUNTERS.values(), 0))
+                counters[EVENT_COUNTERS[row['event_type']]] += row['n']
+                events += row['n']
+
+            self._apply_increments(increments)
+
+            checkpoint.last_event_id = upper
+            checkpoint.save(update_fields=['last_event_id', 'updated_at'])
+
+        return {'events': events, 'rows': len(increments), 'last_event_id': upper}
+
+    def _apply_increments(self, increments):
+        """Cộng dồn counters vào RecommendationDailyStat (1 SELECT + bulk_update + bulk_create)"""
+        if not increments:
+            return
+
+        days = {day for day, _, _ in increments}
+        rec_types = {rec_type for _, rec_type, _ in increments}
+        product_ids = {product_id for _, _, product_id in increments}
+
+        existing = {
+            (stat.date, stat.recommendation_type, stat.product_id): stat
+            for stat in RecommendationDailyStat.objects.filter(
+                date__in=days,
+                recommendation_type__in=rec_types,
+                product_id__in=product_ids,
+            )
+        }
+
+        to_update = []
+        to_create = []
+        for key, counters in increments.items():
+            stat = existing.get(key)
+            if stat is None:
+                day, rec_type, product_id = key
+                to_create.append(RecommendationDailyStat(
+                    date=day, recommendation_type=rec_type, product_id=product_id, **counters
+                ))
+                continue
+            for field, value in counters.items():
+                setattr(stat, field, getattr(stat, field) + value)
+            stat.updated_at = timezone.now()
+            to_update.append(stat)
+
+        if to_update:
+            RecommendationDailyStat.objects.bulk_update(
+                to_update, list(EVENT_COUNTERS.values()) + ['updated_at'], batch_size=500
+            )
+        if to_create:
+            RecommendationDailyStat.objects.bulk_create(to_create, batch_size=500)
+
+
+# ============================================================================
+# REPORTING (cached)
+# ============================================================================
+
+def _rate(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else 0.0
+
+
+def _report_cache_key(group_by, days, product_id, rec_type, limit):
+    version = cache.get('rec_analytics:version', 0)
+    return f'rec_analytics:v{version}:{group_by}:{days}:{product_id}:{rec_type}:{limit}'
+
+
+def invalidate_report_cache():
+    """Đổi version → mọi report cũ hết hiệu lực (không cần xóa từng key)"""
+    try:
+        cache.incr('rec_analytics:version')
+    except ValueError:
+        cache.set('rec_analytics:version', 1, None)
+
+
+def get_recommendation_report(days=30, group_by='type', product_id=None,
+                              recommendation_type=None, limit=50, use_cache=True):
+    """
+    Impressions / clicks / purchases / CTR / conversion từ RecommendationDailyStat.
+
+    Args:
+        days: số ngày gần nhất
+        group_by: 'type' | 'product' | 'day' | 'type_day'
+        product_id / recommendation_type: lọc thêm (optional)
+        limit: số dòng tối đa (sắp theo impressions giảm dần, 'day' theo ngày)
+
+    Returns:
+        dict: {'days', 'group_by', 'since', 'totals': {...}, 'rows': [...]}
+
+    Raises:
+        ValueError: group_by không hợp lệ
+    """
+    if group_by not in REPORT_GROUPINGS:
+        raise ValueError(f'group_by must be one of: {", ".join(REPORT_GROUPINGS)}')
+
+    cache_key = _report_cache_key(group_by, days, product_id, recommendation_type, limit)
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    queryset = RecommendationDailyStat.objects.filter(date__gte=since)
+    if product_id:
+        queryset = queryset.filter(product_id=product_id)
+    if recommendation_type:
+        queryset = queryset.filter(recommendation_type=recommendation_type)
+
+    sums = {field: Sum(field) for field in EVENT_COUNTERS.values()}
+    grouped = queryset.values(*REPORT_GROUPINGS[group_by]).annotate(**sums)
+    if group_by in ('day', 'type_day'):
+        grouped = grouped.order_by('-date', *REPORT_GROUPINGS[group_by][1:])
+    else:
+        grouped = grouped.order_by('-impressions', '-clicks')
+
+    def _with_rates(row):
+        row = {key: (value.isoformat() if key == 'date' else value) for key, value in row.items()}
+        row['ctr'] = _rate(row['clicks'], row['impressions'])
+        row['conversion_rate'] = _rate(row['purchases'], row['clicks'])
+        return row
+
+    totals = queryset.aggregate(**sums)
+    totals = {field: totals[field] or 0 for field in EVENT_COUNTERS.values()}
+
+    report = {
+        'days': days,
+        'group_by': group_by,
+        'since': since.isoformat(),
+        'totals': _with_rates(totals),
+        'rows': [_with_rates(row) for row in grouped[:limit]],
+    }
+
+    cache.set(cache_key, report, REPORT_CACHE_TIMEOUT)
+    return report
@@ -1,13 +1,14 @@
 # -*- coding: utf-8 -*-
 """
 Django signals for products app.
-Auto-create UserProfile when User is created.
+- Auto-create UserProfile when User is created.
+- Keep UserProductInteraction / cached event stats in sync when EventLog is written.
 """
 
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, EventLog
 
 
 @receiver(post_save, sender=User)
@@ -42,3 +43,17 @@ def save_user_profile(sender, instance, **kwargs):
     """
     if hasattr(instance, 'profile'):
         instance.profile.save()
+
+
+@receiver(post_save, sender=EventLog)
+def handle_event_logged(sender, instance, **kwargs):
+    """
+    Signal handler: Upsert latest (user_profile, product) interaction
+    and invalidate the user's cached event stats
+    
+    Fires on EventLog.objects.create() and event.save() (e.g. track_product_click
+    updating a recent event). bulk_create does NOT fire signals, so callers of
+    bulk_create must call handle_logged_events() themselves.
+    """
+    from .utils_recommendations import handle_logged_events
+    handle_logged_events([instance])
@@ -60,3 +60,34 @@ def event_type_label(value):
         'api_call': 'Gọi API',
     }
     return EVENT_LABELS.get(value, value)
+
+
+# ============================================================================
+# POST ↔ PRODUCT CROSS LINKS (products/cross_links.py)
+# ============================================================================
+
+@register.inclusion_tag('products/_post_products.html')
+def products_for_post(post, limit=4):
+    """
+    Sản phẩm liên quan tới bài viết (liên kết tính sẵn, 1 query)
+    
+    Usage:
+        {% load product_filters %}
+        {% products_for_post post 4 %}
+    """
+    from products.cross_links import get_products_for_post
+
+    return {'linked_products': get_products_for_post(post.id, limit)}
+
+
+@register.inclusion_tag('products/_product_posts.html')
+def posts_for_product(product, limit=3):
+    """
+    Bài viết liên quan tới sản phẩm (liên kết tính sẵn, 1 query)
+    
+    Usage:
+        {% posts_for_product product 3 %}
+    """
+    from products.cross_links import get_posts_for_product
+
+    return {'linked_posts': get_posts_for_product(product.id, limit)}
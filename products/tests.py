@@ -1,3 +1,390 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
 
-# Tests will be added later
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from products.models import (
+    AnalyticsCheckpoint, EventLog, PostProductLink, Product, ProductCategory,
+    RecommendationDailyStat, UserProductInteraction,
+)
+from products.cross_links import get_posts_for_product
+from products.rec_analytics import RecommendationAnalyticsEngine, get_recommendation_report
+from products.utils_recommendations import bulk_log_recommendations, get_event_stats, get_event_stats_bulk
+
+
+def create_product(name='Whey Gold', **kwargs):
+    category, _ = ProductCategory.objects.get_or_create(name='Whey Protein', slug='whey-protein')
+    defaults = {
+        'slug': name.lower().replace(' ', '-'),
+        'category': category,
+        'supplement_type': 'whey',
+        'description': f'{name} description',
+        'image': 'product_images/test.jpg',
+        'price': 500000,
+        'protein_per_serving': 24,
+        'carbs_per_serving': 3,
+        'fat_per_serving': 1.5,
+        'calories_per_serving': 120,
+    }
+    defaults.update(kwargs)
+    return Product.objects.create(name=name, **defaults)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        self.user = User.objects.create_user('member', 'member@example.com', 'pass12345')
+
+        # UserProfile được tạo tự động bởi signal
+        profile = self.user.profile
+        for event_type in ['rec_shown', 'rec_clicked', 'rec_shown', 'login']:
+            EventLog.objects.create(user_profile=profile, event_type=event_type)
+
+    def _read_ndjson(self, response):
+        body = b''.join(response.streaming_content)
+        return [json.loads(line) for line in gzip.decompress(body).decode('utf-8').splitlines()]
+
+    def test_export_requires_staff(self):
+        """Non-staff users cannot export"""
+        self.client.login(username='member', password='pass12345')
+        response = self.client.get(reverse('products:export_data', args=['events']))
+        self.assertEqual(response.status_code, 403)
+
+    def test_export_events_filtered_ndjson(self):
+        """Staff export streams gzip NDJSON filtered by event type"""
+        self.client.login(username='staff', password='pass12345')
+        response = self.client.get(
+            reverse('products:export_data', args=['events']),
+            {'event_type': 'rec_shown'}
+        )
+        self.assertEqual(response.status_code, 200)
+        rows = self._read_ndjson(response)
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(row['event_type'] == 'rec_shown' for row in rows))
+
+    def test_export_cursor_resumes(self):
+        """after_id + limit pages through events without gaps"""
+        self.client.login(username='staff', password='pass12345')
+        url = reverse('products:export_data', args=['events'])
+
+        first = self.client.get(url, {'limit': 3})
+        cursor = first['X-Export-Next-Cursor']
+        second = self.client.get(url, {'limit': 3, 'after_id': cursor})
+
+        ids = [row['id'] for row in self._read_ndjson(first) + self._read_ndjson(second)]
+        self.assertEqual(ids, sorted(EventLog.objects.values_list('id', flat=True)))
+        self.assertFalse(second.has_header('X-Export-Next-Cursor'))
+
+    def test_export_exactly_full_last_page_has_no_cursor(self):
+        """Trang cuối vừa đủ limit dòng → không trả cursor tới trang rỗng"""
+        self.client.login(username='staff', password='pass12345')
+        url = reverse('products:export_data', args=['events'])
+
+        response = self.client.get(url, {'limit': EventLog.objects.count()})
+        self.assertEqual(len(self._read_ndjson(response)), EventLog.objects.count())
+        self.assertFalse(response.has_header('X-Export-Next-Cursor'))
+
+    def test_export_invalid_params(self):
+        self.client.login(username='staff', password='pass12345')
+        response = self.client.get(
+            reverse('products:export_data', args=['events']),
+            {'format': 'xml'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_command_writes_csv(self):
+        """Management command writes the same rows as the API"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'events.csv.gz')
+            call_command('export_interactions', 'events', '--format', 'csv',
+                         '--event-type', 'login', '-o', path, stderr=io.StringIO())
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        self.assertEqual(len(lines), 2)  # header + 1 login event
+        self.assertTrue(lines[0].startswith('id,timestamp,event_type'))
+
+
+class UserProductInteractionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('member', 'member@example.com', 'pass12345')
+        self.profile = self.user.profile
+        self.whey = create_product('Whey Gold', suitable_for_goals='muscle-gain')
+        self.creatine = create_product('Creatine Mono', supplement_type='creatine')
+
+    def test_latest_event_per_product_is_materialized(self):
+        """Each (profile, product) keeps one row with the latest event"""
+        EventLog.objects.create(user_profile=self.profile, product=self.whey, event_type='rec_shown',
+                                metadata={'recommendation_type': 'personalized'})
+        EventLog.objects.create(user_profile=self.profile, product=self.whey, event_type='product_view')
+        EventLog.objects.create(user_profile=self.profile, product=self.whey, event_type='search')
+
+        interaction = UserProductInteraction.objects.get(user_profile=self.profile, product=self.whey)
+        self.assertEqual(interaction.event_type, 'product_view')
+        self.assertEqual(interaction.rec_event_type, 'rec_shown')
+        self.assertEqual(interaction.rec_metadata['recommendation_type'], 'personalized')
+
+    def test_bulk_logged_recommendations_are_materialized(self):
+        """bulk_create path (no signals) still upserts interactions"""
+        bulk_log_recommendations(self.profile, [self.whey, self.creatine], 'personalized', 'session-1')
+        self.assertEqual(
+            UserProductInteraction.objects.filter(user_profile=self.profile, rec_event_type='rec_shown').count(),
+            2
+        )
+
+    def test_older_events_do_not_overwrite_newer_interaction(self):
+        from datetime import timedelta
+        from products.utils_recommendations import (
+            get_deduped_all_events, get_deduped_rec_shown_events, record_interactions,
+        )
+
+        EventLog.objects.create(user_profile=self.profile, product=self.whey, event_type='product_view')
+        EventLog.objects.create(user_profile=self.profile, product=self.whey, event_type='rec_clicked')
+        # Batch event cũ hơn ghi trễ: chỉ lấp rec_* / lịch sử khi mới hơn row hiện có
+        stale = timezone.now() - timedelta(hours=1)
+        record_interactions([
+            EventLog(user_profile=self.profile, product=self.whey, event_type='rec_shown', timestamp=stale),
+            EventLog(user_profile=self.profile, product=self.creatine, event_type='product_view', timestamp=stale),
+        ])
+
+        interaction = UserProductInteraction.objects.get(user_profile=self.profile, product=self.whey)
+        self.assertEqual((interaction.event_type, interaction.rec_event_type), ('rec_clicked', 'rec_clicked'))
+        self.assertEqual(
+            UserProductInteraction.objects.get(user_profile=self.profile, product=self.creatine).timestamp, stale
+        )
+        # Lịch sử: 1 row / sản phẩm, event mới nhất
+        self.assertEqual(
+            [(row.product_id, row.event_type) for row in get_deduped_all_events(self.profile)],
+            [(self.whey.id, 'rec_clicked'), (self.creatine.id, 'product_view')],
+        )
+        self.assertEqual(
+            [row.rec_event_type for row in get_deduped_rec_shown_events(self.profile)], ['rec_clicked']
+        )
+
+    def test_profile_page_uses_materialized_history(self):
+        EventLog.objects.create(user_profile=self.profile, product=self.whey, event_type='rec_clicked')
+        EventLog.objects.create(user_profile=self.profile, product=self.creatine, event_type='product_view')
+        EventLog.objects.create(user_profile=self.profile, product=self.whey, event_type='rec_clicked')
+
+        self.client.login(username='member', password='pass12345')
+        response = self.client.get(reverse('products:user_profile_view'))
+        self.assertEqual(response.status_code, 200)
+        history = list(response.context['all_logs'].object_list)
+        self.assertEqual([row.product_id for row in history], [self.whey.id, self.creatine.id])
+        self.assertEqual([row.product_id for row in response.context['personalized_products']], [self.whey.id])
+
+
+class EventStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('member', 'member@example.com', 'pass12345')
+        self.profile = self.user.profile
+        self.whey = create_product('Whey Gold')
+        for event_type in ['rec_shown', 'rec_shown', 'product_view', 'login']:
+            EventLog.objects.create(user_profile=self.profile, product=self.whey, event_type=event_type)
+
+    def test_stats_single_query_and_cached(self):
+        with CaptureQueriesContext(connection) as queries:
+            stats = get_event_stats(self.profile)
+            get_event_stats(self.profile)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(stats['total_events'], 4)
+        self.assertEqual(stats['rec_shown_count'], 2)
+        self.assertEqual(stats['unique_products_viewed'], 1)
+        self.assertIsNotNone(stats['last_event'])
+
+    def test_new_event_invalidates_cache(self):
+        get_event_stats(self.profile)
+        EventLog.objects.create(user_profile=self.profile, product=self.whey, event_type='product_view')
+        self.assertEqual(get_event_stats(self.profile)['product_view_count'], 2)
+
+    def test_bulk_stats(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pass12345').profile
+        with CaptureQueriesContext(connection) as queries:
+            result = get_event_stats_bulk([self.profile, other])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(result[self.profile.id]['total_events'], 4)
+        self.assertEqual(result[other.id]['total_events'], 0)
+
+
+class RecommendationAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.profile = User.objects.create_user('member', 'member@example.com', 'pass12345').profile
+        self.whey = create_product('Whey Gold')
+        self._log('rec_shown', 4)
+        self._log('rec_clicked', 2)
+        self._log('rec_purchased', 1)
+        self._log('product_view', 3)
+
+    def _log(self, event_type, count, rec_type='personalized'):
+        EventLog.objects.bulk_create([
+            EventLog(user_profile=self.profile, product=self.whey, event_type=event_type,
+                     metadata={'recommendation_type': rec_type})
+            for _ in range(count)
+        ])
+
+    def _engine(self, **kwargs):
+        return RecommendationAnalyticsEngine(settle_seconds=0, **kwargs)
+
+    def test_engine_aggregates_in_bounded_batches(self):
+        summary = self._engine(batch_size=3).run()
+        self.assertEqual(summary['batches'], 4)  # 10 events / 3 per batch
+        self.assertTrue(summary['caught_up'])
+
+        stat = RecommendationDailyStat.objects.get(product=self.whey, recommendation_type='personalized')
+        self.assertEqual((stat.impressions, stat.clicks, stat.purchases), (4, 2, 1))
+        self.assertEqual(stat.ctr, 0.5)
+        self.assertEqual(
+            AnalyticsCheckpoint.objects.get().last_event_id,
+            EventLog.objects.order_by('-id').first().id
+        )
+
+    def test_engine_is_incremental(self):
+        """Re-running only processes events above the high-water mark"""
+        self._engine().run()
+        self._log('rec_shown', 2)
+        self._engine().run()
+        self._engine().run()
+        stat = RecommendationDailyStat.objects.get(product=self.whey)
+        self.assertEqual(stat.impressions, 6)
+
+    def test_max_batches_bounds_run(self):
+        summary = self._engine(batch_size=2, max_batches=2).run()
+        self.assertEqual(summary['events'], 4)
+        self.assertFalse(summary['caught_up'])
+
+    def test_admin_changelist_shows_report_without_messages(self):
+        from django.contrib.messages import get_messages
+
+        self._engine().run()
+        User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.login(username='admin', password='pass12345')
+        url = reverse('admin:products_recommendationdailystat_changelist')
+        for _ in range(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['rec_report']['rows'][0]['ctr_display'], '50.0%')
+        self.assertContains(response, 'Hiệu quả gợi ý 30 ngày')
+        self.assertEqual(list(get_messages(response.wsgi_request)), [])
+
+    def test_report_api_staff_only_and_cached(self):
+        self._engine().run()
+        User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        url = reverse('products:recommendation_analytics')
+
+        self.client.login(username='member', password='pass12345')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.login(username='staff', password='pass12345')
+        response = self.client.get(url, {'group_by': 'type'})
+        self.assertEqual(response.status_code, 200)
+        row = response.json()['rows'][0]
+        self.assertEqual(row['recommendation_type'], 'personalized')
+        self.assertEqual(row['conversion_rate'], 0.5)
+
+        with CaptureQueriesContext(connection) as queries:
+            get_recommendation_report(group_by='type')
+        self.assertEqual(len(queries), 0)
+
+
+class CrossLinkTests(TestCase):
+    def setUp(self):
+        from blog.models import Category, Post
+
+        category = Category.objects.create(name='Thể hình', slug='the-hinh')
+        self.creatine = create_product(
+            'Creatine Mono', supplement_type='creatine', tags='creatine,strength',
+            suitable_for_goals='strength', description='Creatine monohydrate tinh khiết'
+        )
+        self.whey = create_product('Whey Gold', tags='whey', suitable_for_goals='muscle-gain')
+        self.post = Post.objects.create(
+            title='Dùng creatine thế nào', slug='dung-creatine', category=category,
+            content='Creatine monohydrate giúp tăng sức mạnh', tags='Creatine, Tăng sức mạnh',
+            status='published', published_at=timezone.now()
+        )
+
+    def test_tags_are_canonicalized(self):
+        from products.cross_links import canonical_tags
+        self.assertEqual(canonical_tags('Tăng cơ, Creatine'), {'muscle-gain', 'creatine'})
+
+    def test_rebuild_links_both_directions(self):
+        call_command('rebuild_cross_links', stdout=io.StringIO())
+        link = PostProductLink.objects.get(post=self.post, product=self.creatine)
+        self.assertEqual(link.shared_tags, ['creatine', 'strength'])
+
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertContains(response, 'Creatine Mono')
+        html = Template('{% load product_filters %}{% posts_for_product product %}').render(
+            Context({'product': self.creatine})
+        )
+        self.assertIn('Dùng creatine thế nào', html)
+
+        with CaptureQueriesContext(connection) as queries:
+            posts = get_posts_for_product(self.creatine.id)
+        self.assertEqual(posts, [self.post])
+        self.assertEqual(len(queries), 1)
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        from django.test import RequestFactory
+        from products.auth_throttle import LoginThrottle
+
+        cache.clear()
+        self.now = 1_000_000 * LoginThrottle.ATTEMPT_WINDOW
+        self.throttle = LoginThrottle(clock=lambda: self.now)
+        self.request = RequestFactory().post('/login/', REMOTE_ADDR='10.0.0.1')
+
+    def test_locks_after_max_failures_in_sliding_window(self):
+        for _ in range(self.throttle.MAX_ATTEMPTS - 1):
+            self.throttle.record_failure(self.request, 'member')
+        self.assertTrue(self.throttle.allow_attempt(self.request, 'member')[0])
+        # IP / username khác có bộ đếm riêng
+        self.assertTrue(self.throttle.allow_attempt(self.request, 'other')[0])
+
+        # Sang cửa sổ mới 1/5 thời gian: 4 lần cũ vẫn tính ~80%
+        self.now += self.throttle.ATTEMPT_WINDOW * 1.2
+        self.throttle.record_failure(self.request, 'member')
+        self.throttle.record_failure(self.request, 'member')
+        allowed, message = self.throttle.allow_attempt(self.request, 'member')
+        self.assertFalse(allowed)
+        self.assertIn('giây', message)
+
+        self.throttle.clear_attempts(self.request, 'member')
+        self.assertTrue(self.throttle.allow_attempt(self.request, 'member')[0])
+
+    def test_ignores_spoofed_forwarded_for(self):
+        from django.test import RequestFactory
+
+        for _ in range(self.throttle.MAX_ATTEMPTS):
+            self.throttle.record_failure(self.request, 'member')
+        spoofed = RequestFactory().post('/login/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertFalse(self.throttle.allow_attempt(spoofed, 'member')[0])
+
+    def test_old_failures_slide_out_of_window(self):
+        for _ in range(self.throttle.MAX_ATTEMPTS - 1):
+            self.throttle.record_failure(self.request, 'member')
+        self.now += self.throttle.ATTEMPT_WINDOW * 1.9
+        self.throttle.record_failure(self.request, 'member')
+        self.assertTrue(self.throttle.allow_attempt(self.request, 'member')[0])
+
+    def test_login_view_uses_throttle(self):
+        User.objects.create_user('member', 'member@example.com', 'pass12345')
+        url = reverse('products:login')
+        for _ in range(5):
+            self.client.post(url, {'username': 'member', 'password': 'wrong'})
+        response = self.client.post(url, {'username': 'member', 'password': 'pass12345'})
+        self.assertEqual(response.status_code, 200)  # vẫn ở form login, không redirect
+        self.assertNotIn('_auth_user_id', self.client.session)
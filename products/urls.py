@@ -52,6 +52,12 @@ urlpatterns = auth_patterns + [
     
     # Unified endpoint: Get personalized + collaborative + history
     path('api/user-profile-with-collaborative/', views.user_profile_with_collaborative, name='user_profile_with_collaborative'),
+    
+    # Data export for model training (staff only, streaming)
+    path('api/export/<str:dataset>/', views.export_data, name='export_data'),
+
+    # Recommendation CTR / conversion report (staff only, cached)
+    path('api/analytics/recommendations/', views.recommendation_analytics, name='recommendation_analytics'),
 ]
 
 # Example URLs:
@@ -60,6 +66,9 @@ urlpatterns = auth_patterns + [
 # GET  /api/products/{id}/recommendations/ - API: Recommendations
 # GET  /api/categories/                  - API: List categories
 # GET  /api/reviews/                     - API: List reviews
+# GET  /api/export/events/               - API: Stream EventLog export (staff)
+# GET  /api/export/reviews/              - API: Stream ProductReview export (staff)
+# GET  /api/analytics/recommendations/   - API: Recommendation CTR / conversion (staff)
 #
 # GET  /auth/register/                   - AUTH: Registration page
 # GET  /auth/login/                      - AUTH: Login page
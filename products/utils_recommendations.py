@@ -4,18 +4,23 @@ Utility functions for recommendation system.
 
 Includes:
 - Deduplication of product recommendations from multiple engines
-- Event log deduplication (no spam)
+- Event log deduplication (no spam) via materialized UserProductInteraction
 - Session-based tracking helpers
 """
 
-from django.db.models import Max
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
 from django.utils import timezone
 from datetime import timedelta
-from .models import EventLog, Product
+from .models import EventLog, Product, UserProductInteraction
 import logging
 
 logger = logging.getLogger(__name__)
 
+EVENT_STATS_CACHE_TIMEOUT = 5 * 60  # 5 minutes (also invalidated on new events)
+EVENT_STATS_SHORTHAND_TYPES = ['rec_shown', 'product_view', 'review_submit', 'login']
+
 
 # ============================================================================
 # ISSUE 1: PRODUCT DEDUPLICATION
@@ -109,11 +114,110 @@ def get_product_ids_from_recommendations(recommendations_dict):
 # ISSUE 2: EVENT LOG DEDUPLICATION
 # ============================================================================
 
+def record_interactions(events):
+    """
+    Upsert UserProductInteraction rows from newly logged EventLog records.
+    
+    Gọi sau mỗi lần ghi EventLog (post_save signal cho .create()/.save(),
+    gọi trực tiếp sau bulk_create vì bulk_create không bắn signal).
+    
+    Mỗi (user_profile, product) chỉ giữ 1 row:
+    - event_type / metadata / timestamp: event mới nhất (trừ HISTORY_EXCLUDED_EVENT_TYPES)
+    - rec_*: event rec_shown / rec_clicked mới nhất
+    "Mới nhất" theo timestamp: batch event cũ ghi sau (bulk_create trễ, import lại)
+    không ghi đè row đang giữ event mới hơn.
+    
+    Args:
+        events: Iterable of EventLog instances
+    
+    Returns:
+        Number of (user_profile, product) rows written or checked
+    """
+    excluded = set(UserProductInteraction.HISTORY_EXCLUDED_EVENT_TYPES)
+    rec_types = set(UserProductInteraction.RECOMMENDATION_EVENT_TYPES)
+    
+    # Gộp theo (user_profile, product) trước → 1 row / key, giữ event có timestamp mới nhất
+    rows = {}
+    for event in events:
+        if not event.user_profile_id or not event.product_id:
+            continue
+        if event.event_type in excluded:
+            continue
+        
+        key = (event.user_profile_id, event.product_id)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = UserProductInteraction(
+                user_profile_id=event.user_profile_id,
+                product_id=event.product_id,
+            )
+        timestamp = event.timestamp or timezone.now()
+        if row.timestamp is None or timestamp >= row.timestamp:
+            row.event_type = event.event_type
+            row.metadata = event.metadata or {}
+            row.timestamp = timestamp
+        
+        if event.event_type in rec_types and (row.rec_timestamp is None or timestamp >= row.rec_timestamp):
+            row.rec_event_type = event.event_type
+            row.rec_metadata = event.metadata or {}
+            row.rec_timestamp = timestamp
+    
+    if not rows:
+        return 0
+    
+    user_profile_ids = {user_profile_id for user_profile_id, _ in rows}
+    product_ids = {product_id for _, product_id in rows}
+    
+    with transaction.atomic():
+        # 1. Key chưa có → insert (key đã có / request khác vừa insert → bỏ qua)
+        UserProductInteraction.objects.bulk_create(list(rows.values()), ignore_conflicts=True)
+        # 2. Khóa mọi row của batch (đều đã tồn tại) → request song song cùng key chờ nhau,
+        #    so timestamp trên bản mới nhất đã commit, không ghi đè event mới bằng event cũ
+        locked = UserProductInteraction.objects.select_for_update().filter(
+            user_profile_id__in=user_profile_ids, product_id__in=product_ids
+        ).order_by('pk')  # khóa theo thứ tự cố định → không deadlock giữa các batch
+        changed = [
+            current for current in locked
+            if (current.user_profile_id, current.product_id) in rows
+            and _merge_newer(current, rows[(current.user_profile_id, current.product_id)])
+        ]
+        if changed:
+            UserProductInteraction.objects.bulk_update(
+                changed,
+                ['event_type', 'metadata', 'timestamp', 'rec_event_type', 'rec_metadata', 'rec_timestamp'],
+            )
+    
+    return len(rows)
+
+
+def _merge_newer(current, row):
+    """Chép phần của `row` có event mới hơn (hoặc cùng thời điểm) vào `current`. Returns: có thay đổi không"""
+    updated = False
+    history = (row.event_type, row.metadata, row.timestamp)
+    if row.timestamp >= current.timestamp and history != (current.event_type, current.metadata, current.timestamp):
+        current.event_type, current.metadata, current.timestamp = history
+        updated = True
+    rec = (row.rec_event_type, row.rec_metadata, row.rec_timestamp)
+    if row.rec_timestamp and (current.rec_timestamp is None or row.rec_timestamp >= current.rec_timestamp) \
+            and rec != (current.rec_event_type, current.rec_metadata, current.rec_timestamp):
+        current.rec_event_type, current.rec_metadata, current.rec_timestamp = rec
+        updated = True
+    return updated
+
+
 def get_deduped_rec_shown_events(user_profile, days=7):
     """
-    Get latest rec_shown events per product (no duplicates).
+    Get latest recommendation event per product (no duplicates).
+    
+    Prevents EventLog spam by returning only the LATEST rec event for each product.
+    Đọc từ bảng materialized UserProductInteraction → 1 range read theo index
+    (user_profile, -rec_timestamp), không còn group-by Max('id') trên EventLog.
     
-    Prevents EventLog spam by returning only the LATEST event for each product.
+    Khác bản cũ (EventLog, chỉ rec_shown):
+    - Trả về UserProductInteraction, không phải EventLog: dùng rec_event_type /
+      rec_metadata / rec_timestamp (event_type / timestamp là event mới nhất nói chung)
+    - Event gợi ý mới nhất là rec_shown HOẶC rec_clicked (bảng chỉ giữ 1 event
+      gợi ý / sản phẩm); lọc rec_event_type='rec_shown' nếu chỉ cần lượt hiển thị
     
     Example:
         user_profile = UserProfile.objects.get(user=request.user)
@@ -125,75 +229,52 @@ def get_deduped_rec_shown_events(user_profile, days=7):
         )
         # all_events.count() = 24 (spam!)
         
-        # With dedup: 1 event per product
+        # With dedup: 1 row per product
         deduped = get_deduped_rec_shown_events(user_profile)
         # deduped.count() = 5 (clean!)
+        deduped[0].rec_event_type    # 'rec_clicked'
     
     Args:
         user_profile: UserProfile instance
         days: Look back period (default 7 days)
     
     Returns:
-        QuerySet of deduplicated EventLog records
+        QuerySet of UserProductInteraction (ordered by -rec_timestamp)
     """
     cutoff = timezone.now() - timedelta(days=days)
     
-    # Get MAX(id) for each product (most recent event)
-    latest_ids = EventLog.objects.filter(
+    return UserProductInteraction.objects.filter(
         user_profile=user_profile,
-        event_type='rec_shown',
-        timestamp__gte=cutoff
-    ).values('product').annotate(
-        latest_id=Max('id')
-    ).values_list('latest_id', flat=True)
-    
-    # Fetch those specific events
-    deduped_events = EventLog.objects.filter(
-        id__in=latest_ids
-    ).order_by('-timestamp').select_related('product')
-    
-    logger.info(
-        f"✅ Got {deduped_events.count()} deduplicated rec_shown events "
-        f"for user {user_profile.user.username} (lookback: {days} days)"
-    )
-    
-    return deduped_events
+        rec_timestamp__gte=cutoff
+    ).order_by('-rec_timestamp').select_related('product')
 
 
 def get_deduped_all_events(user_profile, days=30):
     """
-    Get ALL event types deduplicated (latest per product).
+    Get latest interaction per product (all tracked event types).
+    
+    Useful for user history/profile page. Đọc từ UserProductInteraction như
+    get_deduped_rec_shown_events (index user_profile, -timestamp).
     
-    Useful for user history/profile page.
+    Khác bản cũ (EventLog, 1 event mới nhất cho mỗi (product, event_type)):
+    - 1 row / sản phẩm: event mới nhất bất kể loại, trừ
+      UserProductInteraction.HISTORY_EXCLUDED_EVENT_TYPES (login, search, ...)
+    - Trả về UserProductInteraction; field product / event_type / metadata /
+      timestamp cùng tên với EventLog nên template dùng chung được
     
     Args:
         user_profile: UserProfile instance
         days: Look back period (default 30 days)
     
     Returns:
-        QuerySet of deduplicated EventLog records (ordered by timestamp)
+        QuerySet of UserProductInteraction (ordered by -timestamp)
     """
     cutoff = timezone.now() - timedelta(days=days)
     
-    # Get MAX(id) for each (product, event_type) combination
-    latest_ids = EventLog.objects.filter(
+    return UserProductInteraction.objects.filter(
         user_profile=user_profile,
         timestamp__gte=cutoff
-    ).values('product', 'event_type').annotate(
-        latest_id=Max('id')
-    ).values_list('latest_id', flat=True)
-    
-    # Fetch those specific events
-    deduped_events = EventLog.objects.filter(
-        id__in=latest_ids
     ).order_by('-timestamp').select_related('product')
-    
-    logger.info(
-        f"✅ Got {deduped_events.count()} deduplicated events "
-        f"for user {user_profile.user.username} (lookback: {days} days)"
-    )
-    
-    return deduped_events
 
 
 def check_session_logged(user_profile, product, event_type, session_id):
@@ -294,12 +375,66 @@ def log_event_if_not_in_session(user_profile, product, event_type,
     return event
 
 
-def get_event_stats(user_profile, days=30):
+def _event_stats_aggregates():
+    """
+    Conditional aggregates cho get_event_stats: tất cả count theo loại,
+    số sản phẩm unique và thời điểm event cuối - trong 1 câu SELECT.
+    """
+    aggregates = {
+        'total_events': Count('id'),
+        'unique_products_viewed': Count('product', distinct=True),
+        'last_event': Max('timestamp'),
+    }
+    for event_type, _ in EventLog.EVENT_TYPE_CHOICES:
+        aggregates[f'type__{event_type}'] = Count('id', filter=Q(event_type=event_type))
+    return aggregates
+
+
+def _build_event_stats(row, days):
+    """Convert one aggregate row → stats dict (same shape as before)"""
+    row = row or {}
+    events_by_type = {
+        event_type: row.get(f'type__{event_type}', 0)
+        for event_type, _ in EventLog.EVENT_TYPE_CHOICES
+        if row.get(f'type__{event_type}')
+    }
+    stats = {
+        'total_events': row.get('total_events', 0),
+        'unique_products_viewed': row.get('unique_products_viewed', 0),
+        'last_event': row.get('last_event'),
+        'events_by_type': events_by_type,
+        'days': days,
+    }
+    
+    # Shorthand counts
+    for event_type in EVENT_STATS_SHORTHAND_TYPES:
+        stats[f'{event_type}_count'] = events_by_type.get(event_type, 0)
+    
+    return stats
+
+
+def _event_stats_cache_key(user_profile_id):
+    # 1 key / profile chứa {days: stats} → invalidate bằng 1 cache.delete
+    return f'event_stats:{user_profile_id}'
+
+
+def invalidate_event_stats(user_profile_ids):
+    """Drop cached stats for the given profiles (called when new events are logged)"""
+    keys = [_event_stats_cache_key(pid) for pid in set(user_profile_ids) if pid]
+    if keys:
+        cache.delete_many(keys)
+
+
+def get_event_stats(user_profile, days=30, use_cache=True):
     """
     Get event statistics for a user.
     
     Useful for analytics dashboard.
     
+    ✅ OPTIMIZATION: 1 query (conditional aggregation) thay vì 4 query
+    (group-by count, distinct count, count, order_by().first()),
+    kết quả cache theo user và bị xóa khi user có event mới.
+    
     Example:
         stats = get_event_stats(user_profile)
         # Returns:
@@ -313,38 +448,26 @@ def get_event_stats(user_profile, days=30):
         #     'events_by_type': {'rec_shown': 45, 'product_view': 60, ...}
         # }
     """
+    cache_key = _event_stats_cache_key(user_profile.id)
+    cached = (cache.get(cache_key) or {}) if use_cache else {}
+    if days in cached:
+        return cached[days]
+    
     cutoff = timezone.now() - timedelta(days=days)
     
-    events = EventLog.objects.filter(
+    row = EventLog.objects.filter(
         user_profile=user_profile,
         timestamp__gte=cutoff
-    )
-    
-    # Get events by type
-    from django.db.models import Count
-    events_by_type = dict(
-        events.values('event_type').annotate(
-            count=Count('id')
-        ).values_list('event_type', 'count')
-    )
+    ).aggregate(**_event_stats_aggregates())
     
-    # Get unique products
-    unique_products = events.values('product').distinct().count()
+    stats = _build_event_stats(row, days)
     
-    stats = {
-        'total_events': events.count(),
-        'unique_products_viewed': unique_products,
-        'last_event': events.order_by('-timestamp').first(),
-        'events_by_type': events_by_type,
-        'days': days,
-    }
-    
-    # Shorthand counts
-    for event_type in ['rec_shown', 'product_view', 'review_submit', 'login']:
-        stats[f'{event_type}_count'] = events_by_type.get(event_type, 0)
+    if use_cache:
+        cached[days] = stats
+        cache.set(cache_key, cached, EVENT_STATS_CACHE_TIMEOUT)
     
     logger.info(
-        f"📊 Event stats for {user_profile.user.username}: "
+        f"📊 Event stats for profile {user_profile.id}: "
         f"{stats['total_events']} events, "
         f"{stats['unique_products_viewed']} products (last {days} days)"
     )
@@ -352,6 +475,72 @@ def get_event_stats(user_profile, days=30):
     return stats
 
 
+def get_event_stats_bulk(user_profiles, days=30):
+    """
+    Event statistics for many profiles at once (admin reports).
+    
+    1 grouped query cho toàn bộ profiles (GROUP BY user_profile),
+    kết quả cũng được ghi vào cache của từng user.
+    
+    Example:
+        stats_by_profile = get_event_stats_bulk(UserProfile.objects.all()[:100])
+        stats_by_profile[profile.id]['total_events']
+    
+    Args:
+        user_profiles: Iterable of UserProfile instances or ids
+        days: Look back period (default 30 days)
+    
+    Returns:
+        {user_profile_id: stats_dict} (profiles without events get zero stats)
+    """
+    profile_ids = [getattr(p, 'id', p) for p in user_profiles]
+    if not profile_ids:
+        return {}
+    
+    cutoff = timezone.now() - timedelta(days=days)
+    
+    rows = EventLog.objects.filter(
+        user_profile_id__in=profile_ids,
+        timestamp__gte=cutoff
+    ).values('user_profile_id').annotate(
+        **_event_stats_aggregates()
+    ).order_by()
+    
+    rows_by_profile = {row['user_profile_id']: row for row in rows}
+    result = {
+        pid: _build_event_stats(rows_by_profile.get(pid), days)
+        for pid in profile_ids
+    }
+    
+    # Warm per-user cache (giữ các khoảng days khác đã cache)
+    cache_keys = {pid: _event_stats_cache_key(pid) for pid in profile_ids}
+    existing = cache.get_many(cache_keys.values())
+    to_cache = {}
+    for pid, key in cache_keys.items():
+        entry = existing.get(key) or {}
+        entry[days] = result[pid]
+        to_cache[key] = entry
+    cache.set_many(to_cache, EVENT_STATS_CACHE_TIMEOUT)
+    
+    logger.info(f"📊 Bulk event stats: {len(profile_ids)} profiles (last {days} days)")
+    
+    return result
+
+
+def handle_logged_events(events):
+    """
+    Post-processing for newly logged EventLog records.
+    
+    - Upsert UserProductInteraction (latest interaction per user/product)
+    - Invalidate cached event stats of affected users
+    
+    Called by the EventLog post_save signal and after every bulk_create.
+    """
+    events = list(events)
+    record_interactions(events)
+    invalidate_event_stats(event.user_profile_id for event in events)
+
+
 # ============================================================================
 # BATCH OPERATIONS
 # ============================================================================
@@ -407,6 +596,7 @@ def bulk_log_recommendations(user_profile, products, recommendation_type,
     # Bulk create
     if logs_to_create:
         created = EventLog.objects.bulk_create(logs_to_create)
+        handle_logged_events(created)
         logger.info(
             f"✅ Bulk logged {len(created)} {event_type} events "
             f"({recommendation_type}) for {user_profile.user.username} "
@@ -6,11 +6,12 @@ from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Avg, Count
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from .models import Product, ProductCategory, ProductReview, UserProfile, EventLog
+from .models import Product, ProductCategory, ProductReview, UserProfile, EventLog, UserProductInteraction
+from .utils_recommendations import handle_logged_events
 from .serializers import (
     ProductSerializer, ProductDetailSerializer, ProductCategorySerializer,
     ProductReviewSerializer
@@ -213,7 +214,8 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         
         # ✅ OPTIMIZATION: Use bulk_create instead of loop (50 queries → 1 query)
         if logs_to_create:
-            EventLog.objects.bulk_create(logs_to_create)
+            created = EventLog.objects.bulk_create(logs_to_create)
+            handle_logged_events(created)
             logger.info(f"📊 Logged {len(logs_to_create)} rec_shown events for {user_profile.user.username} (session: {session_key})")
         
         return Response({
@@ -540,46 +542,20 @@ def user_profile_view(request):
         messages.warning(request, 'Vui lòng điền thông tin profile')
         return redirect('products:user_profile_setup')
     
-    # FIX: Lấy CHỈ EVENT MỚI NHẤT cho mỗi sản phẩm (tránh duplication)
-    from django.db.models import Max, F, Window
-    from django.db.models.functions import RowNumber
+    # Lấy CHỈ EVENT MỚI NHẤT cho mỗi sản phẩm (tránh duplication)
+    # → đọc từ bảng materialized UserProductInteraction (upsert khi ghi EventLog),
+    #   mỗi list là 1 range read theo index, không còn group-by Max('id') trên EventLog
     
-    # Step 1: Lấy recommendation events - chỉ event mới nhất mỗi sản phẩm
-    # Lấy product IDs từ recommendations (rec_shown hoặc rec_clicked)
-    recommendation_product_ids = EventLog.objects.filter(
+    # Step 1: Gợi ý gần nhất (rec_shown hoặc rec_clicked) - 1 row mỗi sản phẩm
+    personalized_products = UserProductInteraction.objects.filter(
         user_profile=user_profile,
-        event_type__in=['rec_shown', 'rec_clicked']
-    ).values('product_id').annotate(
-        latest_id=Max('id')
-    ).values('latest_id')[:6]
-    
-    # Lấy các event IDs đó
-    recommendation_ids = [e['latest_id'] for e in recommendation_product_ids]
-    personalized_products = EventLog.objects.filter(
-        id__in=recommendation_ids
-    ).order_by('-timestamp')
-    
-    # Step 2: Lấy tất cả sản phẩm đã xem - chỉ EVENT MỚI NHẤT mỗi sản phẩm
-    # Tìm tất cả product_id đã xem (bất kỳ event loại nào)
-    # INCLUDE review_submit (để hiển thị trong lịch sử khi user đánh giá)
-    viewed_product_ids = EventLog.objects.filter(
-        user_profile=user_profile,
-        product__isnull=False
-    ).exclude(
-        event_type__in=['review_helpful', 'page_load', 'api_call', 'login', 'logout', 'search', 'filter_apply', 'sort_applied']
-    ).values('product_id')
+        rec_timestamp__isnull=False
+    ).select_related('product', 'product__category').order_by('-rec_timestamp')[:6]
     
-    # Lấy EVENT MỚI NHẤT (id lớn nhất = timestamp mới nhất) cho mỗi product_id
-    latest_event_ids = EventLog.objects.filter(
-        user_profile=user_profile,
-        product_id__in=viewed_product_ids
-    ).values('product_id').annotate(
-        latest_id=Max('id')
-    ).values('latest_id')
-    
-    # Lấy các event đó từ DB (có đủ thông tin: timestamp, metadata, etc)
-    all_logs_queryset = EventLog.objects.filter(
-        id__in=[e['latest_id'] for e in latest_event_ids]
+    # Step 2: Lịch sử - interaction mới nhất mỗi sản phẩm
+    # (INCLUDE review_submit để hiển thị trong lịch sử khi user đánh giá)
+    all_logs_queryset = UserProductInteraction.objects.filter(
+        user_profile=user_profile
     ).select_related('product').order_by('-timestamp')
     
     # Phân trang: 5 sản phẩm/trang
@@ -1442,19 +1418,10 @@ def user_profile_with_collaborative(request):
         logger.error(f"Collaborative filtering error: {str(e)}")
         collaborative_data = []
     
-    # ============ 3. HISTORY (Latest EventLog per product) ============
+    # ============ 3. HISTORY (Latest interaction per product) ============
     try:
-        from django.db.models import Max, Subquery
-        
-        # Get latest event per product for this user
-        latest_events = EventLog.objects.filter(
+        history_logs = UserProductInteraction.objects.filter(
             user_profile=user_profile
-        ).values('product_id').annotate(
-            latest_id=Max('id')
-        ).values('latest_id')
-        
-        history_logs = EventLog.objects.filter(
-            id__in=Subquery(latest_events.values('latest_id'))
         ).select_related('product').order_by('-timestamp')[:10]
         
         history_data = [
@@ -1481,3 +1448,96 @@ def user_profile_with_collaborative(request):
     })
 
 
+
+
+# ============================================================================
+# DATA EXPORT (STAFF ONLY)
+# ============================================================================
+
+def export_data(request, dataset):
+    """
+    Stream EventLog / ProductReview rows for model training (staff only)
+
+    GET /api/export/events/?format=ndjson&since=2026-01-01&event_type=rec_shown
+    GET /api/export/reviews/?format=csv&after_id=5000&limit=10000
+
+    Query params: format, since, until, event_type, after_id, limit, chunk_size, gzip
+    (xem products.exports.parse_export_params)
+
+    Response:
+    - Body: gzip-compressed CSV / NDJSON, streamed (memory constant)
+    - Header X-Export-Next-Cursor: after_id cho trang tiếp theo (khi dùng limit)
+    """
+    from .exports import build_export
+
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Staff permission required'}, status=403)
+
+    try:
+        export = build_export(dataset, request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    next_cursor = export.get_next_cursor()
+
+    response = StreamingHttpResponse(export.stream(), content_type=export.content_type)
+    response['Content-Disposition'] = f'attachment; filename="{export.filename}"'
+    if next_cursor is not None:
+        response['X-Export-Next-Cursor'] = str(next_cursor)
+
+    logger.info(
+        f"📤 Export started: {dataset} by {request.user.username} "
+        f"(format={export.params['format']}, after_id={export.params['after_id']}, "
+        f"limit={export.params['limit']})"
+    )
+    return response
+
+
+def recommendation_analytics(request):
+    """
+    Recommendation performance report (staff only, cached 5 phút)
+
+    GET /api/analytics/recommendations/?days=30&group_by=type
+    GET /api/analytics/recommendations/?group_by=product&recommendation_type=personalized&limit=20
+
+    Query params:
+    - days: 1..365 (default 30)
+    - group_by: type | product | day | type_day
+    - product_id, recommendation_type: lọc thêm
+    - limit: 1..500 (default 50)
+
+    Dữ liệu lấy từ RecommendationDailyStat (python manage.py compute_rec_analytics)
+    """
+    from .rec_analytics import get_recommendation_report
+
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Staff permission required'}, status=403)
+
+    try:
+        days = int(request.GET.get('days', 30))
+        limit = int(request.GET.get('limit', 50))
+        product_id = int(request.GET['product_id']) if request.GET.get('product_id') else None
+    except ValueError:
+        return JsonResponse({'error': 'days, limit and product_id must be integers'}, status=400)
+
+    if not 1 <= days <= 365 or not 1 <= limit <= 500:
+        return JsonResponse({'error': 'days must be 1..365 and limit 1..500'}, status=400)
+
+    try:
+        report = get_recommendation_report(
+            days=days,
+            group_by=request.GET.get('group_by', 'type'),
+            product_id=product_id,
+            recommendation_type=request.GET.get('recommendation_type') or None,
+            limit=limit,
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse(report)
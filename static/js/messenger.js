@@ -9,6 +9,8 @@ class MessengerWidget {
         this.messages = [];
         this.isLoading = false;
         this.apiUrl = options.apiUrl || '/chatbot/api/chat/';
+        // SSE endpoint: hiện câu trả lời dần theo từng câu (null = dùng apiUrl)
+        this.streamUrl = options.streamUrl || null;
         this.healthCheckUrl = options.healthCheckUrl || '/chatbot/health/';
         this.botName = options.botName || 'Hinne 🥗';
         this.init();
@@ -711,6 +713,11 @@ class MessengerWidget {
     }
 
     callAPI(query) {
+        if (this.streamUrl && window.ReadableStream && window.TextDecoder) {
+            this.callStreamAPI(query);
+            return;
+        }
+
         const container = document.getElementById('messages');
         const sendBtn = document.getElementById('send');
 
@@ -763,6 +770,130 @@ class MessengerWidget {
             });
     }
 
+    // Streaming (Server-Sent Events qua fetch POST): mỗi event 'chunk' là 1 đoạn
+    // đã format (bản xem trước), nối dần vào bong bóng chat; 'done' mang câu trả
+    // lời đã format đầy đủ (giống chat_api) → thay bản xem trước; 'error' kết thúc
+    callStreamAPI(query) {
+        const container = document.getElementById('messages');
+        const sendBtn = document.getElementById('send');
+
+        this.isLoading = true;
+        sendBtn.disabled = true;
+        let loadingDiv = this.addMessage('', 'loading');
+        let content = null;
+
+        const removeLoading = () => {
+            if (loadingDiv) {
+                container.removeChild(loadingDiv);
+                loadingDiv = null;
+            }
+        };
+
+        const appendChunk = (text) => {
+            removeLoading();
+            if (!content) {
+                const div = this.addMessage('', 'bot');
+                content = div.querySelector('.message-content');
+                content.classList.add('typing');
+            }
+            content.textContent += text;
+            container.scrollTop = container.scrollHeight;
+        };
+
+        const finish = (data) => {
+            removeLoading();
+            if (!data.success) {
+                this.addMessage(`${data.error || 'Có lỗi xảy ra'}`, 'bot');
+                this.updateStatus('offline');
+                return;
+            }
+            if (!content) {
+                appendChunk(data.response || '');
+            } else if (data.response) {
+                content.textContent = data.response;
+            }
+            content.classList.remove('typing');
+            if (data.timestamp) {
+                const metaEl = document.createElement('div');
+                metaEl.className = 'message-meta';
+                metaEl.innerHTML = `<span class="time">${new Date(data.timestamp).toLocaleTimeString()}</span>`;
+                content.appendChild(metaEl);
+            }
+        };
+
+        const handleEvent = (raw) => {
+            let event = 'message';
+            const dataLines = [];
+            raw.split('\n').forEach((line) => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trim());
+                }
+            });
+            if (!dataLines.length) {
+                return false;
+            }
+            const data = JSON.parse(dataLines.join('\n'));
+            if (event === 'chunk') {
+                appendChunk(data.text);
+                return false;
+            }
+            finish(event === 'done' ? data : { success: false, error: data.error });
+            return true;
+        };
+
+        fetch(this.streamUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+            },
+            body: JSON.stringify({ query: query }),
+        })
+            .then(async (res) => {
+                const contentType = res.headers.get('Content-Type') || '';
+                if (!contentType.startsWith('text/event-stream')) {
+                    // Lỗi validate (400) / 405 → JSON như chat_api
+                    const data = await res.json().catch(() => ({}));
+                    finish({ success: false, error: data.error || `HTTP ${res.status}` });
+                    return;
+                }
+
+                const reader = res.body.getReader();
+                const decoder = new TextDecoder('utf-8');
+                let buffer = '';
+                let finished = false;
+
+                while (!finished) {
+                    const { value, done } = await reader.read();
+                    if (done) {
+                        break;
+                    }
+                    buffer += decoder.decode(value, { stream: true });
+                    let boundary = buffer.indexOf('\n\n');
+                    while (boundary !== -1 && !finished) {
+                        finished = handleEvent(buffer.slice(0, boundary));
+                        buffer = buffer.slice(boundary + 2);
+                        boundary = buffer.indexOf('\n\n');
+                    }
+                }
+                if (!finished) {
+                    finish(content ? { success: true } : { success: false, error: 'Mất kết nối giữa chừng' });
+                }
+            })
+            .catch((err) => {
+                removeLoading();
+                this.addMessage(`Lỗi kết nối: ${err.message}. Hãy thử lại!`, 'bot');
+                this.updateStatus('offline');
+            })
+            .finally(() => {
+                this.isLoading = false;
+                sendBtn.disabled = false;
+                document.getElementById('input').focus();
+            });
+    }
+
     checkHealth() {
         fetch(this.healthCheckUrl)
             .then((res) => res.json())
@@ -810,6 +941,7 @@ class MessengerWidget {
 document.addEventListener('DOMContentLoaded', () => {
     new MessengerWidget({
         apiUrl: '/chatbot/api/chat/',
+        streamUrl: '/chatbot/api/chat/stream/',
         healthCheckUrl: '/chatbot/health/',
         botName: 'Hinne 🥗',
     });